@@ -0,0 +1,84 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from typing import List, Optional
+from services.analytics_service import analytics_service, DIFF_KINDS
+from services.archive_service import result_archive_service
+from services.eval_set_service import eval_set_service
+from services.job_service import job_service
+from utils.log import get_logger
+
+logger = get_logger("analytics_api")
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
+
+
+@router.post("/archive", summary="把过期的评测结果归档到 Parquet 文件")
+def archive_results(
+    background_tasks: BackgroundTasks,
+    retention_days: Optional[int] = Query(None, ge=0, description="归档 exec_time 早于该天数的结果"),
+    keep_runs: Optional[int] = Query(None, ge=0, description="每个评测集只保留最近 N 次运行，其余归档"),
+    eval_set_id: Optional[int] = Query(None, description="只处理指定评测集"),
+    dry_run: bool = Query(False, description="只统计待归档条数"),
+):
+    """dry_run 时同步返回每个评测集的待归档条数；否则在后台执行并返回 job_id，可通过 /api/v1/jobs/{job_id} 查看进度"""
+    if retention_days is None and keep_runs is None:
+        raise HTTPException(status_code=422, detail="retention_days or keep_runs is required")
+    if dry_run:
+        return result_archive_service.archive(retention_days=retention_days, keep_runs=keep_runs,
+                                              eval_set_id=eval_set_id, dry_run=True)
+    job_id = job_service.create('archive', eval_set_id=eval_set_id)
+
+    def _run():
+        try:
+            result_archive_service.archive(retention_days=retention_days, keep_runs=keep_runs,
+                                           eval_set_id=eval_set_id, job_id=job_id)
+        except Exception as e:
+            logger.exception(f"archive job {job_id} failed: {e}")
+
+    background_tasks.add_task(_run)
+    return {"job_id": job_id}
+
+
+@router.get("/archive/files", summary="列出归档文件")
+def list_archive_files(eval_set_id: Optional[int] = Query(None)):
+    return result_archive_service.list_files(eval_set_id)
+
+
+@router.get("/{eval_set_id}/diff", summary="对比两个 Agent 版本/运行的逐条结果差异")
+def get_version_diff(
+    eval_set_id: int,
+    base_version: Optional[str] = Query(None, description="基准 Agent 版本"),
+    base_run: Optional[str] = Query(None, description="基准运行 id"),
+    target_version: Optional[str] = Query(None, description="对比 Agent 版本"),
+    target_run: Optional[str] = Query(None, description="对比运行 id"),
+    only: str = Query('any', description="any | score_dropped | intent_changed | kdb_flipped"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+):
+    """每条语料取两侧各自最新的一条结果进行对比，返回聚合差异与分页的变化条目（按分数变化升序，回退最多的在前）"""
+    if base_version is None and base_run is None:
+        raise HTTPException(status_code=422, detail="base_version or base_run is required")
+    if target_version is None and target_run is None:
+        raise HTTPException(status_code=422, detail="target_version or target_run is required")
+    if only not in DIFF_KINDS:
+        raise HTTPException(status_code=422, detail=f"only must be one of {', '.join(DIFF_KINDS)}")
+    if not eval_set_service.exists(eval_set_id):
+        raise HTTPException(status_code=404, detail="Eval set not found")
+    return analytics_service.diff(eval_set_id, base_version=base_version, base_run=base_run,
+                                  target_version=target_version, target_run=target_run,
+                                  only=only, page=page, page_size=page_size)
+
+
+@router.get("/{eval_set_id}", summary="评测结果统计：分数分布、百分位、知识库命中率与意图混淆矩阵")
+def get_analytics(
+    eval_set_id: int,
+    agent_version: Optional[str] = Query(None, description="仅统计该 Agent 版本的结果"),
+    run_id: Optional[str] = Query(None, description="仅统计该运行的结果"),
+    percentiles: List[float] = Query([50, 90, 95, 99], description="需要计算的分数百分位"),
+    max_labels: int = Query(50, ge=2, le=500, description="混淆矩阵最多保留的意图标签数"),
+):
+    if not eval_set_service.exists(eval_set_id):
+        raise HTTPException(status_code=404, detail="Eval set not found")
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise HTTPException(status_code=422, detail="percentiles must be within [0, 100]")
+    return analytics_service.analyze(eval_set_id, agent_version=agent_version, run_id=run_id,
+                                     percentiles=percentiles, max_labels=max_labels)
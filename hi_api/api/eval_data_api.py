@@ -6,8 +6,11 @@ from services.eval_set_service import eval_set_service
 from models.eval_data import EvalDataCreate
 from fastapi import Body
 from models.eval_data import EvalDataUpdate
+from db.sqlalchemy import unit_of_work
+from models.eval_data import EvalDataBulkCreate, EvalDataBulkUpdate, EvalDataBulkDelete, EvalDataBulkResponse
 
-router = APIRouter()
+# 每个请求共享一个 Session，结束时统一提交
+router = APIRouter(dependencies=[unit_of_work])
 
 
 @router.get("/evalsets/{id}/data")
@@ -20,7 +23,7 @@ def list_eval_data(
 ) -> Dict[str, Any]:
     # 如果是全局搜索，则不校验 eval set 存在性
     if not global_search:
-        if not eval_set_service.get_eval_set(id):
+        if not eval_set_service.exists(id):
             raise HTTPException(status_code=404, detail="Eval set not found")
     # 当提供 q 时在服务端进行过滤并分页；global_search 控制是否跨表
     if global_search:
@@ -30,6 +33,33 @@ def list_eval_data(
     return {"items": items, "total": total}
 
 
+def _bulk_response(results) -> EvalDataBulkResponse:
+    succeeded = sum(1 for r in results if r.ok)
+    return EvalDataBulkResponse(total=len(results), succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+
+# 批量接口需注册在 /data/{dataid} 之前，避免 "bulk" 被当作 dataid 匹配
+@router.post("/evalsets/{id}/data/bulk", response_model=EvalDataBulkResponse, summary="批量创建评测数据")
+def bulk_create_eval_data(id: int, payload: EvalDataBulkCreate = Body(...)):
+    if not eval_set_service.exists(id):
+        raise HTTPException(status_code=404, detail="Eval set not found")
+    return _bulk_response(eval_data_service.bulk_create(id, payload.items))
+
+
+@router.patch("/evalsets/{id}/data/bulk", response_model=EvalDataBulkResponse, summary="批量更新评测数据")
+def bulk_update_eval_data(id: int, payload: EvalDataBulkUpdate = Body(...)):
+    if not eval_set_service.exists(id):
+        raise HTTPException(status_code=404, detail="Eval set not found")
+    return _bulk_response(eval_data_service.bulk_update(id, payload.items))
+
+
+@router.post("/evalsets/{id}/data/bulk_delete", response_model=EvalDataBulkResponse, summary="批量删除评测数据")
+def bulk_delete_eval_data(id: int, payload: EvalDataBulkDelete = Body(...)):
+    if not eval_set_service.exists(id):
+        raise HTTPException(status_code=404, detail="Eval set not found")
+    return _bulk_response(eval_data_service.bulk_delete(id, payload.ids))
+
+
 @router.get("/evalsets/{id}/data/{dataid}", response_model=EvalData)
 def get_eval_data(id: int, dataid: int):
     data = eval_data_service.get_eval_data(dataid)
@@ -41,7 +71,7 @@ def get_eval_data(id: int, dataid: int):
 @router.post("/evalsets/{id}/data", response_model=EvalData)
 def create_eval_data(id: int, payload: EvalDataCreate = Body(...)):
     # 确认评测集存在
-    if not eval_set_service.get_eval_set(id):
+    if not eval_set_service.exists(id):
         raise HTTPException(status_code=404, detail="Eval set not found")
     # 确保请求体中的 eval_set_id 与路径 id 一致（或覆盖为路径 id）
     if payload.eval_set_id != id:
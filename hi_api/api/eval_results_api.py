@@ -1,20 +1,27 @@
 from fastapi import APIRouter, HTTPException, Query
+from utils.fastjson import FastJSONResponse
 from typing import List, Optional
 from services import eval_result_service
-from models import EvalResultCreate, EvalResult
-from db.sqlalchemy import SessionLocal
+from models import EvalResultCreate, EvalResult, EvalResultProjection, EvalResultSummary
+from services.result_summary_service import result_summary_service
+from services.eval_result_service import RESULT_FIELDS
+from db.sqlalchemy import SessionLocal, unit_of_work
 from db.models import EvalData as EvalDataORM
 from utils.client import AIClient
 from utils.scoring import score_answer
 import asyncio
+import uuid
 from pydantic import BaseModel
 from services.eval_data_service import eval_data_service
 from datetime import datetime
 from config.settings import settings
 from utils.log import get_logger
+from utils.metrics import EVAL_ITEMS, EVAL_ITEM_DURATION, SCORER_ERRORS, limited, record_job_finished
+from utils.tracing import in_executor, span
 
 logger = get_logger("eval_results_api")
 
+# 增删查接口使用请求级 Session（unit_of_work）；执行类接口耗时长，仍按每条结果独立提交
 router = APIRouter(prefix="/api/v1/evalresults", tags=["evalresults"])
 
 
@@ -31,40 +38,82 @@ async def _safe_score(answer: Optional[str], expected: Optional[str]) -> int:
     timeout = getattr(settings, 'external_call_timeout_seconds', 60)
     try:
         # run blocking scoring in executor and protect with wait_for
-        return await asyncio.wait_for(loop.run_in_executor(None, lambda: score_answer(answer, expected)), timeout=timeout)
+        with span('score'):
+            return await asyncio.wait_for(
+                loop.run_in_executor(None, in_executor(lambda: score_answer(answer, expected))), timeout=timeout)
     except asyncio.TimeoutError:
         logger.error(f"scoring timed out after {timeout}s for answer_len={len(answer) if answer else 0}")
+        SCORER_ERRORS.inc('timeout')
         return 0
     except Exception as e:
         logger.exception(f"scoring failed with exception: {e}")
         return 0
 
 
-@router.post("/", response_model=EvalResult)
+async def _persist_result(payload: EvalResultCreate, expected_intent: str):
+    """执行类接口写入一条评测结果：同步写库放到线程池，在 SQLite 写队列上排队时不阻塞服务循环"""
+    loop = asyncio.get_running_loop()
+    with span('db.persist'):
+        return await loop.run_in_executor(
+            None, in_executor(lambda: eval_result_service.create_result(payload, expected_intent=expected_intent)))
+
+
+@router.post("/", response_model=EvalResult, dependencies=[unit_of_work])
 def create_eval_result(payload: EvalResultCreate):
     """创建评测结果"""
     return eval_result_service.create_result(payload)
 
 
-@router.get("/byset/{eval_set_id}", response_model=List[EvalResult])
-def list_results_by_set(eval_set_id: int):
-    """按评测集ID列出结果"""
-    return eval_result_service.list_by_eval_set(eval_set_id)
+FIELDS_QUERY = Query(None, description=f"逗号分隔的返回列，如 id,score,actual_intent,kdb；可选：{','.join(RESULT_FIELDS)}。"
+                                        "省略时返回完整结果（含 actual_result 长文本）")
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """解析 fields= 投影参数；id 总是返回，便于再通过 GET /evalresults/{id} 取详情"""
+    if fields is None:
+        return None
+    names = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in names if f not in RESULT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"未知字段: {', '.join(unknown)}")
+    return ['id'] + [f for f in dict.fromkeys(names) if f != 'id']
+
+
+@router.get("/byset/{eval_set_id}", response_model=List[EvalResultProjection], dependencies=[unit_of_work])
+def list_results_by_set(eval_set_id: int, fields: Optional[str] = FIELDS_QUERY):
+    """按评测集ID列出结果；指定 fields 时只查询并返回这些列"""
+    cols = _parse_fields(fields) or list(RESULT_FIELDS)
+    # 列元组直接编码为 JSON 字节，跳过逐行模型校验（response_model 只用于 OpenAPI 文档，描述投影后的行）
+    return FastJSONResponse(eval_result_service.list_projected(cols, eval_set_id=eval_set_id))
 
 
-@router.get("/bydata/{eval_data_id}", response_model=List[EvalResult])
-def list_results_by_data(eval_data_id: int, eval_set_id: Optional[int] = Query(None)):
+@router.get("/bydata/{eval_data_id}", response_model=List[EvalResultProjection], dependencies=[unit_of_work])
+def list_results_by_data(eval_data_id: int, eval_set_id: Optional[int] = Query(None), fields: Optional[str] = FIELDS_QUERY):
     """按评测数据ID（现在为 corpus_id）列出结果。
     如果提供 query 参数 eval_set_id，则按 (eval_set_id, corpus_id) 查询；
     否则在结果表中以 corpus_id 跨所有评测集进行匹配（不建议在存在重复 corpus_id 的场景下使用）。
+    指定 fields 时只查询并返回这些列。
     """
-    if eval_set_id is not None:
-        # 查询指定评测集下 corpus_id 的结果
-        return eval_result_service.list_by_eval_data_with_set(eval_set_id, eval_data_id)
-    return eval_result_service.list_by_eval_data(eval_data_id)
+    cols = _parse_fields(fields) or list(RESULT_FIELDS)
+    # 未提供 eval_set_id 时跨所有评测集按 corpus_id 匹配
+    return FastJSONResponse(eval_result_service.list_projected(cols, eval_set_id=eval_set_id, eval_data_id=eval_data_id))
 
 
-@router.get("/{id}", response_model=EvalResult)
+@router.get("/summary/{eval_set_id}", response_model=List[EvalResultSummary], summary="按版本/运行汇总评测结果", dependencies=[unit_of_work])
+def get_result_summary(eval_set_id: int):
+    """返回评测集下每个 (agent_version, run_id) 的条数、分数和/均值/直方图、知识库命中与意图一致数。
+    汇总随结果写入增量维护，不需要加载结果明细。
+    """
+    return result_summary_service.list_by_eval_set(eval_set_id)
+
+
+@router.post("/summary/{eval_set_id}/rebuild", summary="根据结果明细重建汇总", dependencies=[unit_of_work])
+def rebuild_result_summary(eval_set_id: int):
+    """用于引入汇总表之前的历史结果，或修复汇总偏差"""
+    return {"eval_set_id": eval_set_id, "rows": result_summary_service.rebuild(eval_set_id)}
+
+
+@router.get("/{id}", response_model=EvalResult, dependencies=[unit_of_work])
 def get_eval_result(id: int):
     """获取单个评测结果"""
     r = eval_result_service.get_result(id)
@@ -73,7 +122,7 @@ def get_eval_result(id: int):
     return r
 
 
-@router.delete("/{id}")
+@router.delete("/{id}", dependencies=[unit_of_work])
 def delete_eval_result(id: int):
     """删除评测结果（软删除）"""
     ok = eval_result_service.delete_result(id)
@@ -89,59 +138,62 @@ class ExecPayload(BaseModel):
 
 @router.post("/execute", response_model=EvalResult, summary="执行评测（异步获取答案/意图/知识库/评分）")
 async def execute_eval(payload: ExecPayload):
-    with SessionLocal() as session:
-        data = session.get(EvalDataORM, payload.eval_data_id)
-        if not data or data.deleted:
-            raise HTTPException(status_code=404, detail="评测数据不存在")
-        eval_set_id = data.eval_set_id
-        content = data.content
-        expected = data.expected
-
-    client = AIClient()
-    # 并发调用（答案/意图/知识库 + 同步获取agent信息放在线程池）
-    loop = asyncio.get_running_loop()
-    timeout = getattr(settings, 'external_call_timeout_seconds', 60)
-    ans_task = asyncio.create_task(client.aget_answer(content))
-    intent_task = asyncio.create_task(client.aget_intent(content))
-    kdb_task = asyncio.create_task(client.ais_Kdb(content))
-    info_task = loop.run_in_executor(None, client.get_agent_info)
-    try:
-        answer, intent, kdb_flag, agent_info = await asyncio.wait_for(
-            asyncio.gather(ans_task, intent_task, kdb_task, info_task), timeout=timeout
-        )
-    except asyncio.TimeoutError:
-        logger.error(f"execute_eval timed out after {timeout}s for eval_data_id={payload.eval_data_id}")
-        raise HTTPException(status_code=504, detail="evaluation timed out")
-    except Exception as e:
-        logger.exception(f"execute_eval failed for eval_data_id={payload.eval_data_id}: {e}")
-        raise HTTPException(status_code=500, detail="evaluation failed")
+    with span('eval.item', eval_data_id=payload.eval_data_id):
+        with span('db.load'), SessionLocal() as session:
+            data = session.get(EvalDataORM, payload.eval_data_id)
+            if not data or data.deleted:
+                raise HTTPException(status_code=404, detail="评测数据不存在")
+            eval_set_id = data.eval_set_id
+            corpus_id = data.corpus_id
+            content = data.content
+            expected = data.expected
+            expected_intent = data.intent or ''
 
-    # 解析 agent 版本信息，优先 version 字段，不存在则存整个JSON字符串
-    agent_version_value = None
-    if agent_info:
-        if isinstance(agent_info, dict):
-            agent_version_value = agent_info.get('version') or agent_info.get('agent_version') or None
-            if agent_version_value is None:
-                import json as _json
-                agent_version_value = _json.dumps(agent_info, ensure_ascii=False)
-        else:
-            agent_version_value = str(agent_info)
+        client = AIClient()
+        # 并发调用（答案/意图/知识库 + 同步获取agent信息放在线程池）
+        loop = asyncio.get_running_loop()
+        timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+        ans_task = asyncio.create_task(client.aget_answer(content))
+        intent_task = asyncio.create_task(client.aget_intent(content))
+        kdb_task = asyncio.create_task(client.ais_Kdb(content))
+        info_task = loop.run_in_executor(None, in_executor(client.get_agent_info))
+        try:
+            answer, intent, kdb_flag, agent_info = await asyncio.wait_for(
+                asyncio.gather(ans_task, intent_task, kdb_task, info_task), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"execute_eval timed out after {timeout}s for eval_data_id={payload.eval_data_id}")
+            raise HTTPException(status_code=504, detail="evaluation timed out")
+        except Exception as e:
+            logger.exception(f"execute_eval failed for eval_data_id={payload.eval_data_id}: {e}")
+            raise HTTPException(status_code=500, detail="evaluation failed")
 
-    # scoring runs only after answer is available; use helper to protect with timeout
-    score = await _safe_score(answer, expected)
-
-    create_payload = EvalResultCreate(
-        eval_set_id=eval_set_id,
-        # store corpus_id (评测集内的序号) in eval_results.eval_data_id per new requirement
-        eval_data_id=data.corpus_id,
-        actual_result=answer,
-        actual_intent=intent,
-        score=score,
-        agent_version=payload.agent_version or agent_version_value,
-        kdb=kdb_flag,
-        exec_time=datetime.utcnow(),
-    )
-    return eval_result_service.create_result(create_payload)
+        # 解析 agent 版本信息，优先 version 字段，不存在则存整个JSON字符串
+        agent_version_value = None
+        if agent_info:
+            if isinstance(agent_info, dict):
+                agent_version_value = agent_info.get('version') or agent_info.get('agent_version') or None
+                if agent_version_value is None:
+                    import json as _json
+                    agent_version_value = _json.dumps(agent_info, ensure_ascii=False)
+            else:
+                agent_version_value = str(agent_info)
+
+        # scoring runs only after answer is available; use helper to protect with timeout
+        score = await _safe_score(answer, expected)
+
+        create_payload = EvalResultCreate(
+            eval_set_id=eval_set_id,
+            # store corpus_id (评测集内的序号) in eval_results.eval_data_id per new requirement
+            eval_data_id=corpus_id,
+            actual_result=answer,
+            actual_intent=intent,
+            score=score,
+            agent_version=payload.agent_version or agent_version_value,
+            kdb=kdb_flag,
+            exec_time=datetime.utcnow(),
+        )
+        return await _persist_result(create_payload, expected_intent)
 
 
 class BatchExecResponse(BaseModel):
@@ -151,6 +203,7 @@ class BatchExecResponse(BaseModel):
     result_ids: List[int]
     errors: List[str]
     durations_ms: List[float]  # 每条记录耗时（毫秒）对应 result_ids 顺序或错误发生的条目位置
+    run_id: Optional[str] = None  # 本次批量执行的运行 id，可用于查询结果汇总
 
 
 class MultiSetExecPayload(BaseModel):
@@ -175,15 +228,18 @@ class MultiSetExecResponse(BaseModel):
     overall_total: int
     overall_succeeded: int
     overall_failed: int
+    run_id: Optional[str] = None
 
 
 @router.post("/execute/byset/{eval_set_id}", response_model=BatchExecResponse, summary="批量执行评测集内所有评测数据")
 async def batch_execute_eval_set(eval_set_id: int):
     """对指定评测集的所有未删除评测数据执行评测，采用并发方式。"""
     # 获取所有评测数据
-    data_items = eval_data_service.list_by_eval_set(eval_set_id)
+    with span('db.load', eval_set_id=eval_set_id):
+        data_items = eval_data_service.list_by_eval_set(eval_set_id)
     if not data_items:
-        return BatchExecResponse(total=0, succeeded=0, failed=0, result_ids=[], errors=[])
+        return BatchExecResponse(total=0, succeeded=0, failed=0, result_ids=[], errors=[], durations_ms=[])
+    run_id = uuid.uuid4().hex
 
     client = AIClient()
     loop = asyncio.get_running_loop()
@@ -205,40 +261,46 @@ async def batch_execute_eval_set(eval_set_id: int):
     durations: List[float] = []
 
     async def process_item(item):
-        async with semaphore:
-            try:
-                import time
-                start = time.perf_counter()
-                ans_task = asyncio.create_task(client.aget_answer(item.content))
-                intent_task = asyncio.create_task(client.aget_intent(item.content))
-                kdb_task = asyncio.create_task(client.ais_Kdb(item.content))
-                timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+        async with limited(semaphore, 'items'):
+            with span('eval.item', eval_set_id=item.eval_set_id, corpus_id=item.corpus_id, run_id=run_id) as item_span:
                 try:
-                    answer, intent, kdb_flag = await asyncio.wait_for(
-                        asyncio.gather(ans_task, intent_task, kdb_task), timeout=timeout
+                    import time
+                    start = time.perf_counter()
+                    ans_task = asyncio.create_task(client.aget_answer(item.content))
+                    intent_task = asyncio.create_task(client.aget_intent(item.content))
+                    kdb_task = asyncio.create_task(client.ais_Kdb(item.content))
+                    timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+                    try:
+                        answer, intent, kdb_flag = await asyncio.wait_for(
+                            asyncio.gather(ans_task, intent_task, kdb_task), timeout=timeout
+                        )
+                    except asyncio.TimeoutError:
+                        raise RuntimeError(f"item eval timed out after {timeout}s")
+                    # scoring after answer is available, with timeout/error protection
+                    score = await _safe_score(answer, item.expected)
+                    create_payload = EvalResultCreate(
+                        eval_set_id=item.eval_set_id,
+                        # store corpus_id instead of global id
+                        eval_data_id=item.corpus_id,
+                        actual_result=answer,
+                        actual_intent=intent,
+                        score=score,
+                        agent_version=agent_version_value,
+                        kdb=kdb_flag,
+                        exec_time=datetime.utcnow(),
+                        run_id=run_id,
                     )
-                except asyncio.TimeoutError:
-                    raise RuntimeError(f"item eval timed out after {timeout}s")
-                # scoring after answer is available, with timeout/error protection
-                score = await _safe_score(answer, item.expected)
-                create_payload = EvalResultCreate(
-                    eval_set_id=item.eval_set_id,
-                    # store corpus_id instead of global id
-                    eval_data_id=item.corpus_id,
-                    actual_result=answer,
-                    actual_intent=intent,
-                    score=score,
-                    agent_version=agent_version_value,
-                    kdb=kdb_flag,
-                    exec_time=datetime.utcnow(),
-                )
-                res = eval_result_service.create_result(create_payload)
-                result_ids.append(res.id)
-                end = time.perf_counter()
-                durations.append((end - start) * 1000)
-            except Exception as e:
-                logger.exception(f"process_item failed eval_data_id={item.id}: {e}")
-                errors.append(f"eval_data_id={item.id}: {e}")
+                    res = await _persist_result(create_payload, item.intent or '')
+                    result_ids.append(res.id)
+                    end = time.perf_counter()
+                    durations.append((end - start) * 1000)
+                    EVAL_ITEMS.inc('success')
+                    EVAL_ITEM_DURATION.observe(end - start)
+                except Exception as e:
+                    logger.exception(f"process_item failed eval_data_id={item.id}: {e}")
+                    errors.append(f"eval_data_id={item.id}: {e}")
+                    EVAL_ITEMS.inc('error')
+                    item_span.fail(e)
 
     await asyncio.gather(*[process_item(d) for d in data_items])
 
@@ -249,12 +311,12 @@ async def batch_execute_eval_set(eval_set_id: int):
         result_ids=result_ids,
         errors=errors,
         durations_ms=durations,
+        run_id=run_id,
     )
 
 
 # New async job-based execution: start background job and return job_id for polling
 from db.models import Job as JobORM
-import uuid
 import threading
 
 
@@ -262,7 +324,8 @@ def _background_run_eval_set(job_id: str, eval_set_id: int):
     # run the same logic as batch_execute but update JobORM processed/total/status
     with SessionLocal() as session:
         job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
-        data_items = eval_data_service.list_by_eval_set(eval_set_id)
+        with span('db.load', eval_set_id=eval_set_id, job_id=job_id):
+            data_items = eval_data_service.list_by_eval_set(eval_set_id)
         total = len(data_items)
         job.total = total
         job.status = 'running'
@@ -292,46 +355,56 @@ def _background_run_eval_set(job_id: str, eval_set_id: int):
         errors = []
 
         async def process_item(item):
-            async with semaphore:
-                try:
-                    import time
-                    start = time.perf_counter()
-                    ans_task = asyncio.create_task(client.aget_answer(item.content))
-                    intent_task = asyncio.create_task(client.aget_intent(item.content))
-                    kdb_task = asyncio.create_task(client.ais_Kdb(item.content))
-                    timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+            async with limited(semaphore, 'items'):
+                with span('eval.item', eval_set_id=item.eval_set_id, corpus_id=item.corpus_id, job_id=job_id) as item_span:
                     try:
-                        answer, intent, kdb_flag = await asyncio.wait_for(
-                            asyncio.gather(ans_task, intent_task, kdb_task), timeout=timeout
+                        import time
+                        start = time.perf_counter()
+                        ans_task = asyncio.create_task(client.aget_answer(item.content))
+                        intent_task = asyncio.create_task(client.aget_intent(item.content))
+                        kdb_task = asyncio.create_task(client.ais_Kdb(item.content))
+                        timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+                        try:
+                            answer, intent, kdb_flag = await asyncio.wait_for(
+                                asyncio.gather(ans_task, intent_task, kdb_task), timeout=timeout
+                            )
+                        except asyncio.TimeoutError:
+                            raise RuntimeError(f"item eval timed out after {timeout}s")
+                        score = await _safe_score(answer, item.expected)
+                        create_payload = EvalResultCreate(
+                            eval_set_id=item.eval_set_id,
+                            eval_data_id=item.corpus_id,
+                            actual_result=answer,
+                            actual_intent=intent,
+                            score=score,
+                            agent_version=agent_version_value,
+                            kdb=kdb_flag,
+                            exec_time=datetime.utcnow(),
+                            # 异步任务以 job_id 作为运行 id
+                            run_id=job_id,
                         )
-                    except asyncio.TimeoutError:
-                        raise RuntimeError(f"item eval timed out after {timeout}s")
-                    score = await _safe_score(answer, item.expected)
-                    create_payload = EvalResultCreate(
-                        eval_set_id=item.eval_set_id,
-                        eval_data_id=item.corpus_id,
-                        actual_result=answer,
-                        actual_intent=intent,
-                        score=score,
-                        agent_version=agent_version_value,
-                        kdb=kdb_flag,
-                        exec_time=datetime.utcnow(),
-                    )
-                    res = eval_result_service.create_result(create_payload)
-                    result_ids.append(res.id)
-                    end = time.perf_counter()
-                    # update job processed count
-                    with SessionLocal() as s2:
-                        j2 = s2.query(JobORM).filter(JobORM.job_id == job_id).first()
-                        if j2:
-                            j2.processed = (j2.processed or 0) + 1
-                            s2.add(j2)
-                            s2.commit()
-                except Exception as e:
-                    logger.exception(f"background process_item failed eval_data_id={item.id}: {e}")
-                    errors.append(f"eval_data_id={item.id}: {e}")
+                        with span('db.persist'):
+                            res = eval_result_service.create_result(create_payload, expected_intent=item.intent or '')
+                        result_ids.append(res.id)
+                        end = time.perf_counter()
+                        EVAL_ITEMS.inc('success')
+                        EVAL_ITEM_DURATION.observe(end - start)
+                        # update job processed count
+                        with SessionLocal() as s2:
+                            j2 = s2.query(JobORM).filter(JobORM.job_id == job_id).first()
+                            if j2:
+                                j2.processed = (j2.processed or 0) + 1
+                                s2.add(j2)
+                                s2.commit()
+                    except Exception as e:
+                        logger.exception(f"background process_item failed eval_data_id={item.id}: {e}")
+                        errors.append(f"eval_data_id={item.id}: {e}")
+                        EVAL_ITEMS.inc('error')
+                        item_span.fail(e)
 
         # run the gather synchronously in this thread's event loop
+        import time
+        job_start = time.perf_counter()
         try:
             loop.run_until_complete(asyncio.gather(*[process_item(d) for d in data_items]))
             # mark success
@@ -343,6 +416,7 @@ def _background_run_eval_set(job_id: str, eval_set_id: int):
                     j3.processed = j3.total
                     s3.add(j3)
                     s3.commit()
+            record_job_finished('execute', 'success', len(result_ids), time.perf_counter() - job_start)
         except Exception as e:
             with SessionLocal() as s4:
                 j4 = s4.query(JobORM).filter(JobORM.job_id == job_id).first()
@@ -352,6 +426,7 @@ def _background_run_eval_set(job_id: str, eval_set_id: int):
                     j4.finished_at = datetime.utcnow()
                     s4.add(j4)
                     s4.commit()
+            record_job_finished('execute', 'failed', len(result_ids), time.perf_counter() - job_start)
         finally:
             try:
                 loop.close()
@@ -364,7 +439,7 @@ def batch_execute_eval_set_async(eval_set_id: int):
     # create job record
     job_uuid = str(uuid.uuid4())
     with SessionLocal() as session:
-        job = JobORM(job_id=job_uuid, eval_set_id=eval_set_id, status='pending', processed=0, total=0)
+        job = JobORM(job_id=job_uuid, kind='execute', eval_set_id=eval_set_id, status='pending', processed=0, total=0)
         session.add(job)
         session.commit()
 
@@ -394,9 +469,11 @@ async def batch_execute_multiple_sets(payload: MultiSetExecPayload):
             agent_version_value = str(agent_info)
 
     per_set_results: List[MultiSetExecSetResult] = []
+    run_id = uuid.uuid4().hex
 
     async def run_set(sid: int):
-        items = eval_data_service.list_by_eval_set(sid)
+        with span('db.load', eval_set_id=sid, run_id=run_id):
+            items = eval_data_service.list_by_eval_set(sid)
         if not items:
             per_set_results.append(MultiSetExecSetResult(eval_set_id=sid, total=0, succeeded=0, failed=0, result_ids=[], errors=[], durations_ms=[]))
             return
@@ -404,37 +481,43 @@ async def batch_execute_multiple_sets(payload: MultiSetExecPayload):
         errors: List[str] = []
         durations: List[float] = []
         for it in items:
-            try:
-                import time
-                start = time.perf_counter()
-                ans_task = asyncio.create_task(client.aget_answer(it.content))
-                intent_task = asyncio.create_task(client.aget_intent(it.content))
-                kdb_task = asyncio.create_task(client.ais_Kdb(it.content))
-                timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+            with span('eval.item', eval_set_id=it.eval_set_id, corpus_id=it.corpus_id, run_id=run_id) as item_span:
                 try:
-                    answer, intent, kdb_flag = await asyncio.wait_for(
-                        asyncio.gather(ans_task, intent_task, kdb_task), timeout=timeout
+                    import time
+                    start = time.perf_counter()
+                    ans_task = asyncio.create_task(client.aget_answer(it.content))
+                    intent_task = asyncio.create_task(client.aget_intent(it.content))
+                    kdb_task = asyncio.create_task(client.ais_Kdb(it.content))
+                    timeout = getattr(settings, 'external_call_timeout_seconds', 60)
+                    try:
+                        answer, intent, kdb_flag = await asyncio.wait_for(
+                            asyncio.gather(ans_task, intent_task, kdb_task), timeout=timeout
+                        )
+                    except asyncio.TimeoutError:
+                        raise RuntimeError(f"item eval timed out after {timeout}s")
+                    score = await _safe_score(answer, it.expected)
+                    create_payload = EvalResultCreate(
+                        eval_set_id=it.eval_set_id,
+                        eval_data_id=it.corpus_id,
+                        actual_result=answer,
+                        actual_intent=intent,
+                        score=score,
+                        agent_version=agent_version_value,
+                        kdb=kdb_flag,
+                        exec_time=datetime.utcnow(),
+                        run_id=run_id,
                     )
-                except asyncio.TimeoutError:
-                    raise RuntimeError(f"item eval timed out after {timeout}s")
-                score = await _safe_score(answer, it.expected)
-                create_payload = EvalResultCreate(
-                    eval_set_id=it.eval_set_id,
-                    eval_data_id=it.corpus_id,
-                    actual_result=answer,
-                    actual_intent=intent,
-                    score=score,
-                    agent_version=agent_version_value,
-                    kdb=kdb_flag,
-                    exec_time=datetime.utcnow(),
-                )
-                res = eval_result_service.create_result(create_payload)
-                result_ids.append(res.id)
-                end = time.perf_counter()
-                durations.append((end - start) * 1000)
-            except Exception as e:
-                logger.exception(f"run_set failed eval_set_id={sid} eval_data_id={it.id}: {e}")
-                errors.append(f"eval_set_id={sid} eval_data_id={it.id}: {e}")
+                    res = await _persist_result(create_payload, it.intent or '')
+                    result_ids.append(res.id)
+                    end = time.perf_counter()
+                    durations.append((end - start) * 1000)
+                    EVAL_ITEMS.inc('success')
+                    EVAL_ITEM_DURATION.observe(end - start)
+                except Exception as e:
+                    logger.exception(f"run_set failed eval_set_id={sid} eval_data_id={it.id}: {e}")
+                    errors.append(f"eval_set_id={sid} eval_data_id={it.id}: {e}")
+                    EVAL_ITEMS.inc('error')
+                    item_span.fail(e)
         per_set_results.append(MultiSetExecSetResult(
             eval_set_id=sid,
             total=len(items),
@@ -450,9 +533,17 @@ async def batch_execute_multiple_sets(payload: MultiSetExecPayload):
         set_semaphore = asyncio.Semaphore(payload.global_concurrency)
 
         async def guarded_run(sid: int):
-            async with set_semaphore:
+            async with limited(set_semaphore, 'sets'):
                 await run_set(sid)
 
         await asyncio.gather(*[guarded_run(sid) for sid in payload.eval_set_ids])
     else:
         await asyncio.gather(*[run_set(sid) for sid in payload.eval_set_ids])
+
+    return MultiSetExecResponse(
+        sets=per_set_results,
+        overall_total=sum(r.total for r in per_set_results),
+        overall_succeeded=sum(r.succeeded for r in per_set_results),
+        overall_failed=sum(r.failed for r in per_set_results),
+        run_id=run_id,
+    )
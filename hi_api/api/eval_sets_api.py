@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import os
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
 from typing import List
 from models.eval_set import EvalSet
 from services.eval_set_service import eval_set_service
@@ -8,16 +9,16 @@ from fastapi import Response
 from models.eval_set import EvalSetUpdate
 from fastapi import Path
 from fastapi import UploadFile, File, Form
-import tempfile
-import openpyxl
-import uuid
-import os
 from services.eval_data_service import eval_data_service
-from db.sqlalchemy import SessionLocal
-from db.models import Job as JobORM
-from services.upload_job_worker import process_upload_job
+from db.sqlalchemy import unit_of_work
+from services.job_service import job_service
+from services.upload_job_worker import process_upload_job, save_upload, UploadTooLargeError, UPLOAD_MAX_BYTES, IMPORT_MODES
+from services.batch_upload_worker import process_batch_upload_job
+from services.import_preview import preview_file, PREVIEW_ROWS, PREVIEW_MAX_ROWS
+from services.import_readers import ImportFormatError
 
-router = APIRouter()
+# 每个请求共享一个 Session，结束时统一提交
+router = APIRouter(dependencies=[unit_of_work])
 
 
 @router.get("/", response_model=List[EvalSet])
@@ -54,19 +55,22 @@ def update_eval_set(id: int, payload: EvalSetUpdate = Body(...)):
     return updated
 
 
-@router.post("/upload", summary="上传 Excel 导入评测数据")
-def upload_evalset_excel(file: UploadFile = File(...), name: str = Form(...), background_tasks: BackgroundTasks = None):
+@router.post("/upload", summary="上传 Excel / CSV / TSV / JSONL 导入评测数据")
+def upload_evalset_excel(request: Request, file: UploadFile = File(...), name: str = Form(...),
+                         mode: str = Form('append', description="append 追加全部行；skip 跳过内容已存在的行；upsert 内容已存在时更新 expected/intent"),
+                         background_tasks: BackgroundTasks = None):
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=422, detail=f"mode 必须是 {' / '.join(IMPORT_MODES)} 之一")
+    # 声明的请求体已超过上限时直接拒绝（multipart 解析时文件已溢出到磁盘临时文件，不占内存）
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {UPLOAD_MAX_BYTES} 字节")
     try:
         # 使用前端提交的评测集名称
         if not name or not name.strip():
             raise ValueError("评测集名称不能为空")
-        # 保存上传文件到临时目录
-        tmp_dir = tempfile.gettempdir()
-        unique_name = f"upload_{uuid.uuid4().hex}_{file.filename}"
-        tmp_path = os.path.join(tmp_dir, unique_name)
-        with open(tmp_path, "wb") as f:
-            content = file.file.read()
-            f.write(content)
+        # 按块落盘到临时目录，同时计算内容哈希并检查大小
+        tmp_path, size, file_hash = save_upload(file.file, file.filename)
 
         # 创建或查找评测集（先不刷新计数，等待后台任务完成）
         existing = eval_set_service.get_by_name(name)
@@ -77,11 +81,8 @@ def upload_evalset_excel(file: UploadFile = File(...), name: str = Form(...), ba
             eval_set_id = new_set.id
 
         # 在 jobs 表创建任务记录
-        job_uuid = uuid.uuid4().hex
-        with SessionLocal() as session:
-            job = JobORM(job_id=job_uuid, eval_set_id=eval_set_id, status='pending', processed=0, total=0, file_path=tmp_path)
-            session.add(job)
-            session.commit()
+        job_uuid = job_service.create('upload', eval_set_id=eval_set_id, file_path=tmp_path, file_hash=file_hash,
+                                      options={'mode': mode})
 
         # 将后台处理任务加入 BackgroundTasks（或立即异步触发）
         if background_tasks is not None:
@@ -91,10 +92,52 @@ def upload_evalset_excel(file: UploadFile = File(...), name: str = Form(...), ba
             import threading
             threading.Thread(target=process_upload_job, args=(job_uuid,)).start()
 
-        return {"job_id": job_uuid, "eval_set_id": eval_set_id}
+        return {"job_id": job_uuid, "eval_set_id": eval_set_id, "size": size, "file_hash": file_hash}
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {UPLOAD_MAX_BYTES} 字节")
     except Exception as e:
         from utils.log import get_logger
         logger = get_logger('evalset_upload')
         logger.exception(f"upload_evalset_excel failed: {e}")
         raise HTTPException(status_code=500, detail=f"upload failed: {e}")
- 
+
+
+@router.post("/upload/preview", summary="导入预览：识别列映射、返回前 N 行并抽样校验，不写库")
+def preview_evalset_upload(request: Request, file: UploadFile = File(...),
+                           rows: int = Form(PREVIEW_ROWS, ge=1, le=PREVIEW_MAX_ROWS, description="返回的预览行数")):
+    """与 /upload 接受相同的文件；校验规则与写入时一致，大文件按抽样结果估算错误数"""
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {UPLOAD_MAX_BYTES} 字节")
+    try:
+        tmp_path, size, file_hash = save_upload(file.file, file.filename)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {UPLOAD_MAX_BYTES} 字节")
+    try:
+        result = preview_file(tmp_path, rows)
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"无法解析文件：{e}")
+    finally:
+        os.remove(tmp_path)
+    result['file_hash'] = file_hash
+    return result
+
+
+@router.post("/upload_batch", summary="批量导入：工作簿的每个工作表或 zip 中的每个文件各建一个评测集")
+def upload_evalset_batch(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                         prefix: str = Form('', description="评测集名称前缀，名称为 <前缀>-<工作表名/文件名>；为空时直接用工作表名/文件名"),
+                         mode: str = Form('append', description="各部分的导入模式，同 /upload")):
+    """返回父任务 job_id；各部分的子任务与进度通过 GET /api/v1/jobs/{job_id}/children 查询"""
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=422, detail=f"mode 必须是 {' / '.join(IMPORT_MODES)} 之一")
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {UPLOAD_MAX_BYTES} 字节")
+    try:
+        tmp_path, size, file_hash = save_upload(file.file, file.filename)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {UPLOAD_MAX_BYTES} 字节")
+    job_uuid = job_service.create('upload_batch', file_path=tmp_path, file_hash=file_hash,
+                                  options={'mode': mode, 'prefix': prefix.strip() or None})
+    background_tasks.add_task(process_batch_upload_job, job_uuid)
+    return {"job_id": job_uuid, "size": size, "file_hash": file_hash}
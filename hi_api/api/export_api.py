@@ -0,0 +1,90 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional
+import os
+import tempfile
+from urllib.parse import quote
+from services.eval_set_service import eval_set_service
+from services.export_service import export_service, export_path, EXPORT_FORMATS, EXPORT_KINDS, MEDIA_TYPES
+from services.job_service import job_service
+from db.sqlalchemy import SessionLocal
+from db.models import Job as JobORM
+from utils.log import get_logger
+import json
+
+logger = get_logger("export_api")
+
+router = APIRouter(prefix="/api/v1/export", tags=["export"])
+
+FORMAT_QUERY = Query('csv', description="csv / xlsx / parquet / arrow（Arrow IPC 文件，意图与版本列按字典编码）")
+ARCHIVED_QUERY = Query(True, description="kind=results 时是否包含已归档到 Parquet 的历史结果（排在库中结果之前）")
+
+
+def _check(id: int, kind: str, format: str):
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format 必须是 {' / '.join(EXPORT_FORMATS)} 之一")
+    if not eval_set_service.get_eval_set(id):
+        raise HTTPException(status_code=404, detail="Eval set not found")
+
+
+def _disposition(filename: str) -> dict:
+    return {'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"}
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@router.get("/evalsets/{id}/{kind}", summary="流式导出评测数据（kind=data）或关联语料的评测结果（kind=results）")
+def export_eval_set(id: int, kind: str, format: str = FORMAT_QUERY,
+                    agent_version: Optional[str] = Query(None, description="只导出该版本的结果（kind=results）"),
+                    run_id: Optional[str] = Query(None, description="只导出该次运行的结果（kind=results）"),
+                    include_archived: bool = ARCHIVED_QUERY):
+    """CSV 边查边输出；XLSX / Parquet / Arrow 先在临时文件中逐块生成再发送。都从服务端游标按块读取，内存占用与行数无关"""
+    _check(id, kind, format)
+    filename = f"evalset_{id}_{kind}.{format}"
+    if format == 'csv':
+        return StreamingResponse(export_service.iter_csv(kind, id, agent_version, run_id, include_archived),
+                                 media_type=MEDIA_TYPES['csv'], headers=_disposition(filename))
+    fd, path = tempfile.mkstemp(suffix=f'.{format}', prefix='export_')
+    os.close(fd)
+    try:
+        export_service.write(path, format, kind, id, agent_version, run_id, include_archived=include_archived)
+    except Exception:
+        _remove(path)
+        raise
+    return FileResponse(path, media_type=MEDIA_TYPES[format], filename=filename, background=BackgroundTask(_remove, path))
+
+
+@router.post("/evalsets/{id}/{kind}", summary="后台导出，完成后通过 /api/v1/export/files/{job_id} 下载")
+def start_export_job(id: int, kind: str, background_tasks: BackgroundTasks, format: str = FORMAT_QUERY,
+                     agent_version: Optional[str] = Query(None), run_id: Optional[str] = Query(None),
+                     include_archived: bool = ARCHIVED_QUERY):
+    """进度通过 GET /api/v1/jobs/{job_id} 查询，结束后 result.download_url 为下载地址"""
+    _check(id, kind, format)
+    job_id = job_service.create('export', eval_set_id=id, options={
+        'kind': kind, 'format': format, 'agent_version': agent_version, 'run_id': run_id, 'include_archived': include_archived})
+    background_tasks.add_task(export_service.run_export_job, job_id, format, kind, id, agent_version, run_id, include_archived)
+    return {"job_id": job_id}
+
+
+@router.get("/files/{job_id}", summary="下载后台导出的文件")
+def download_export(job_id: str):
+    with SessionLocal() as session:
+        job = session.query(JobORM).filter(JobORM.job_id == job_id, JobORM.kind == 'export').first()
+        if not job:
+            raise HTTPException(status_code=404, detail="job not found")
+        status, options, eval_set_id = job.status, json.loads(job.options or '{}'), job.eval_set_id
+    if status != 'success':
+        raise HTTPException(status_code=409, detail=f"export job is {status}")
+    path = export_path(job_id, options.get('format', 'csv'))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="export file has expired")
+    fmt = options.get('format', 'csv')
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], filename=f"evalset_{eval_set_id}_{options.get('kind')}.{fmt}")
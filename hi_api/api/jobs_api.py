@@ -1,10 +1,16 @@
-from fastapi import APIRouter, HTTPException
-from typing import Any
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from typing import Any, Optional
+import json
 from db.sqlalchemy import SessionLocal
 from db.models import Job as JobORM
 from pydantic import BaseModel
 from db.sqlalchemy import Base, engine
 from fastapi import status
+from services.cleanup_service import run_cleanup
+from services.job_service import job_service
+from utils.log import get_logger
+
+logger = get_logger("jobs_api")
 
 router = APIRouter()
 
@@ -15,6 +21,11 @@ class JobStatus(BaseModel):
     processed: int
     total: int
     error: Any = None
+    kind: Optional[str] = None
+    result: Any = None  # 任务结束时的结果摘要
+    file_hash: Optional[str] = None  # 上传任务的文件 SHA-256
+    options: Any = None  # 任务参数，如导入模式
+    parent_job_id: Optional[str] = None  # 批量导入子任务所属的父任务
 
 
 @router.get("/api/v1/jobs/{job_id}", response_model=JobStatus)
@@ -29,9 +40,39 @@ def get_job_status(job_id: str):
             processed=job.processed or 0,
             total=job.total or 0,
             error=job.error,
+            kind=job.kind,
+            result=json.loads(job.result) if job.result else None,
+            file_hash=job.file_hash,
+            options=json.loads(job.options) if job.options else None,
+            parent_job_id=job.parent_job_id,
         )
 
 
+@router.get("/api/v1/jobs/{job_id}/children", summary="批量导入父任务下各子任务的状态与进度")
+def get_job_children(job_id: str):
+    with SessionLocal() as session:
+        if not session.query(JobORM.id).filter(JobORM.job_id == job_id).first():
+            raise HTTPException(status_code=404, detail="job not found")
+    return job_service.children(job_id)
+
+
+@router.post("/api/v1/jobs/cleanup", summary="清理已删除数据、过期任务与临时文件")
+def start_cleanup(background_tasks: BackgroundTasks, dry_run: bool = Query(False, description="只统计待清理的行数与文件数")):
+    """dry_run 时同步返回统计；否则在后台执行并返回 job_id，进度通过 GET /api/v1/jobs/{job_id} 查询"""
+    if dry_run:
+        return run_cleanup(dry_run=True)
+    job_id = job_service.create('cleanup')
+
+    def _run():
+        try:
+            run_cleanup(dry_run=False, job_id=job_id)
+        except Exception as e:
+            logger.exception(f"cleanup job {job_id} failed: {e}")
+
+    background_tasks.add_task(_run)
+    return {"job_id": job_id}
+
+
 @router.post("/api/v1/jobs/create_tables", status_code=status.HTTP_200_OK)
 def create_tables():
     """Dev helper: create DB tables from SQLAlchemy Base metadata."""
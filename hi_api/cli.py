@@ -0,0 +1,55 @@
+"""命令行工具：在服务器上直接执行维护类操作，不经过 HTTP 接口。
+
+用法：
+    python cli.py export --eval-set 3 --kind results --format parquet -o results.parquet
+    python cli.py export --eval-set 3 --kind results --agent-version v2 --format arrow -o v2.arrow
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from services.export_service import export_service, EXPORT_FORMATS, EXPORT_KINDS
+
+
+def _export(args) -> int:
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in EXPORT_FORMATS:
+        print(f"unsupported format: {fmt!r}, choose one of {', '.join(EXPORT_FORMATS)}", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    tmp = args.output + '.tmp'
+    try:
+        rows = export_service.write(tmp, fmt, args.kind, args.eval_set, args.agent_version, args.run_id,
+                                    include_archived=not args.no_archived)
+        os.replace(tmp, args.output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    print(f"exported {rows} rows to {args.output} ({os.path.getsize(args.output)} bytes, "
+          f"{time.perf_counter() - start:.1f}s)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='cli.py', description='hi_api 命令行工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('export', help='导出评测数据或关联语料的评测结果（CSV / XLSX / Parquet / Arrow IPC）')
+    p.add_argument('--eval-set', type=int, required=True, help='评测集 id')
+    p.add_argument('--kind', choices=EXPORT_KINDS, default='results', help='data：语料；results：结果关联语料（默认）')
+    p.add_argument('--format', choices=EXPORT_FORMATS, help='省略时按输出文件扩展名判断')
+    p.add_argument('--agent-version', help='只导出该版本的结果')
+    p.add_argument('--run-id', help='只导出该次运行的结果')
+    p.add_argument('--no-archived', action='store_true', help='不包含已归档到 Parquet 的历史结果')
+    p.add_argument('-o', '--output', required=True, help='输出文件路径')
+    p.set_defaults(func=_export)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
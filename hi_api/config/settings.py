@@ -25,6 +25,11 @@ class Settings(BaseModel):
 	external_max_retries: int = 2
 	default_user_phone: str = "11111111111"
 	default_hotline_phone: str = "43001"
+	# 评测集元数据进程内缓存（TTL 秒，0 表示关闭；最大条目数）
+	eval_set_cache_ttl_seconds: float = 30
+	eval_set_cache_max_entries: int = 1024
+	# 可选只读副本连接串（列表、全局搜索、结果浏览、统计分析走副本；写入与读自己的写留在主库）
+	read_replica_url: Optional[str] = None
 
 	@classmethod
 	def load(cls):
@@ -46,6 +51,9 @@ class Settings(BaseModel):
 			'HI_SCORING_API_KEY': 'scoring_api_key',
 			'HI_DEFAULT_USER_PHONE': 'default_user_phone',
 			'HI_DEFAULT_HOTLINE_PHONE': 'default_hotline_phone',
+			'HI_EVAL_SET_CACHE_TTL_SECONDS': 'eval_set_cache_ttl_seconds',
+			'HI_EVAL_SET_CACHE_MAX_ENTRIES': 'eval_set_cache_max_entries',
+			'HI_READ_REPLICA_URL': 'read_replica_url',
 		}
 		for env_key, field in mapping.items():
 			if env_key in os.environ:
@@ -7,6 +7,13 @@ CREATE TABLE IF NOT EXISTS `eval_data` (
   `expected` VARCHAR(2000) NULL COMMENT '预期结果',
   `intent` VARCHAR(255) NULL COMMENT '意图',
   `deleted` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '软删除标记',
+  `row_hash` VARCHAR(64) NULL COMMENT '规范化 content 的 SHA-256（去重导入键，已删除或待回填时为空）',
   PRIMARY KEY (`id`),
-  INDEX (`eval_set_id`)
+  INDEX (`eval_set_id`),
+  INDEX `idx_eval_data_set_corpus` (`eval_set_id`, `corpus_id`),
+  UNIQUE KEY `uq_eval_data_set_row_hash` (`eval_set_id`, `row_hash`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 已有表升级（row_hash 由去重导入在使用前按评测集回填）：
+-- ALTER TABLE `eval_data` ADD COLUMN `row_hash` VARCHAR(64) NULL COMMENT '规范化 content 的 SHA-256' AFTER `deleted`,
+--   ADD UNIQUE KEY `uq_eval_data_set_row_hash` (`eval_set_id`, `row_hash`);
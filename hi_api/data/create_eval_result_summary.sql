@@ -0,0 +1,30 @@
+-- 创建 eval_result_summary 表（评测结果汇总表）
+-- 说明：按 (eval_set_id, agent_version, run_id) 增量维护的结果汇总，随 eval_results 写入在同一事务内更新
+CREATE TABLE IF NOT EXISTS `eval_result_summary` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `eval_set_id` INT NOT NULL COMMENT '评测集id',
+  `agent_version` VARCHAR(100) NOT NULL DEFAULT '' COMMENT 'Agent版本（空串表示未知）',
+  `run_id` VARCHAR(64) NOT NULL DEFAULT '' COMMENT '运行id（空串表示单条执行）',
+  `count` INT NOT NULL DEFAULT 0 COMMENT '结果条数',
+  `scored_count` INT NOT NULL DEFAULT 0 COMMENT '有分数的结果条数',
+  `score_sum` INT NOT NULL DEFAULT 0 COMMENT '分数和',
+  `kdb_hits` INT NOT NULL DEFAULT 0 COMMENT '命中知识库条数',
+  `intent_matches` INT NOT NULL DEFAULT 0 COMMENT '实际意图与预期意图一致的条数',
+  `updated_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_eval_result_summary_key` (`eval_set_id`, `agent_version`, `run_id`),
+  KEY `idx_eval_result_summary_set` (`eval_set_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='评测结果汇总表';
+
+-- 分数直方图：每个 (eval_set_id, agent_version, run_id, score) 一行，与汇总行一样用 count = count + n 原子更新
+CREATE TABLE IF NOT EXISTS `eval_result_score_hist` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `eval_set_id` INT NOT NULL COMMENT '评测集id',
+  `agent_version` VARCHAR(100) NOT NULL DEFAULT '' COMMENT 'Agent版本（空串表示未知）',
+  `run_id` VARCHAR(64) NOT NULL DEFAULT '' COMMENT '运行id（空串表示单条执行）',
+  `score` INT NOT NULL COMMENT '分数',
+  `count` INT NOT NULL DEFAULT 0 COMMENT '该分数的结果条数',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_eval_result_score_hist_key` (`eval_set_id`, `agent_version`, `run_id`, `score`),
+  KEY `idx_eval_result_score_hist_set` (`eval_set_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='评测结果分数直方图';
@@ -11,7 +11,11 @@ CREATE TABLE IF NOT EXISTS `eval_results` (
   `agent_version` VARCHAR(64) NULL COMMENT 'Agent版本',
   `kdb` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否命中知识库（0否 1是）',
   `deleted` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否删除（软删除标记）',
+  `run_id` VARCHAR(64) NULL COMMENT '批量执行的运行id（单条执行为空）',
   PRIMARY KEY (`id`),
   KEY `idx_eval_set` (`eval_set_id`),
-  KEY `idx_eval_data` (`eval_data_id`)
+  KEY `idx_eval_data` (`eval_data_id`),
+  KEY `idx_run_id` (`run_id`),
+  KEY `idx_eval_results_set_version_data` (`eval_set_id`, `agent_version`, `eval_data_id`),
+  KEY `idx_eval_results_set_run_data` (`eval_set_id`, `run_id`, `eval_data_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='评测结果表';
\ No newline at end of file
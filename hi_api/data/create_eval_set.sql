@@ -7,5 +7,10 @@ CREATE TABLE IF NOT EXISTS `eval_set` (
   `count` INT NOT NULL DEFAULT 0 COMMENT '数量',
   `deleted` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '软删除标记',
   `display_index` INT NOT NULL DEFAULT 0 COMMENT '展示顺序，用于前端显示/排序，可递补',
+  `max_corpus_id` INT NOT NULL DEFAULT 0 COMMENT '已分配的最大 corpus_id（只增不减）',
   PRIMARY KEY (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 已有库升级：
+-- ALTER TABLE `eval_set` ADD COLUMN `max_corpus_id` INT NOT NULL DEFAULT 0 COMMENT '已分配的最大 corpus_id（只增不减）' AFTER `display_index`;
+-- UPDATE `eval_set` s SET `max_corpus_id` = (SELECT COALESCE(MAX(d.`corpus_id`), 0) FROM `eval_data` d WHERE d.`eval_set_id` = s.`id`);
@@ -3,16 +3,31 @@
 CREATE TABLE IF NOT EXISTS `jobs` (
   `id` INT NOT NULL AUTO_INCREMENT,
   `job_id` VARCHAR(64) NOT NULL,
+  `kind` VARCHAR(32) NULL COMMENT 'upload|upload_batch|execute|archive|cleanup|export',
   `eval_set_id` INT NULL,
   `status` VARCHAR(32) NOT NULL DEFAULT 'pending',
   `processed` INT NOT NULL DEFAULT 0,
   `total` INT NOT NULL DEFAULT 0,
   `file_path` VARCHAR(1000) NULL,
+  `file_hash` VARCHAR(64) NULL COMMENT '上传文件内容的 SHA-256',
   `error` TEXT NULL,
+  `result` TEXT NULL COMMENT '任务结果摘要（JSON）',
+  `options` TEXT NULL COMMENT '任务参数（JSON），如导入模式',
+  `parent_job_id` VARCHAR(64) NULL COMMENT '父任务的 job_id（批量导入拆出的子任务）',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `started_at` DATETIME NULL,
   `finished_at` DATETIME NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `uq_jobs_job_id` (`job_id`),
-  KEY `idx_jobs_eval_set_id` (`eval_set_id`)
+  KEY `idx_jobs_eval_set_id` (`eval_set_id`),
+  KEY `idx_jobs_kind` (`kind`),
+  KEY `idx_jobs_file_hash` (`file_hash`),
+  KEY `idx_jobs_parent_job_id` (`parent_job_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 已有表升级：
+-- ALTER TABLE `jobs` ADD COLUMN `file_hash` VARCHAR(64) NULL COMMENT '上传文件内容的 SHA-256' AFTER `file_path`,
+--   ADD KEY `idx_jobs_file_hash` (`file_hash`);
+-- ALTER TABLE `jobs` ADD COLUMN `options` TEXT NULL COMMENT '任务参数（JSON），如导入模式' AFTER `result`;
+-- ALTER TABLE `jobs` ADD COLUMN `parent_job_id` VARCHAR(64) NULL COMMENT '父任务的 job_id（批量导入拆出的子任务）' AFTER `options`,
+--   ADD KEY `idx_jobs_parent_job_id` (`parent_job_id`);
@@ -1,21 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+
 class InMemoryDB:
-    """Very small placeholder for a database connection/store.
+    """Small thread-safe in-process key/value cache with per-entry TTL and LRU eviction.
 
-    This keeps the structure clear and can be replaced with SQLAlchemy or other
-    database clients later.
+    Used as a read-through cache in front of the database for small, hot metadata
+    (e.g. eval sets). Writers are expected to call `delete`/`clear` explicitly after
+    changing the underlying rows; the TTL only bounds staleness across processes.
+    Cached values are shared between callers and must be treated as read-only.
     """
 
-    def __init__(self):
-        self.store = {}
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 30.0):
+        self.store = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
 
     def get(self, key, default=None):
-        return self.store.get(key, default)
+        with self._lock:
+            entry = self.store.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.store[key]
+                self.misses += 1
+                return default
+            self.store.move_to_end(key)
+            self.hits += 1
+            return entry[1]
 
     def set(self, key, value):
-        self.store[key] = value
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self.store[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.store.move_to_end(key)
+            while len(self.store) > self.maxsize:
+                self.store.popitem(last=False)
 
     def delete(self, key):
-        if key in self.store:
-            del self.store[key]
+        with self._lock:
+            self.store.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.store.clear()
 
-db = InMemoryDB()
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self.store), 'hits': self.hits, 'misses': self.misses}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from .sqlalchemy import Base
 
@@ -14,10 +14,18 @@ class EvalSet(Base):
     deleted = Column(Boolean, default=False, nullable=False, comment='软删除标记')
     # display_index 用于在 UI 中展示的顺序号（可递补），不要用作主键
     display_index = Column(Integer, default=0, nullable=False, comment='展示顺序，用于前端显示/排序，可递补')
+    # 已分配过的最大 corpus_id：语料被清理服务物理删除后，序号也不会再分配出去
+    max_corpus_id = Column(Integer, default=0, nullable=False, comment='已分配的最大 corpus_id（只增不减）')
 
 
 class EvalData(Base):
     __tablename__ = 'eval_data'
+    __table_args__ = (
+        # eval_results 通过 (eval_set_id, corpus_id) 关联语料，统计/对比查询依赖该复合索引
+        Index('idx_eval_data_set_corpus', 'eval_set_id', 'corpus_id'),
+        # 去重导入按 (评测集, 规范化内容哈希) 查找已有语料；软删除时 row_hash 置空，不占用唯一键
+        UniqueConstraint('eval_set_id', 'row_hash', name='uq_eval_data_set_row_hash'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     eval_set_id = Column(Integer, nullable=False, index=True, comment='评测集id')
@@ -26,10 +34,16 @@ class EvalData(Base):
     expected = Column(String(2000), nullable=True, comment='预期结果')
     intent = Column(String(255), nullable=True, comment='意图')
     deleted = Column(Boolean, default=False, nullable=False, comment='软删除标记')
+    row_hash = Column(String(64), nullable=True, comment='规范化 content 的 SHA-256（去重导入键，已删除或待回填时为空）')
 
 
 class EvalResult(Base):
     __tablename__ = 'eval_results'
+    __table_args__ = (
+        # 版本/运行对比按 (评测集, 版本或运行, corpus_id) 取每条语料的最新结果
+        Index('idx_eval_results_set_version_data', 'eval_set_id', 'agent_version', 'eval_data_id'),
+        Index('idx_eval_results_set_run_data', 'eval_set_id', 'run_id', 'eval_data_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     eval_set_id = Column(Integer, nullable=False, index=True, comment='评测集id')
@@ -41,19 +55,59 @@ class EvalResult(Base):
     deleted = Column(Boolean, default=False, nullable=False, comment='软删除标记')
     agent_version = Column(String(100), nullable=True, comment='Agent版本')
     kdb = Column(Integer, default=0, nullable=False, comment='是否命中知识库(0否,1是)')
+    run_id = Column(String(64), nullable=True, index=True, comment='批量执行的运行id（单条执行为空）')
 
 
+class EvalResultSummary(Base):
+    """按 (eval_set_id, agent_version, run_id) 增量维护的评测结果汇总，随结果写入同事务更新"""
+    __tablename__ = 'eval_result_summary'
+    __table_args__ = (
+        UniqueConstraint('eval_set_id', 'agent_version', 'run_id', name='uq_eval_result_summary_key'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    eval_set_id = Column(Integer, nullable=False, index=True, comment='评测集id')
+    agent_version = Column(String(100), nullable=False, default='', comment='Agent版本（空串表示未知）')
+    run_id = Column(String(64), nullable=False, default='', comment='运行id（空串表示单条执行）')
+    count = Column(Integer, default=0, nullable=False, comment='结果条数')
+    scored_count = Column(Integer, default=0, nullable=False, comment='有分数的结果条数')
+    score_sum = Column(Integer, default=0, nullable=False, comment='分数和')
+    kdb_hits = Column(Integer, default=0, nullable=False, comment='命中知识库条数')
+    intent_matches = Column(Integer, default=0, nullable=False, comment='实际意图与预期意图一致的条数')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+
+class EvalResultScoreHist(Base):
+    """汇总的分数直方图：每个 (eval_set_id, agent_version, run_id, score) 一行，随结果写入原子增减条数"""
+    __tablename__ = 'eval_result_score_hist'
+    __table_args__ = (
+        UniqueConstraint('eval_set_id', 'agent_version', 'run_id', 'score', name='uq_eval_result_score_hist_key'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    eval_set_id = Column(Integer, nullable=False, index=True, comment='评测集id')
+    agent_version = Column(String(100), nullable=False, default='', comment='Agent版本（空串表示未知）')
+    run_id = Column(String(64), nullable=False, default='', comment='运行id（空串表示单条执行）')
+    score = Column(Integer, nullable=False, comment='分数')
+    count = Column(Integer, default=0, nullable=False, comment='该分数的结果条数')
+
 class Job(Base):
     __tablename__ = 'jobs'
 
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(String(64), nullable=False, unique=True, index=True, comment='外部使用的 job id（UUID）')
+    kind = Column(String(32), nullable=True, index=True, comment='upload|upload_batch|execute|archive|cleanup|export')
     eval_set_id = Column(Integer, nullable=True, index=True, comment='关联的评测集 id')
     status = Column(String(32), nullable=False, default='pending', comment='pending|running|success|failed')
     processed = Column(Integer, default=0, nullable=False, comment='已处理条数')
     total = Column(Integer, default=0, nullable=False, comment='总条数（估算）')
     file_path = Column(String(1000), nullable=True, comment='上传的临时文件路径')
+    file_hash = Column(String(64), nullable=True, index=True, comment='上传文件内容的 SHA-256（十六进制）')
     error = Column(Text, nullable=True, comment='错误信息（若失败）')
+    result = Column(Text, nullable=True, comment='任务结果摘要（JSON）')
+    options = Column(Text, nullable=True, comment='任务参数（JSON），如导入模式')
+    parent_job_id = Column(String(64), nullable=True, index=True, comment='父任务的 job_id（批量导入拆出的子任务）')
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     started_at = Column(DateTime(timezone=True), nullable=True)
     finished_at = Column(DateTime(timezone=True), nullable=True)
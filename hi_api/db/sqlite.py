@@ -0,0 +1,147 @@
+"""SQLite 单机模式：连接 pragma 调优与单写者队列。
+
+DATABASE_URL 以 sqlite 开头时由 db/sqlalchemy.py 调用 configure_sqlite()。
+SQLite 同一时刻只允许一个写事务；后台线程（导入、批量执行、归档、清理）与请求并发写入时，
+依赖 busy_timeout 轮询既浪费时间，超时后还会直接报 "database is locked"。
+这里在 Session 第一次写入前排队领取写权限，事务结束（提交/回滚/关闭）时交还，按先来后到串行化写事务；
+读取不排队，WAL 模式下读写互不阻塞。
+"""
+
+import os
+import time
+import asyncio
+import threading
+import weakref
+from collections import deque
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from utils.log import get_logger
+
+logger = get_logger("sqlite")
+
+# pragma 取值可用环境变量覆盖
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+# 负数表示 KiB：默认 64MB 页缓存
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+
+
+class SQLiteWriteQueue:
+    """按到达顺序发放的写权限（不绑定线程：请求的提交可能在另一个线程池线程中执行）。
+
+    同一线程内的多个 Session 共享已持有的写权限，只是为了不在本队列上自己等自己（如在写事务中更新 jobs 进度）；
+    它们用的是各自的连接，SQLite 文件锁仍然只允许一个写事务，后写的一方要等先写的提交，
+    内层 Session 在外层提交前写入会一直等到 busy_timeout 后报 "database is locked"。
+    同一线程内的嵌套写入应在外层事务提交之后进行，或复用同一个 Session。
+    服务请求的事件循环（get_db 运行过的循环，见 register_loop）上不排队：请求 Session 的提交要经该循环调度，
+    在循环线程上阻塞等待可能互相等死；这类写入以及等待超过 busy_timeout 的写入直接交给 SQLite 自身的 busy 处理。
+    后台线程自建的事件循环（如异步执行任务）上没有请求 Session，照常排队。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._holders = set()
+        self._owner_thread = None
+        self._waiting = deque()
+        self._server_loops = weakref.WeakSet()
+        self.acquired = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, session: Session) -> None:
+        if session.info.get('_sqlite_write_held'):
+            return
+        if self._on_server_loop():
+            return
+        me = threading.get_ident()
+        with self._cond:
+            if self._holders and self._owner_thread != me:
+                ticket = object()
+                self._waiting.append(ticket)
+                queued_at = time.monotonic()
+                deadline = queued_at + SQLITE_BUSY_TIMEOUT_MS / 1000
+                try:
+                    while self._holders or self._waiting[0] is not ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            logger.warning("SQLite write queue wait timed out, falling back to busy_timeout")
+                            break
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting.remove(ticket)
+                    self.wait_seconds += time.monotonic() - queued_at
+                    self._cond.notify_all()
+            self._holders.add(session)
+            self._owner_thread = me
+            self.acquired += 1
+        session.info['_sqlite_write_held'] = True
+
+    def register_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """登记服务请求的事件循环（由 get_db 调用），该循环上的写入不排队"""
+        self._server_loops.add(loop)
+
+    def _on_server_loop(self) -> bool:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return loop in self._server_loops
+
+    def stats(self) -> dict:
+        """累计发放次数、当前排队数与累计等待秒数（供 /metrics 读取）"""
+        with self._cond:
+            return {'acquired': self.acquired, 'waiting': len(self._waiting), 'wait_seconds': self.wait_seconds}
+
+    def release(self, session: Session) -> None:
+        if not session.info.pop('_sqlite_write_held', False):
+            return
+        with self._cond:
+            self._holders.discard(session)
+            if not self._holders:
+                self._owner_thread = None
+                self._cond.notify_all()
+
+
+write_queue = SQLiteWriteQueue()
+
+
+def configure_sqlite(engine: Engine, session_factory: Optional[sessionmaker] = None) -> None:
+    """为 SQLite 引擎设置 WAL 与 pragma，并让 session_factory 创建的 Session 经写队列串行写入（只读副本不传）"""
+    in_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            if not in_memory:
+                cur.execute("PRAGMA journal_mode=WAL")
+                cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+            cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cur.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cur.close()
+
+    logger.info(f"SQLite mode: {engine.url.database} wal={not in_memory} synchronous={SQLITE_SYNCHRONOUS} "
+                f"cache_size={SQLITE_CACHE_SIZE} mmap_size={SQLITE_MMAP_SIZE}")
+    if session_factory is None:
+        return
+
+    @event.listens_for(session_factory, "before_flush")
+    def _queue_before_flush(session, _flush_context, _instances):
+        write_queue.acquire(session)
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _queue_before_dml(orm_execute_state):
+        # session.execute(insert/update/delete(...)) 与 query.update()/delete() 不经过 flush
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            write_queue.acquire(orm_execute_state.session)
+
+    @event.listens_for(session_factory, "after_transaction_end")
+    def _release_after_transaction(session, transaction):
+        if transaction.parent is None:
+            write_queue.release(session)
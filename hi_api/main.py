@@ -1,11 +1,16 @@
 
 from fastapi import FastAPI
-from api import eval_sets_api, eval_data_api, eval_results_api, config_api, jobs_api
+from api import eval_sets_api, eval_data_api, eval_results_api, config_api, jobs_api, analytics_api, export_api
 from utils.log import get_logger
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
 import os
 import asyncio
-from services.cleanup_service import schedule_cleanup
+from services.cleanup_service import schedule_cleanup, schedule_count_reconcile
+from services.archive_service import schedule_archive
+from db.sqlalchemy import IS_SQLITE, init_schema
+from utils import metrics
 
 
 logger = get_logger("main")
@@ -29,10 +34,17 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # 结果列表等大响应按客户端 Accept-Encoding 压缩，小响应不处理
+    app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv('GZIP_MINIMUM_SIZE', '1024')))
+    # 最外层：请求耗时包含压缩与流式响应的发送
+    app.add_middleware(metrics.MetricsMiddleware)
+
     app.include_router(eval_sets_api.router, prefix="/api/v1/evalsets", tags=["evalsets"])
     app.include_router(eval_data_api.router, prefix="/api/v1", tags=["evaldata"])
     app.include_router(eval_results_api.router)
     app.include_router(config_api.router)
+    app.include_router(analytics_api.router)
+    app.include_router(export_api.router)
     # jobs API (status polling for background tasks)
     app.include_router(jobs_api.router)
 
@@ -40,9 +52,17 @@ def create_app() -> FastAPI:
     def health():
         return {"status": "ok"}
 
+    @app.get("/metrics", summary="Prometheus 指标（文本格式）", include_in_schema=False)
+    def prometheus_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
     @app.on_event("startup")
     async def on_startup():
         logger.info("App startup event triggered.")
+        # SQLite 单机模式无需外部建表；MySQL 可通过 DB_AUTO_CREATE=1 同样在启动时补齐缺失的表
+        if IS_SQLITE or os.getenv('DB_AUTO_CREATE', '0') in ('1', 'true', 'True'):
+            logger.info("Bootstrapping database schema")
+            init_schema()
         # optional cleanup scheduler
         try:
             if os.getenv('CLEANUP_ENABLED', '0') in ('1', 'true', 'True'):
@@ -52,10 +72,40 @@ def create_app() -> FastAPI:
                 asyncio.create_task(asyncio.to_thread(schedule_cleanup, interval))
         except Exception as e:
             logger.exception(f"Failed to start cleanup scheduler: {e}")
+        # eval_set.count is maintained incrementally; reconcile occasionally to repair drift (0 disables)
+        try:
+            reconcile_interval = int(os.getenv('COUNT_RECONCILE_INTERVAL_SECONDS', str(6 * 3600)))
+            if reconcile_interval > 0:
+                logger.info(f"Starting count reconcile scheduler (interval_seconds={reconcile_interval})")
+                # 事件循环上的任务（不占用线程），关闭时取消
+                app.state.count_reconcile_task = asyncio.create_task(schedule_count_reconcile(reconcile_interval))
+        except Exception as e:
+            logger.exception(f"Failed to start count reconcile scheduler: {e}")
+        # optional archival of old results to Parquet (retention window and/or last N runs per set)
+        try:
+            if os.getenv('ARCHIVE_ENABLED', '0') in ('1', 'true', 'True'):
+                retention = os.getenv('ARCHIVE_RETENTION_DAYS')
+                keep_runs = os.getenv('ARCHIVE_KEEP_RUNS')
+                interval = int(os.getenv('ARCHIVE_INTERVAL_SECONDS', str(24 * 3600)))
+                logger.info(f"Starting archive scheduler (interval_seconds={interval} retention_days={retention} keep_runs={keep_runs})")
+                asyncio.create_task(asyncio.to_thread(
+                    schedule_archive, interval,
+                    int(retention) if retention else None,
+                    int(keep_runs) if keep_runs else None,
+                ))
+        except Exception as e:
+            logger.exception(f"Failed to start archive scheduler: {e}")
 
     @app.on_event("shutdown")
     async def on_shutdown():
         logger.info("App shutdown event triggered.")
+        task = getattr(app.state, 'count_reconcile_task', None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
     return app
 
@@ -1,7 +1,7 @@
 
 from .eval_set import EvalSet, EvalSetCreate, EvalSetUpdate
 from .eval_data import EvalData, EvalDataCreate
-from .eval_result import EvalResult, EvalResultCreate
+from .eval_result import EvalResult, EvalResultCreate, EvalResultProjection, EvalResultSummary
 
 __all__ = [
 	"EvalSet",
@@ -11,4 +11,6 @@ __all__ = [
 	"EvalDataCreate",
 	"EvalResult",
 	"EvalResultCreate",
+	"EvalResultProjection",
+	"EvalResultSummary",
 ]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 
 
 class EvalDataBase(BaseModel):
@@ -17,6 +17,8 @@ class EvalDataCreate(EvalDataBase):
 class EvalData(EvalDataBase):
     id: int
     deleted: bool
+    # 读取时计算的连续展示序号（corpus_id 删除后可能存在空洞）；单条查询时为 None
+    display_index: Optional[int] = None
     # Pydantic v2 config: allow creation from ORM objects
     model_config = ConfigDict(from_attributes=True)
 
@@ -25,3 +27,44 @@ class EvalDataUpdate(BaseModel):
     content: Optional[str] = None
     expected: Optional[str] = None
     intent: Optional[str] = None
+
+
+# ---- 批量接口 ----
+BULK_MAX_ITEMS = 5000
+
+
+class EvalDataBulkItem(BaseModel):
+    content: str
+    expected: Optional[str] = None
+    intent: Optional[str] = None
+
+
+class EvalDataBulkCreate(BaseModel):
+    items: List[EvalDataBulkItem] = Field(..., max_length=BULK_MAX_ITEMS)
+
+
+class EvalDataBulkPatchItem(EvalDataUpdate):
+    id: int
+
+
+class EvalDataBulkUpdate(BaseModel):
+    items: List[EvalDataBulkPatchItem] = Field(..., max_length=BULK_MAX_ITEMS)
+
+
+class EvalDataBulkDelete(BaseModel):
+    ids: List[int] = Field(..., max_length=BULK_MAX_ITEMS)
+
+
+class EvalDataBulkRowResult(BaseModel):
+    index: int  # 对应请求数组中的位置
+    id: Optional[int] = None
+    corpus_id: Optional[int] = None
+    ok: bool
+    error: Optional[str] = None
+
+
+class EvalDataBulkResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[EvalDataBulkRowResult]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 
@@ -11,6 +11,7 @@ class EvalResultBase(BaseModel):
     score: Optional[int] = None
     agent_version: Optional[str] = None
     kdb: int = 0  # 0 否 1 是
+    run_id: Optional[str] = None  # 批量执行的运行 id
 
 
 class EvalResultCreate(EvalResultBase):
@@ -22,3 +23,34 @@ class EvalResult(EvalResultBase):
     exec_time: datetime
     deleted: bool
     model_config = ConfigDict(from_attributes=True)
+
+
+class EvalResultProjection(BaseModel):
+    """结果列表（fields= 列投影）的一行：id 总是返回，其余字段只在被选中时出现（省略 fields 时全部返回）"""
+    id: int
+    eval_set_id: Optional[int] = None
+    eval_data_id: Optional[int] = None
+    actual_result: Optional[str] = None
+    actual_intent: Optional[str] = None
+    score: Optional[int] = None
+    agent_version: Optional[str] = None
+    kdb: Optional[int] = None
+    run_id: Optional[str] = None
+    exec_time: Optional[datetime] = None
+    deleted: Optional[bool] = None
+
+
+class EvalResultSummary(BaseModel):
+    eval_set_id: int
+    agent_version: str
+    run_id: str
+    count: int
+    scored_count: int
+    score_sum: int
+    mean_score: Optional[float] = None
+    score_hist: Dict[int, int]
+    kdb_hits: int
+    kdb_rate: float
+    intent_matches: int
+    intent_match_rate: float
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,389 @@
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import select, func, case, and_, or_
+from db.models import EvalResult as EvalResultORM, EvalData as EvalDataORM
+from db.sqlalchemy import read_session_scope
+from services.archive_service import result_archive_service
+
+from utils.log import get_logger
+
+logger = get_logger("analytics_service")
+
+DIFF_KINDS = ('any', 'score_dropped', 'intent_changed', 'kdb_flipped')
+
+# 每次从游标取出的行数，按块拼接为列数组，避免一次性物化所有 Row 对象
+FETCH_CHUNK = 50000
+OTHER_LABEL = '(其他)'
+EMPTY_LABEL = '(空)'
+
+
+def _factorize_intents(expected: np.ndarray, actual: np.ndarray):
+    """把预期/实际意图映射到共享词表的整数编码（去除首尾空白，空值记为 EMPTY_LABEL）。
+
+    只对不同取值做一次归一化，后续比较与计数都在整数数组上完成，避免对字符串数组排序。
+    """
+    vocab: Dict[str, int] = {}
+    raw_to_code: Dict[Optional[str], int] = {}
+
+    def code(v):
+        c = raw_to_code.get(v)
+        if c is None:
+            label = (v or '').strip() or EMPTY_LABEL
+            c = raw_to_code[v] = vocab.setdefault(label, len(vocab))
+        return c
+
+    e_codes = np.fromiter((code(v) for v in expected), dtype=np.int64, count=expected.shape[0])
+    a_codes = np.fromiter((code(v) for v in actual), dtype=np.int64, count=actual.shape[0])
+    labels = np.array(list(vocab.keys()), dtype=object)
+    return e_codes, a_codes, labels
+
+
+class AnalyticsService:
+    """基于列式数组的评测结果统计：只取需要的列，用 NumPy 向量化计算分布与混淆矩阵。"""
+
+    def load_columns(self, eval_set_id: int, agent_version: Optional[str] = None, run_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """按 (eval_set_id + corpus_id) 关联 eval_results 与 eval_data，返回列数组：
+        score(float, 无分数为 NaN)、kdb(int8)、actual_intent(object)、expected_intent(object)、corpus_id(int64)
+        """
+        stmt = select(
+            EvalResultORM.id,
+            EvalResultORM.eval_data_id,
+            EvalResultORM.score,
+            EvalResultORM.kdb,
+            EvalResultORM.actual_intent,
+            EvalDataORM.intent,
+        ).select_from(EvalResultORM).outerjoin(
+            EvalDataORM,
+            (EvalDataORM.eval_set_id == EvalResultORM.eval_set_id) & (EvalDataORM.corpus_id == EvalResultORM.eval_data_id),
+        ).where(EvalResultORM.eval_set_id == eval_set_id, EvalResultORM.deleted == False)
+        if agent_version is not None:
+            stmt = stmt.where(EvalResultORM.agent_version == agent_version)
+        if run_id is not None:
+            stmt = stmt.where(EvalResultORM.run_id == run_id)
+
+        chunks: Dict[str, List[np.ndarray]] = {k: [] for k in ('id', 'corpus_id', 'score', 'kdb', 'actual_intent', 'expected_intent')}
+        with read_session_scope() as session:
+            # 走 Core 连接 + 服务端游标，跳过 ORM 行加载开销
+            result = session.connection().execution_options(stream_results=True).execute(stmt)
+            for part in result.partitions(FETCH_CHUNK):
+                ids, corpus, score, kdb, actual, expected = zip(*part)
+                chunks['id'].append(np.array(ids, dtype=np.int64))
+                chunks['corpus_id'].append(np.array(corpus, dtype=np.int64))
+                # None -> NaN
+                chunks['score'].append(np.array(score, dtype=np.float64))
+                chunks['kdb'].append(np.array(kdb, dtype=np.int8))
+                chunks['actual_intent'].append(np.array(actual, dtype=object))
+                chunks['expected_intent'].append(np.array(expected, dtype=object))
+        self._append_archived(chunks, eval_set_id, agent_version, run_id)
+        empty = {'id': np.int64, 'corpus_id': np.int64, 'score': np.float64, 'kdb': np.int8, 'actual_intent': object, 'expected_intent': object}
+        return {k: (np.concatenate(v) if v else np.empty(0, dtype=empty[k])) for k, v in chunks.items()}
+
+    def _append_archived(self, chunks: Dict[str, List[np.ndarray]], eval_set_id: int,
+                         agent_version: Optional[str], run_id: Optional[str]) -> None:
+        """把已归档到 Parquet 的结果追加到列块中（仍在库中的 id 以库为准）"""
+        live_ids = np.concatenate(chunks['id']) if chunks['id'] else np.empty(0, dtype=np.int64)
+        table = result_archive_service.read(eval_set_id, agent_version, run_id,
+                                            columns=['eval_data_id', 'score', 'kdb', 'actual_intent', 'expected_intent'],
+                                            exclude_ids=live_ids)
+        if table is None or table.num_rows == 0:
+            return
+        logger.info(f"load_columns: {table.num_rows} archived rows for set={eval_set_id}")
+        chunks['id'].append(table.column('id').to_numpy().astype(np.int64))
+        chunks['corpus_id'].append(table.column('eval_data_id').to_numpy().astype(np.int64))
+        chunks['score'].append(table.column('score').to_numpy(zero_copy_only=False).astype(np.float64))
+        chunks['kdb'].append(table.column('kdb').to_numpy(zero_copy_only=False).astype(np.int8))
+        chunks['actual_intent'].append(np.array(table.column('actual_intent').to_pylist(), dtype=object))
+        chunks['expected_intent'].append(np.array(table.column('expected_intent').to_pylist(), dtype=object))
+
+    def compute(self, cols: Dict[str, np.ndarray], percentiles: Sequence[float] = (50, 90, 95, 99), max_labels: int = 50) -> Dict:
+        n = int(cols['score'].shape[0])
+        scores = cols['score']
+        scored = scores[~np.isnan(scores)]
+        out: Dict = {'count': n, 'scored_count': int(scored.shape[0])}
+
+        if scored.size:
+            hist = np.bincount(np.clip(scored, 0, None).astype(np.int64))
+            nz = np.nonzero(hist)[0]
+            out['score'] = {
+                'mean': float(scored.mean()),
+                'std': float(scored.std()),
+                'min': float(scored.min()),
+                'max': float(scored.max()),
+                'percentiles': {f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(scored, percentiles))},
+            }
+            out['score_hist'] = {int(k): int(hist[k]) for k in nz}
+        else:
+            out['score'] = None
+            out['score_hist'] = {}
+
+        out['kdb_rate'] = float(cols['kdb'].mean()) if n else 0.0
+
+        e_codes, a_codes, labels = _factorize_intents(cols['expected_intent'], cols['actual_intent'])
+        empty_code = np.nonzero(labels == EMPTY_LABEL)[0]
+        has_expected = e_codes != (empty_code[0] if empty_code.size else -1)
+        out['intent_match_rate'] = float(((e_codes == a_codes) & has_expected).sum() / n) if n else 0.0
+        out['intent_confusion'] = self._confusion(e_codes, a_codes, labels, max_labels)
+        return out
+
+    def _confusion(self, e_codes: np.ndarray, a_codes: np.ndarray, labels: np.ndarray, max_labels: int) -> Dict:
+        """预期意图（行）× 实际意图（列）混淆矩阵；标签过多时仅保留出现最多的 max_labels 个，其余归入 OTHER_LABEL"""
+        if e_codes.size == 0:
+            return {'labels': [], 'matrix': []}
+        k = labels.shape[0]
+        # 标签按字典序输出，便于前端展示
+        order = np.argsort(labels.astype(str), kind='stable')
+        if k > max_labels:
+            counts = np.bincount(e_codes, minlength=k) + np.bincount(a_codes, minlength=k)
+            keep = np.zeros(k, dtype=bool)
+            keep[np.argsort(-counts, kind='stable')[:max_labels - 1]] = True
+            order = order[keep[order]]
+            remap = np.full(k, max_labels - 1, dtype=np.int64)
+            remap[order] = np.arange(order.shape[0])
+            out_labels = labels[order].tolist() + [OTHER_LABEL]
+        else:
+            remap = np.empty(k, dtype=np.int64)
+            remap[order] = np.arange(k)
+            out_labels = labels[order].tolist()
+        m = len(out_labels)
+        matrix = np.bincount(remap[e_codes] * m + remap[a_codes], minlength=m * m).reshape(m, m)
+        return {'labels': out_labels, 'matrix': matrix.tolist()}
+
+    def analyze(self, eval_set_id: int, agent_version: Optional[str] = None, run_id: Optional[str] = None,
+                percentiles: Sequence[float] = (50, 90, 95, 99), max_labels: int = 50) -> Dict:
+        logger.info(f"analyze called for set={eval_set_id} agent_version={agent_version} run_id={run_id}")
+        start = time.perf_counter()
+        cols = self.load_columns(eval_set_id, agent_version, run_id)
+        loaded = time.perf_counter()
+        out = self.compute(cols, percentiles=percentiles, max_labels=max_labels)
+        out.update({'eval_set_id': eval_set_id, 'agent_version': agent_version, 'run_id': run_id})
+        logger.info(f"analyze: set={eval_set_id} rows={out['count']} load_ms={int((loaded - start) * 1000)} compute_ms={int((time.perf_counter() - loaded) * 1000)}")
+        return out
+
+    def _latest_results(self, eval_set_id: int, agent_version: Optional[str], run_id: Optional[str]):
+        """每个 corpus_id 在指定版本/运行下的最新一条结果 id（GROUP BY + MAX(id)，由复合索引覆盖）"""
+        r = EvalResultORM.__table__
+        q = select(r.c.eval_data_id.label('corpus_id'), func.max(r.c.id).label('rid')).where(
+            r.c.eval_set_id == eval_set_id, r.c.deleted == False
+        )
+        if agent_version is not None:
+            q = q.where(r.c.agent_version == agent_version)
+        if run_id is not None:
+            q = q.where(r.c.run_id == run_id)
+        return q.group_by(r.c.eval_data_id).subquery()
+
+    def diff(self, eval_set_id: int,
+             base_version: Optional[str] = None, base_run: Optional[str] = None,
+             target_version: Optional[str] = None, target_run: Optional[str] = None,
+             only: str = 'any', page: int = 1, page_size: int = 50) -> Dict:
+        """对比两个版本/运行在同一评测集上的最新结果。
+
+        返回聚合差异（均分、知识库命中率、回退/提升条数等）以及分页的变化条目：
+        分数下降、实际意图变化或知识库命中翻转。未打分视为 0 分（与执行流程一致）。
+        没有归档文件时关联与筛选都在数据库端完成；评测集有归档结果时改为合并库与归档后在内存中比较。
+        """
+        logger.info(f"diff called for set={eval_set_id} base=({base_version},{base_run}) target=({target_version},{target_run}) only={only} page={page}")
+        start = time.perf_counter()
+        if result_archive_service.has_archive(eval_set_id):
+            base_total, target_total, stats, items, total = self._diff_in_memory(
+                eval_set_id, base_version, base_run, target_version, target_run, only, page, page_size)
+        else:
+            base_total, target_total, stats, items, total = self._diff_sql(
+                eval_set_id, base_version, base_run, target_version, target_run, only, page, page_size)
+        compared = stats['compared']
+        mean_a, mean_b = stats['mean_a'], stats['mean_b']
+        out = {
+            'eval_set_id': eval_set_id,
+            'base': {'agent_version': base_version, 'run_id': base_run, 'count': int(base_total)},
+            'target': {'agent_version': target_version, 'run_id': target_run, 'count': int(target_total)},
+            'summary': {
+                'compared': compared,
+                'only_in_base': int(base_total) - compared,
+                'only_in_target': int(target_total) - compared,
+                'mean_score_base': mean_a,
+                'mean_score_target': mean_b,
+                'mean_score_delta': (mean_b - mean_a) if mean_a is not None and mean_b is not None else None,
+                'score_dropped': stats['dropped'],
+                'score_improved': stats['improved'],
+                'intent_changed': stats['intent_changed'],
+                'kdb_flipped': stats['kdb_flipped'],
+                'kdb_gained': stats['kdb_gained'],
+                'kdb_lost': stats['kdb_lost'],
+                'kdb_rate_base': (stats['kdb_a'] / compared) if compared else 0.0,
+                'kdb_rate_target': (stats['kdb_b'] / compared) if compared else 0.0,
+            },
+            'only': only,
+            'items': items,
+            'total': int(total),
+            'page': page,
+            'page_size': page_size,
+        }
+        logger.info(f"diff: set={eval_set_id} compared={compared} changed={total} took_ms={int((time.perf_counter() - start) * 1000)}")
+        return out
+
+    def _diff_sql(self, eval_set_id, base_version, base_run, target_version, target_run, only, page, page_size):
+        r = EvalResultORM.__table__
+        d = EvalDataORM.__table__
+        la = self._latest_results(eval_set_id, base_version, base_run)
+        lb = self._latest_results(eval_set_id, target_version, target_run)
+        ra, rb = r.alias('ra'), r.alias('rb')
+        pairs_from = la.join(lb, la.c.corpus_id == lb.c.corpus_id).join(ra, ra.c.id == la.c.rid).join(rb, rb.c.id == lb.c.rid)
+
+        score_a = func.coalesce(ra.c.score, 0)
+        score_b = func.coalesce(rb.c.score, 0)
+        dropped = score_b < score_a
+        improved = score_b > score_a
+        intent_changed = func.coalesce(func.trim(ra.c.actual_intent), '') != func.coalesce(func.trim(rb.c.actual_intent), '')
+        kdb_flipped = ra.c.kdb != rb.c.kdb
+        flag = lambda cond: func.coalesce(func.sum(case((cond, 1), else_=0)), 0)
+        predicates = {
+            'any': or_(dropped, intent_changed, kdb_flipped),
+            'score_dropped': dropped,
+            'intent_changed': intent_changed,
+            'kdb_flipped': kdb_flipped,
+        }
+
+        with read_session_scope() as session:
+            conn = session.connection()
+            agg = conn.execute(select(
+                func.count(),
+                func.avg(score_a), func.avg(score_b),
+                flag(dropped), flag(improved), flag(intent_changed), flag(kdb_flipped),
+                func.coalesce(func.sum(ra.c.kdb), 0), func.coalesce(func.sum(rb.c.kdb), 0),
+                flag(and_(ra.c.kdb == 0, rb.c.kdb != 0)), flag(and_(ra.c.kdb != 0, rb.c.kdb == 0)),
+            ).select_from(pairs_from)).one()
+            base_total = conn.execute(select(func.count()).select_from(la)).scalar() or 0
+            target_total = conn.execute(select(func.count()).select_from(lb)).scalar() or 0
+            cond = predicates[only]
+            total = conn.execute(select(func.count()).select_from(pairs_from).where(cond)).scalar() or 0
+            item_rows = conn.execute(
+                select(
+                    la.c.corpus_id, d.c.id, d.c.content, d.c.intent,
+                    ra.c.id, ra.c.score, ra.c.actual_intent, ra.c.kdb,
+                    rb.c.id, rb.c.score, rb.c.actual_intent, rb.c.kdb,
+                    dropped, intent_changed, kdb_flipped,
+                ).select_from(pairs_from.outerjoin(d, and_(d.c.eval_set_id == eval_set_id, d.c.corpus_id == la.c.corpus_id)))
+                .where(cond)
+                .order_by((score_b - score_a).asc(), la.c.corpus_id)
+                .offset((page - 1) * page_size).limit(page_size)
+            ).all()
+
+        side = lambda rid, score, intent, kdb: {'result_id': rid, 'score': score, 'actual_intent': intent, 'kdb': kdb}
+        items = [{
+            'corpus_id': row[0],
+            'eval_data_id': row[1],
+            'content': row[2],
+            'expected_intent': row[3],
+            'base': side(*row[4:8]),
+            'target': side(*row[8:12]),
+            'score_delta': (row[9] or 0) - (row[5] or 0),
+            'score_dropped': bool(row[12]),
+            'intent_changed': bool(row[13]),
+            'kdb_flipped': bool(row[14]),
+        } for row in item_rows]
+        stats = {
+            'compared': int(agg[0] or 0),
+            'mean_a': float(agg[1]) if agg[1] is not None else None,
+            'mean_b': float(agg[2]) if agg[2] is not None else None,
+            'dropped': int(agg[3]), 'improved': int(agg[4]),
+            'intent_changed': int(agg[5]), 'kdb_flipped': int(agg[6]),
+            'kdb_a': int(agg[7]), 'kdb_b': int(agg[8]),
+            'kdb_gained': int(agg[9]), 'kdb_lost': int(agg[10]),
+        }
+        return base_total, target_total, stats, items, total
+
+    def _load_side(self, eval_set_id: int, agent_version: Optional[str], run_id: Optional[str]) -> Dict[str, np.ndarray]:
+        """库 + 归档中某一侧的结果，按 corpus_id 只保留 id 最大（最新）的一条"""
+        r = EvalResultORM
+        stmt = select(r.id, r.eval_data_id, r.score, r.actual_intent, r.kdb).where(r.eval_set_id == eval_set_id, r.deleted == False)
+        if agent_version is not None:
+            stmt = stmt.where(r.agent_version == agent_version)
+        if run_id is not None:
+            stmt = stmt.where(r.run_id == run_id)
+        with read_session_scope() as session:
+            rows = session.connection().execute(stmt).all()
+        ids, corpus, score, intent, kdb = (list(c) for c in zip(*rows)) if rows else ([], [], [], [], [])
+        table = result_archive_service.read(eval_set_id, agent_version, run_id,
+                                            columns=['eval_data_id', 'score', 'actual_intent', 'kdb'],
+                                            exclude_ids=np.array(ids, dtype=np.int64))
+        if table is not None and table.num_rows:
+            ids += table.column('id').to_pylist()
+            corpus += table.column('eval_data_id').to_pylist()
+            score += table.column('score').to_pylist()
+            intent += table.column('actual_intent').to_pylist()
+            kdb += table.column('kdb').to_pylist()
+        side = {
+            'id': np.array(ids, dtype=np.int64),
+            'corpus_id': np.array(corpus, dtype=np.int64),
+            'score': np.array(score, dtype=np.float64),
+            'actual_intent': np.array(intent, dtype=object),
+            'kdb': np.array(kdb, dtype=np.int64),
+        }
+        order = np.lexsort((side['id'], side['corpus_id']))
+        c = side['corpus_id'][order]
+        latest = order[np.r_[c[1:] != c[:-1], True]] if c.size else order
+        return {k: v[latest] for k, v in side.items()}
+
+    def _diff_in_memory(self, eval_set_id, base_version, base_run, target_version, target_run, only, page, page_size):
+        a = self._load_side(eval_set_id, base_version, base_run)
+        b = self._load_side(eval_set_id, target_version, target_run)
+        common, ia, ib = np.intersect1d(a['corpus_id'], b['corpus_id'], assume_unique=True, return_indices=True)
+        score_a = np.nan_to_num(a['score'][ia], nan=0.0)
+        score_b = np.nan_to_num(b['score'][ib], nan=0.0)
+        norm = lambda arr: np.array([(v or '').strip() for v in arr], dtype=object)
+        kdb_a, kdb_b = a['kdb'][ia], b['kdb'][ib]
+        dropped = score_b < score_a
+        intent_changed = norm(a['actual_intent'][ia]) != norm(b['actual_intent'][ib])
+        kdb_flipped = kdb_a != kdb_b
+        compared = int(common.shape[0])
+        stats = {
+            'compared': compared,
+            'mean_a': float(score_a.mean()) if compared else None,
+            'mean_b': float(score_b.mean()) if compared else None,
+            'dropped': int(dropped.sum()), 'improved': int((score_b > score_a).sum()),
+            'intent_changed': int(intent_changed.sum()), 'kdb_flipped': int(kdb_flipped.sum()),
+            'kdb_a': int(kdb_a.sum()), 'kdb_b': int(kdb_b.sum()),
+            'kdb_gained': int(((kdb_a == 0) & (kdb_b != 0)).sum()), 'kdb_lost': int(((kdb_a != 0) & (kdb_b == 0)).sum()),
+        }
+        cond = {
+            'any': dropped | intent_changed | kdb_flipped,
+            'score_dropped': dropped,
+            'intent_changed': intent_changed,
+            'kdb_flipped': kdb_flipped,
+        }[only]
+        idx = np.nonzero(cond)[0]
+        idx = idx[np.lexsort((common[idx], (score_b - score_a)[idx]))]
+        page_idx = idx[(page - 1) * page_size:page * page_size]
+
+        page_corpus = [int(common[i]) for i in page_idx]
+        data = {}
+        if page_corpus:
+            with read_session_scope() as session:
+                for cid, did, content, intent in session.query(
+                    EvalDataORM.corpus_id, EvalDataORM.id, EvalDataORM.content, EvalDataORM.intent
+                ).filter(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.corpus_id.in_(page_corpus)).all():
+                    data[cid] = (did, content, intent)
+
+        def side(arr, j):
+            score = arr['score'][j]
+            return {'result_id': int(arr['id'][j]), 'score': None if np.isnan(score) else int(score),
+                    'actual_intent': arr['actual_intent'][j], 'kdb': int(arr['kdb'][j])}
+
+        items = []
+        for i in page_idx:
+            did, content, intent = data.get(int(common[i]), (None, None, None))
+            items.append({
+                'corpus_id': int(common[i]),
+                'eval_data_id': did,
+                'content': content,
+                'expected_intent': intent,
+                'base': side(a, ia[i]),
+                'target': side(b, ib[i]),
+                'score_delta': int(score_b[i] - score_a[i]),
+                'score_dropped': bool(dropped[i]),
+                'intent_changed': bool(intent_changed[i]),
+                'kdb_flipped': bool(kdb_flipped[i]),
+            })
+        return int(a['id'].shape[0]), int(b['id'].shape[0]), stats, items, int(idx.shape[0])
+
+analytics_service = AnalyticsService()
@@ -0,0 +1,295 @@
+import os
+import glob
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import select, delete, func, or_, and_
+from db.models import EvalResult as EvalResultORM, EvalData as EvalDataORM
+from db.sqlalchemy import SessionLocal
+from services.job_service import job_service
+
+from utils.log import get_logger
+
+logger = get_logger("archive_service")
+
+# 归档文件根目录：<ARCHIVE_DIR>/set_<eval_set_id>/results_<min_id>_<max_id>.parquet
+ARCHIVE_DIR = os.getenv('RESULT_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archive'))
+ARCHIVE_COMPRESSION = 'zstd'
+# 每次从游标读取并写入一个 RecordBatch 的行数
+ARCHIVE_CHUNK = 20000
+# 写完文件后按块删除数据库中的行，避免长事务锁表
+DELETE_CHUNK = 1000
+
+# 归档时一并写入 expected_intent（取自 eval_data.intent），读取归档时无需再回表
+ARCHIVE_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('eval_set_id', pa.int64()),
+    ('eval_data_id', pa.int64()),
+    ('actual_result', pa.string()),
+    ('actual_intent', pa.string()),
+    ('expected_intent', pa.string()),
+    ('score', pa.int64()),
+    ('agent_version', pa.string()),
+    ('kdb', pa.int8()),
+    ('run_id', pa.string()),
+    ('exec_time', pa.timestamp('us')),
+])
+
+
+def _filter(eval_set_id: int, agent_version: Optional[str], run_id: Optional[str]):
+    expr = pc.field('eval_set_id') == eval_set_id
+    if agent_version is not None:
+        expr = expr & (pc.field('agent_version') == agent_version)
+    if run_id is not None:
+        expr = expr & (pc.field('run_id') == run_id)
+    return expr
+
+
+def _with_id(columns: Optional[List[str]]) -> Optional[List[str]]:
+    return None if columns is None else list(dict.fromkeys(['id'] + list(columns)))
+
+
+def _id_ranges(set_dir: str) -> List[Tuple[str, float, float]]:
+    """评测集目录下各归档文件的 (路径, 最小 id, 最大 id)，取自行组统计信息，不读数据页；没有统计信息时视为全区间"""
+    out = []
+    for path in glob.glob(os.path.join(set_dir, '*.parquet')):
+        meta = pq.read_metadata(path)
+        col = meta.schema.names.index('id')
+        lo, hi = float('inf'), float('-inf')
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(col).statistics
+            if stats is None or not stats.has_min_max:
+                lo, hi = float('-inf'), float('inf')
+                break
+            lo, hi = min(lo, stats.min), max(hi, stats.max)
+        out.append((path, lo, hi))
+    return out
+
+
+class ResultArchiveService:
+    """把过期的评测结果从 eval_results 移到本地 Parquet 文件，并为统计/对比提供透明读取。
+
+    归档条件（满足其一）：exec_time 早于保留窗口；或 run_id 不在该评测集最近 keep_runs 次运行之内。
+    先写文件再删库；若中途中断，同一行可能同时存在于库和文件中，读取时以库中数据为准并按 id 去重。
+    """
+
+    def set_dir(self, eval_set_id: int) -> str:
+        return os.path.join(ARCHIVE_DIR, f"set_{eval_set_id}")
+
+    def has_archive(self, eval_set_id: int) -> bool:
+        return bool(glob.glob(os.path.join(self.set_dir(eval_set_id), '*.parquet')))
+
+    def _candidate_filter(self, session, eval_set_id: int, retention_days: Optional[int], keep_runs: Optional[int]):
+        conds = []
+        if retention_days is not None:
+            # exec_time 写入时用 datetime.utcnow()，截止时间同样按 UTC 计算
+            conds.append(EvalResultORM.exec_time < datetime.utcnow() - timedelta(days=retention_days))
+        if keep_runs is not None:
+            recent = [r[0] for r in session.query(EvalResultORM.run_id).filter(
+                EvalResultORM.eval_set_id == eval_set_id,
+                EvalResultORM.deleted == False,
+                EvalResultORM.run_id.isnot(None),
+                EvalResultORM.run_id != '',
+            ).group_by(EvalResultORM.run_id).order_by(func.max(EvalResultORM.id).desc()).limit(keep_runs).all()]
+            # 未归属任何运行的单条执行结果只受保留窗口约束
+            conds.append(and_(EvalResultORM.run_id.isnot(None), EvalResultORM.run_id != '', EvalResultORM.run_id.notin_(recent)))
+        return and_(EvalResultORM.eval_set_id == eval_set_id, EvalResultORM.deleted == False, or_(*conds))
+
+    def archive(self, retention_days: Optional[int] = None, keep_runs: Optional[int] = None,
+                eval_set_id: Optional[int] = None, dry_run: bool = False, job_id: Optional[str] = None) -> Dict:
+        """执行一次归档，返回 {'sets': {eval_set_id: rows}, 'archived': 总行数, 'files': [...]}"""
+        if retention_days is None and keep_runs is None:
+            raise ValueError("retention_days or keep_runs is required")
+        logger.info(f"archive called retention_days={retention_days} keep_runs={keep_runs} set={eval_set_id} dry_run={dry_run}")
+        start = time.perf_counter()
+        with SessionLocal() as session:
+            q = session.query(EvalResultORM.eval_set_id).filter(EvalResultORM.deleted == False).distinct()
+            if eval_set_id is not None:
+                q = q.filter(EvalResultORM.eval_set_id == eval_set_id)
+            set_ids = sorted(r[0] for r in q.all())
+            plan = {}
+            for sid in set_ids:
+                n = session.query(func.count(EvalResultORM.id)).filter(
+                    self._candidate_filter(session, sid, retention_days, keep_runs)).scalar() or 0
+                if n:
+                    plan[sid] = n
+        total = sum(plan.values())
+        summary = {'sets': plan, 'archived': 0, 'files': [], 'dry_run': dry_run}
+        if dry_run or not total:
+            logger.info(f"archive: {total} candidate rows in {len(plan)} sets (dry_run={dry_run})")
+            return summary
+
+        job_service.update(job_id, status='running', total=total, processed=0, started=True)
+        try:
+            for sid in plan:
+                rows, path = self._archive_set(sid, retention_days, keep_runs, job_id, summary['archived'])
+                summary['sets'][sid] = rows
+                summary['archived'] += rows
+                if path:
+                    summary['files'].append(path)
+        except Exception as e:
+            logger.exception(f"archive failed: {e}")
+            job_service.update(job_id, status='failed', error=str(e), finished=True)
+            raise
+        job_service.update(job_id, status='success', processed=summary['archived'], result=summary, finished=True)
+        logger.info(f"archive: moved {summary['archived']} rows from {len(plan)} sets took_ms={int((time.perf_counter() - start) * 1000)}")
+        return summary
+
+    def _archive_set(self, eval_set_id: int, retention_days: Optional[int], keep_runs: Optional[int],
+                     job_id: Optional[str], processed_before: int):
+        os.makedirs(self.set_dir(eval_set_id), exist_ok=True)
+        tmp_path = os.path.join(self.set_dir(eval_set_id), f".tmp_{uuid.uuid4().hex}.parquet")
+        r = EvalResultORM
+        ids: List[int] = []
+        with SessionLocal() as session:
+            cond = self._candidate_filter(session, eval_set_id, retention_days, keep_runs)
+            stmt = select(
+                r.id, r.eval_set_id, r.eval_data_id, r.actual_result, r.actual_intent, EvalDataORM.intent,
+                r.score, r.agent_version, r.kdb, r.run_id, r.exec_time,
+            ).select_from(r).outerjoin(
+                EvalDataORM, (EvalDataORM.eval_set_id == r.eval_set_id) & (EvalDataORM.corpus_id == r.eval_data_id)
+            ).where(cond).order_by(r.id)
+            result = session.connection().execution_options(stream_results=True).execute(stmt)
+            with pq.ParquetWriter(tmp_path, ARCHIVE_SCHEMA, compression=ARCHIVE_COMPRESSION) as writer:
+                for part in result.partitions(ARCHIVE_CHUNK):
+                    columns = list(zip(*part))
+                    writer.write_batch(pa.RecordBatch.from_arrays(
+                        [pa.array(col, type=field.type) for col, field in zip(columns, ARCHIVE_SCHEMA)],
+                        schema=ARCHIVE_SCHEMA,
+                    ))
+                    ids.extend(columns[0])
+        if not ids:
+            os.remove(tmp_path)
+            return 0, None
+        path = os.path.join(self.set_dir(eval_set_id), f"results_{min(ids)}_{max(ids)}.parquet")
+        if os.path.exists(path):
+            path = path[:-len('.parquet')] + f"_{uuid.uuid4().hex[:8]}.parquet"
+        os.replace(tmp_path, path)
+        logger.info(f"archive: wrote {len(ids)} rows of set={eval_set_id} to {path}")
+
+        deleted = 0
+        with SessionLocal() as session:
+            for i in range(0, len(ids), DELETE_CHUNK):
+                chunk = ids[i:i + DELETE_CHUNK]
+                session.execute(delete(EvalResultORM).where(EvalResultORM.id.in_(chunk)))
+                session.commit()
+                deleted += len(chunk)
+                job_service.update(job_id, processed=processed_before + deleted)
+        return len(ids), path
+
+    def read(self, eval_set_id: int, agent_version: Optional[str] = None, run_id: Optional[str] = None,
+             columns: Optional[List[str]] = None, exclude_ids: Optional[np.ndarray] = None) -> Optional[pa.Table]:
+        """读取评测集的归档结果（可按版本/运行过滤），按 id 去重；exclude_ids 为库中仍存在的行，读取时排除。
+        没有归档文件时返回 None。"""
+        if not self.has_archive(eval_set_id):
+            return None
+        dataset = ds.dataset(self.set_dir(eval_set_id), format='parquet', schema=ARCHIVE_SCHEMA)
+        table = dataset.to_table(columns=_with_id(columns), filter=_filter(eval_set_id, agent_version, run_id))
+        if table.num_rows == 0:
+            return table
+        ids = table.column('id').to_numpy()
+        _, first = np.unique(ids, return_index=True)
+        keep = np.zeros(ids.shape[0], dtype=bool)
+        keep[first] = True
+        if exclude_ids is not None and exclude_ids.size:
+            keep &= ~np.isin(ids, exclude_ids)
+        if not keep.all():
+            table = table.filter(pa.array(keep))
+        return table
+
+    def iter_batches(self, eval_set_id: int, agent_version: Optional[str] = None, run_id: Optional[str] = None,
+                     columns: Optional[List[str]] = None, live_ids: Optional[Callable[[int, int], Iterable[int]]] = None,
+                     batch_size: int = ARCHIVE_CHUNK) -> Iterator[pa.RecordBatch]:
+        """逐文件、逐批流式读取评测集的归档结果，内存占用与归档大小无关（read() 会整体读入，供统计使用）。
+
+        文件按 id 区间排序，文件内按 id 有序。live_ids(lo, hi) 返回库中 id 落在 [lo, hi] 内的行，以库为准排除。
+        中断后重跑归档时同一 id 可能出现在两个文件中：只有 id 区间与更早文件重叠的文件，才按批回查那些文件去重。
+        """
+        if not self.has_archive(eval_set_id):
+            return
+        expr = _filter(eval_set_id, agent_version, run_id)
+        cols = _with_id(columns)
+        earlier = []
+        for path, lo, hi in sorted(_id_ranges(self.set_dir(eval_set_id)), key=lambda f: (f[1], f[2])):
+            overlapping = [p for p, plo, phi in earlier if plo <= hi and lo <= phi]
+            earlier.append((path, lo, hi))
+            dataset = ds.dataset(path, format='parquet', schema=ARCHIVE_SCHEMA)
+            for batch in dataset.to_batches(columns=cols, filter=expr, batch_size=batch_size):
+                if not batch.num_rows:
+                    continue
+                ids = batch.column('id')
+                drop = set()
+                if live_ids is not None:
+                    drop.update(live_ids(pc.min(ids).as_py(), pc.max(ids).as_py()))
+                if overlapping:
+                    seen = ds.dataset(overlapping, format='parquet', schema=ARCHIVE_SCHEMA).to_table(
+                        columns=['id'], filter=pc.field('id').isin(ids))
+                    drop.update(seen.column('id').to_pylist())
+                if drop:
+                    batch = batch.filter(pc.invert(pc.is_in(ids, value_set=pa.array(list(drop), type=pa.int64()))))
+                if batch.num_rows:
+                    yield batch
+
+    def drop_corpus(self, eval_set_id: int, corpus_ids) -> int:
+        """从评测集的归档中删除指定语料（eval_data_id 即 corpus_id）的结果，返回删除的行数。
+
+        清理服务物理删除语料时调用，与删除库中结果的级联规则一致。逐个文件过滤后写到临时文件再原子替换，
+        文件变空时直接删除。
+        """
+        if not corpus_ids or not self.has_archive(eval_set_id):
+            return 0
+        drop = pa.array(sorted(set(corpus_ids)), type=pa.int64())
+        removed = 0
+        for path in sorted(glob.glob(os.path.join(self.set_dir(eval_set_id), '*.parquet'))):
+            table = pq.read_table(path, schema=ARCHIVE_SCHEMA)
+            mask = pc.is_in(table.column('eval_data_id'), value_set=drop)
+            n = pc.sum(mask).as_py() or 0
+            if not n:
+                continue
+            kept = table.filter(pc.invert(mask))
+            if kept.num_rows:
+                tmp_path = os.path.join(self.set_dir(eval_set_id), f".tmp_{uuid.uuid4().hex}.parquet")
+                pq.write_table(kept, tmp_path, compression=ARCHIVE_COMPRESSION)
+                os.replace(tmp_path, path)
+            else:
+                os.remove(path)
+            removed += n
+        if removed:
+            logger.info(f"archive: dropped {removed} archived results of {len(drop)} purged corpus ids in set={eval_set_id}")
+        return removed
+
+    def list_files(self, eval_set_id: Optional[int] = None) -> List[Dict]:
+        pattern = os.path.join(self.set_dir(eval_set_id) if eval_set_id is not None else os.path.join(ARCHIVE_DIR, 'set_*'), '*.parquet')
+        out = []
+        for path in sorted(glob.glob(pattern)):
+            meta = pq.read_metadata(path)
+            out.append({
+                'eval_set_id': int(os.path.basename(os.path.dirname(path))[len('set_'):]),
+                'file': path,
+                'rows': meta.num_rows,
+                'bytes': os.path.getsize(path),
+            })
+        return out
+
+
+def schedule_archive(interval_seconds: int, retention_days: Optional[int], keep_runs: Optional[int]):
+    """Periodically archive old results; intended to be started in a background thread, like schedule_cleanup."""
+    logger.info(f"Starting archive loop, interval_seconds={interval_seconds} retention_days={retention_days} keep_runs={keep_runs}")
+    try:
+        while True:
+            try:
+                result_archive_service.archive(retention_days=retention_days, keep_runs=keep_runs)
+            except Exception as e:
+                logger.exception(f"Archive run failed: {e}")
+            time.sleep(interval_seconds)
+    except Exception:
+        logger.info("Archive scheduler terminating")
+
+
+result_archive_service = ResultArchiveService()
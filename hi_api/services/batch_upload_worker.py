@@ -0,0 +1,225 @@
+"""批量导入：工作簿的每个工作表、或 zip 中的每个文件，各自导入到独立的评测集。
+
+父任务（kind=upload_batch）把上传文件拆成若干部分，每部分创建一个子任务（kind=upload，parent_job_id 指向父任务），
+子任务在进程池中并行执行 process_upload_job —— 解析与写库都在子进程内完成，多个工作表的 openpyxl 解析不再受 GIL 限制；
+父任务轮询子任务进度，把 processed/total 汇总到自身，全部结束后写入各部分的导入统计。
+"""
+
+import os
+import json
+import time
+import uuid
+import zipfile
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from db.sqlalchemy import SessionLocal, IS_SQLITE
+from db.models import Job as JobORM
+from models.eval_set import EvalSetCreate
+from services.eval_set_service import eval_set_service
+from services.job_service import job_service
+from services.import_readers import ImportFormatError, open_source, list_sheets
+from services.upload_job_worker import (
+    process_upload_job, UPLOAD_TMP_DIR, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE, PROGRESS_INTERVAL_SECONDS,
+)
+from utils.log import get_logger
+
+logger = get_logger("batch_upload_worker")
+
+# 并行导入的进程数；SQLite 模式下固定按顺序导入（见 _executor）
+IMPORT_PROCESSES = int(os.getenv('IMPORT_PROCESSES', str(min(4, os.cpu_count() or 1))))
+# 一次批量导入最多拆出的部分数（工作表或 zip 成员）
+IMPORT_MAX_PARTS = int(os.getenv('IMPORT_MAX_PARTS', '200'))
+# zip 中按扩展名识别的可导入文件，其余成员（目录、说明文档、__MACOSX 等）忽略
+ZIP_MEMBER_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.csv', '.tsv', '.tab', '.jsonl', '.ndjson')
+EVAL_SET_NAME_MAX = 255
+
+
+def _is_zip_archive(path: str) -> bool:
+    """普通 zip 压缩包（xlsx 本身也是 zip，以 [Content_Types].xml 区分）"""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as zf:
+        return '[Content_Types].xml' not in zf.namelist()
+
+
+def _extract_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    """把 zip 成员按块解压到 UPLOAD_TMP_DIR（只取文件名，防止路径穿越），按实际解压字节数检查大小上限"""
+    name = os.path.basename(info.filename)
+    path = os.path.join(UPLOAD_TMP_DIR, f"upload_{uuid.uuid4().hex}_{name}")
+    size = 0
+    try:
+        with zf.open(info) as src, open(path, 'wb') as dst:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise ImportFormatError(f"zip member {info.filename} exceeds {UPLOAD_MAX_BYTES} bytes")
+                dst.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def _split_zip(path: str) -> List[Dict]:
+    parts = []
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    with zipfile.ZipFile(path) as zf:
+        members = [i for i in zf.infolist() if not i.is_dir()
+                   and not i.filename.startswith('__MACOSX/')
+                   and not os.path.basename(i.filename).startswith('.')
+                   and os.path.splitext(i.filename)[1].lower() in ZIP_MEMBER_EXTENSIONS]
+        if len(members) > IMPORT_MAX_PARTS:
+            raise ImportFormatError(f"zip contains {len(members)} files, more than {IMPORT_MAX_PARTS}")
+        try:
+            for info in sorted(members, key=lambda i: i.filename):
+                member_path = _extract_member(zf, info)
+                parts.append({'name': os.path.splitext(os.path.basename(info.filename))[0],
+                              'file': info.filename, 'path': member_path, 'estimate': _estimate(member_path)})
+        except BaseException:
+            for p in parts:
+                try:
+                    os.remove(p['path'])
+                except OSError:
+                    pass
+            raise
+    return parts
+
+
+def _estimate(path: str) -> int:
+    try:
+        source = open_source(path)
+    except Exception:
+        # 无法识别的成员仍交给子任务导入，失败原因记录在子任务上
+        return 0
+    try:
+        return source.estimate_total()
+    finally:
+        source.close()
+
+
+def _split_workbook(path: str) -> List[Dict]:
+    """每个含数据的工作表一部分；子任务共用同一个文件，按 sheet 读取"""
+    parts = [{'name': sheet, 'sheet': sheet, 'path': path, 'estimate': estimate}
+             for sheet, estimate in list_sheets(path)]
+    if len(parts) > IMPORT_MAX_PARTS:
+        raise ImportFormatError(f"workbook contains {len(parts)} sheets, more than {IMPORT_MAX_PARTS}")
+    return parts
+
+
+def _set_names(parts: List[Dict], prefix: Optional[str]) -> List[str]:
+    """评测集名称：[前缀-]工作表名/文件名；同一批中重名时追加序号，避免两个子任务并发写入同一评测集"""
+    names, seen = [], set()
+    for part in parts:
+        base = f"{prefix}-{part['name']}" if prefix else part['name']
+        base = base.strip()[:EVAL_SET_NAME_MAX] or 'sheet'
+        name, n = base, 2
+        while name in seen:
+            suffix = f" ({n})"
+            name = base[:EVAL_SET_NAME_MAX - len(suffix)] + suffix
+            n += 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _executor(workers: int) -> Executor:
+    # SQLite 的单写者队列只在进程内生效，多进程并发写入只能靠 busy_timeout 互相等待，因此按顺序导入
+    if IS_SQLITE or workers <= 1:
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-batch')
+    # spawn：子进程重新导入模块并建立自己的数据库连接，不继承父进程的连接池与线程
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _report_progress(job_id: str) -> List[dict]:
+    children = job_service.children(job_id)
+    job_service.update(job_id, processed=sum(c['processed'] for c in children),
+                       total=sum(c['total'] for c in children))
+    return children
+
+
+def _run_children(job_id: str, child_ids: List[str]) -> List[dict]:
+    workers = min(IMPORT_PROCESSES, len(child_ids))
+    logger.info(f"batch job={job_id}: importing {len(child_ids)} parts with {workers} workers (sqlite={IS_SQLITE})")
+    with _executor(workers) as pool:
+        pending = {pool.submit(process_upload_job, cid): cid for cid in child_ids}
+        while pending:
+            done, _ = wait(pending, timeout=PROGRESS_INTERVAL_SECONDS * 2, return_when=FIRST_COMPLETED)
+            for future in done:
+                cid = pending.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    # 子进程异常退出（process_upload_job 自身的异常已在子进程内记录到子任务）
+                    logger.exception(f"batch job={job_id}: child {cid} crashed: {e}")
+                    job_service.update(cid, status='failed', error=f"import process crashed: {e}", finished=True)
+            _report_progress(job_id)
+    return _report_progress(job_id)
+
+
+def process_batch_upload_job(job_id: str):
+    """拆分上传文件、为每部分创建评测集与子任务，并行导入后汇总结果"""
+    logger.info(f"process_batch_upload_job started for job={job_id}")
+    with SessionLocal() as session:
+        job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
+        if not job:
+            logger.error(f"job {job_id} not found")
+            return
+        file_path = job.file_path
+        options = json.loads(job.options) if job.options else {}
+    mode = options.get('mode', 'append')
+    job_service.update(job_id, status='running', started=True)
+    start = time.perf_counter()
+    is_zip = False
+    try:
+        is_zip = _is_zip_archive(file_path)
+        parts = _split_zip(file_path) if is_zip else _split_workbook(file_path)
+        if not parts:
+            raise ImportFormatError("no importable sheets or files found")
+        child_ids = []
+        for part, name in zip(parts, _set_names(parts, options.get('prefix'))):
+            existing = eval_set_service.get_by_name(name)
+            eval_set_id = existing.id if existing else eval_set_service.create_eval_set(EvalSetCreate(name=name)).id
+            child_options = {'mode': mode, 'part': part['name']}
+            if part.get('sheet') is not None:
+                child_options['sheet'] = part['sheet']
+            child_id = job_service.create('upload', eval_set_id=eval_set_id, file_path=part['path'],
+                                          options=child_options, parent_job_id=job_id)
+            # 子任务开始前先按估算行数占位，父任务的 total 从一开始就覆盖全部部分
+            job_service.update(child_id, total=part['estimate'])
+            child_ids.append(child_id)
+        if is_zip:
+            # 成员已解压为子任务各自的文件
+            os.remove(file_path)
+
+        children = _run_children(job_id, child_ids)
+        totals = {'inserted': 0, 'updated': 0, 'skipped': 0, 'empty': 0}
+        summary = []
+        for c in children:
+            res = c['result'] or {}
+            for k in totals:
+                totals[k] += int(res.get(k) or 0)
+            summary.append({'job_id': c['job_id'], 'eval_set_id': c['eval_set_id'], 'part': (c['options'] or {}).get('part'),
+                            'status': c['status'], 'inserted': res.get('inserted', 0), 'error': c['error']})
+        failed = [c for c in children if c['status'] != 'success']
+        result = dict(totals, mode=mode, parts=summary, failed=len(failed))
+        processed = sum(c['processed'] for c in children)
+        logger.info(f"batch job={job_id} finished: parts={len(children)} failed={len(failed)} processed={processed} "
+                    f"took_ms={int((time.perf_counter() - start) * 1000)}")
+        if failed:
+            job_service.update(job_id, status='failed', error=f"{len(failed)} of {len(children)} parts failed",
+                               processed=processed, result=result, finished=True)
+            return
+        job_service.update(job_id, status='success', processed=processed, total=processed, result=result, finished=True)
+        if not is_zip:
+            os.remove(file_path)
+    except Exception as e:
+        logger.exception(f"process_batch_upload_job failed for job={job_id}: {e}")
+        job_service.update(job_id, status='failed', error=str(e), finished=True)
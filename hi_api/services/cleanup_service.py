@@ -1,72 +1,268 @@
 import os
+import glob
+import asyncio
+import shutil
 import time
-from typing import Tuple
+from datetime import datetime, timedelta
+from typing import Optional
 from loguru import logger
 from db.sqlalchemy import SessionLocal, engine
-from db.models import EvalData as EvalDataORM, EvalSet as EvalSetORM, EvalResult as EvalResultORM
-from sqlalchemy import delete, select
+from db.models import EvalData as EvalDataORM, EvalSet as EvalSetORM, EvalResult as EvalResultORM, Job as JobORM, EvalResultSummary as EvalResultSummaryORM, \
+    EvalResultScoreHist as EvalResultScoreHistORM
+from sqlalchemy import delete, select, func, and_, or_, exists
+from starlette.concurrency import run_in_threadpool
 
+# 自适应批量：每批删除（含提交）的目标耗时，批量大小据此在 [MIN, MAX] 间调整
+TARGET_BATCH_SECONDS = float(os.getenv('CLEANUP_TARGET_BATCH_MS', '200')) / 1000
+MIN_BATCH = 100
+MAX_BATCH = 20000
+# 上传临时文件与已结束 jobs 的保留时间
+UPLOAD_FILE_MAX_AGE_HOURS = int(os.getenv('UPLOAD_FILE_MAX_AGE_HOURS', '24'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '30'))
 
-def _chunked_delete(session, orm_cls, batch: int = 500) -> Tuple[int, int]:
-    """Delete rows where deleted==True in chunks.
 
-    Returns (deleted_rows, scanned_rows)
+class AdaptiveBatch:
+    """根据上一批删除的实际耗时（近似锁持有时间）调整下一批大小。
+
+    耗时低于目标时放大（每次最多翻倍），高于目标时按比例缩小；批次之间按上一批耗时的一半让出，
+    让其他写入有机会拿到锁。
     """
-    total_deleted = 0
-    total_scanned = 0
-    while True:
-        # select up to batch ids to delete
-        ids = [r[0] for r in session.execute(select(orm_cls.id).where(orm_cls.deleted == True).limit(batch)).all()]
-        if not ids:
-            break
-        total_scanned += len(ids)
-        res = session.execute(delete(orm_cls).where(orm_cls.id.in_(ids)))
-        total_deleted += res.rowcount if res is not None else 0
-        session.commit()
-        logger.info(f"Deleted {res.rowcount if res is not None else 0} rows from {orm_cls.__tablename__}")
-        # small pause to avoid long locks
-        time.sleep(0.05)
-    return total_deleted, total_scanned
-
-
-def run_cleanup(dry_run: bool = False) -> dict:
-    """Run cleanup once. If dry_run True, will only count rows.
 
-    Returns a summary dict with counts.
+    def __init__(self, size: int = 500, target_seconds: float = TARGET_BATCH_SECONDS):
+        self.size = size
+        self.target = target_seconds
+
+    def observe(self, elapsed: float) -> None:
+        ratio = self.target / elapsed if elapsed > 0 else 2.0
+        self.size = int(max(MIN_BATCH, min(MAX_BATCH, self.size * min(2.0, ratio))))
+
+    def pause(self, elapsed: float) -> None:
+        time.sleep(min(1.0, elapsed / 2))
+
+
+def _removable_results():
+    """可物理删除的结果：已软删除；或所属评测集已删除；或对应语料已删除（按 eval_set_id + corpus_id 关联）"""
+    deleted_set = exists().where(EvalSetORM.id == EvalResultORM.eval_set_id, EvalSetORM.deleted == True)
+    deleted_data = exists().where(
+        EvalDataORM.eval_set_id == EvalResultORM.eval_set_id,
+        EvalDataORM.corpus_id == EvalResultORM.eval_data_id,
+        EvalDataORM.deleted == True,
+    )
+    return or_(EvalResultORM.deleted == True, deleted_set, deleted_data)
+
+
+def _removable_data():
+    """可物理删除的语料：已软删除，或所属评测集已删除"""
+    deleted_set = exists().where(EvalSetORM.id == EvalDataORM.eval_set_id, EvalSetORM.deleted == True)
+    return or_(EvalDataORM.deleted == True, deleted_set)
+
+
+# 按依赖顺序清理：先删结果（级联条件依赖语料与评测集的软删除行），再删语料，最后删评测集。
+# 语料删除后 corpus_id 不会复用（eval_set.max_corpus_id），归档中这些语料的结果一并移除
+_TARGETS = (
+    ('eval_results_deleted', EvalResultORM, _removable_results),
+    ('eval_data_deleted', EvalDataORM, _removable_data),
+    ('eval_set_deleted', EvalSetORM, lambda: EvalSetORM.deleted == True),
+)
+
+
+def _count(session, orm_cls, where) -> int:
+    return int(session.execute(select(func.count()).select_from(orm_cls).where(where)).scalar() or 0)
+
+
+def _chunked_delete(orm_cls, where, batch: AdaptiveBatch, on_progress=None, before_delete=None) -> int:
+    """Delete rows matching `where` in adaptively sized chunks, one transaction per chunk.
+
+    before_delete(session, ids) runs inside each chunk's transaction, before the rows are deleted.
+    Returns deleted_rows.
     """
-    logger.info("Starting cleanup job (dry_run=%s)" % dry_run)
-    summary = {
-        'eval_data_deleted': 0,
-        'eval_set_deleted': 0,
-        'eval_results_deleted': 0,
-    }
+    total_deleted = 0
+    with SessionLocal() as session:
+        while True:
+            ids = [r[0] for r in session.execute(select(orm_cls.id).where(where).limit(batch.size)).all()]
+            if not ids:
+                break
+            started = time.perf_counter()
+            if before_delete:
+                before_delete(session, ids)
+            res = session.execute(delete(orm_cls).where(orm_cls.id.in_(ids)))
+            session.commit()
+            elapsed = time.perf_counter() - started
+            deleted = res.rowcount if res is not None and res.rowcount is not None and res.rowcount >= 0 else len(ids)
+            total_deleted += deleted
+            logger.info(f"Deleted {deleted} rows from {orm_cls.__tablename__} (batch={batch.size}, took_ms={int(elapsed * 1000)})")
+            if on_progress:
+                on_progress(deleted)
+            batch.observe(elapsed)
+            batch.pause(elapsed)
+    return total_deleted
 
+
+def _retire_corpus_ids(archived_sets, purged):
+    """删除语料前的钩子（与删除同一事务）：把各评测集的 max_corpus_id 推进到被删行的最大序号，
+    该列上线前写入的语料被删除后序号也不会再分配；归档中有结果的评测集记录被删的 corpus_id，删除后从归档中移除"""
+    def hook(session, ids):
+        top = {}
+        for sid, cid in session.execute(select(EvalDataORM.eval_set_id, EvalDataORM.corpus_id).where(
+                EvalDataORM.id.in_(ids), EvalDataORM.corpus_id.isnot(None))).all():
+            top[sid] = max(top.get(sid, 0), cid)
+            if sid in archived_sets:
+                purged.setdefault(sid, []).append(cid)
+        for sid, cid in top.items():
+            session.query(EvalSetORM).filter(EvalSetORM.id == sid, EvalSetORM.max_corpus_id < cid).update(
+                {EvalSetORM.max_corpus_id: cid}, synchronize_session=False)
+    return hook
+
+
+def _sets_losing_live_results():
+    """仍存在的评测集中，因语料已删除而将被级联删除的未删除结果所在的评测集（清理后需重建结果汇总）"""
+    deleted_data = exists().where(
+        EvalDataORM.eval_set_id == EvalResultORM.eval_set_id,
+        EvalDataORM.corpus_id == EvalResultORM.eval_data_id,
+        EvalDataORM.deleted == True,
+    )
+    live_set = exists().where(EvalSetORM.id == EvalResultORM.eval_set_id, EvalSetORM.deleted == False)
     with SessionLocal() as session:
-        # count first
-        ed_count = session.execute(select(EvalDataORM.id).where(EvalDataORM.deleted == True).limit(1)).all()
-        es_count = session.execute(select(EvalSetORM.id).where(EvalSetORM.deleted == True).limit(1)).all()
-        er_count = session.execute(select(EvalResultORM.id).where(EvalResultORM.deleted == True).limit(1)).all()
-        # if dry run, return counts
-        if dry_run:
-            summary['eval_data_deleted'] = len(session.execute(select(EvalDataORM.id).where(EvalDataORM.deleted == True)).all())
-            summary['eval_set_deleted'] = len(session.execute(select(EvalSetORM.id).where(EvalSetORM.deleted == True)).all())
-            summary['eval_results_deleted'] = len(session.execute(select(EvalResultORM.id).where(EvalResultORM.deleted == True)).all())
-            logger.info(f"Dry run counts: {summary}")
-            return summary
-
-    # not a dry run: perform chunked deletes in a new session per table
+        return sorted(r[0] for r in session.query(EvalResultORM.eval_set_id).filter(
+            EvalResultORM.deleted == False, deleted_data, live_set).distinct().all())
+
+
+def _stale_upload_files(max_age_hours: int = UPLOAD_FILE_MAX_AGE_HOURS):
+    """上传临时目录中超过保留时间、且不被未结束任务引用的文件"""
+    from services.upload_job_worker import UPLOAD_TMP_DIR
+    cutoff = time.time() - max_age_hours * 3600
     with SessionLocal() as session:
-        dd, ds = _chunked_delete(session, EvalResultORM)
-        summary['eval_results_deleted'] = dd
+        in_use = {r[0] for r in session.query(JobORM.file_path).filter(
+            JobORM.status.in_(('pending', 'running')), JobORM.file_path.isnot(None)).all()}
+    out = []
+    for path in glob.glob(os.path.join(UPLOAD_TMP_DIR, 'upload_*')):
+        try:
+            if os.path.getmtime(path) < cutoff and path not in in_use:
+                out.append(path)
+        except OSError:
+            continue
+    return out
+
 
+def _stale_export_files(max_age_hours: int = UPLOAD_FILE_MAX_AGE_HOURS):
+    """后台导出生成的文件中超过保留时间的（下载链接随之失效）"""
+    from services.export_service import EXPORT_DIR
+    cutoff = time.time() - max_age_hours * 3600
+    out = []
+    for path in glob.glob(os.path.join(EXPORT_DIR, 'export_*')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                out.append(path)
+        except OSError:
+            continue
+    return out
+
+
+def _old_jobs(retention_days: int = JOB_RETENTION_DAYS):
+    """已结束且早于保留时间的任务"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    return and_(JobORM.status.in_(('success', 'failed')), func.coalesce(JobORM.finished_at, JobORM.created_at) < cutoff)
+
+
+def _set_archives():
+    """按评测集是否仍存在划分结果归档目录，返回 (已删除或已被物理删除评测集的目录, 仍存在评测集的 id)"""
+    from services.archive_service import ARCHIVE_DIR
     with SessionLocal() as session:
-        dd, ds = _chunked_delete(session, EvalDataORM)
-        summary['eval_data_deleted'] = dd
+        live_sets = {r[0] for r in session.query(EvalSetORM.id).filter(EvalSetORM.deleted == False).all()}
+    stale, live = [], set()
+    for d in glob.glob(os.path.join(ARCHIVE_DIR, 'set_*')):
+        suffix = os.path.basename(d)[len('set_'):]
+        if not suffix.isdigit():
+            continue
+        if int(suffix) in live_sets:
+            live.add(int(suffix))
+        else:
+            stale.append(d)
+    return stale, live
+
+
+def run_cleanup(dry_run: bool = False, job_id: Optional[str] = None) -> dict:
+    """Run cleanup once. If dry_run True, will only count rows and files.
+
+    Progress (processed/total rows) and the final summary are written to the jobs row when job_id is given.
+    Returns a summary dict with counts.
+    """
+    from services.job_service import job_service
+    logger.info("Starting cleanup job (dry_run=%s)" % dry_run)
+    summary = {key: 0 for key, _, _ in _TARGETS}
+    summary.update({'jobs_deleted': 0, 'upload_files_removed': 0, 'export_files_removed': 0, 'archive_dirs_removed': 0,
+                    'archived_results_removed': 0})
 
     with SessionLocal() as session:
-        dd, ds = _chunked_delete(session, EvalSetORM)
-        summary['eval_set_deleted'] = dd
+        counts = {key: _count(session, orm_cls, where()) for key, orm_cls, where in _TARGETS}
+        counts['jobs_deleted'] = _count(session, JobORM, _old_jobs())
+    stale_files = _stale_upload_files()
+    export_files = _stale_export_files()
+    archive_dirs, archived_sets = _set_archives()
+    if dry_run:
+        summary.update(counts)
+        summary['upload_files_removed'] = len(stale_files)
+        summary['export_files_removed'] = len(export_files)
+        summary['archive_dirs_removed'] = len(archive_dirs)
+        logger.info(f"Dry run counts: {summary}")
+        return summary
 
+    total = sum(counts.values())
+    processed = 0
+    job_service.update(job_id, status='running', total=total, processed=0, started=True)
+
+    def progress(n: int) -> None:
+        nonlocal processed
+        processed += n
+        job_service.update(job_id, processed=processed)
+
+    resummarize = _sets_losing_live_results() if counts['eval_results_deleted'] else []
+    try:
+        # 批量大小在各表之间延续，避免每张表都从保守值重新探测
+        batch = AdaptiveBatch()
+        purged = {}
+        for key, orm_cls, where in _TARGETS:
+            if counts[key]:
+                hook = _retire_corpus_ids(archived_sets, purged) if orm_cls is EvalDataORM else None
+                summary[key] = _chunked_delete(orm_cls, where(), batch, progress, hook)
+        if purged:
+            # 库中这些语料的结果已在前面级联删除，归档中的同样移除，避免留下无主的历史结果
+            from services.archive_service import result_archive_service
+            for sid, corpus_ids in purged.items():
+                summary['archived_results_removed'] += result_archive_service.drop_corpus(sid, corpus_ids)
+        if counts['eval_set_deleted']:
+            with SessionLocal() as session:
+                for orm_cls in (EvalResultSummaryORM, EvalResultScoreHistORM):
+                    session.query(orm_cls).filter(orm_cls.eval_set_id.notin_(
+                        select(EvalSetORM.id))).delete(synchronize_session=False)
+                session.commit()
+        if resummarize:
+            from services.result_summary_service import result_summary_service
+            for sid in resummarize:
+                result_summary_service.rebuild(sid)
+        if counts['jobs_deleted']:
+            summary['jobs_deleted'] = _chunked_delete(JobORM, _old_jobs(), batch, progress)
+
+        for path in stale_files:
+            try:
+                os.remove(path)
+                summary['upload_files_removed'] += 1
+            except OSError as e:
+                logger.warning(f"Failed to remove upload file {path}: {e}")
+        for path in export_files:
+            try:
+                os.remove(path)
+                summary['export_files_removed'] += 1
+            except OSError as e:
+                logger.warning(f"Failed to remove export file {path}: {e}")
+        for d in archive_dirs:
+            shutil.rmtree(d, ignore_errors=True)
+            summary['archive_dirs_removed'] += 1
+    except Exception as e:
+        job_service.update(job_id, status='failed', error=str(e), result=summary, finished=True)
+        raise
+
+    job_service.update(job_id, status='success', processed=processed, result=summary, finished=True)
     logger.info(f"Cleanup finished: {summary}")
     return summary
 
@@ -75,14 +271,36 @@ def schedule_cleanup(interval_seconds: int = 24 * 3600):
     """Simple scheduler that runs cleanup in a loop. This is intended to be started in a background task.
 
     Default: once per day. Caller should run this in a background thread or task to avoid blocking.
+    Each run is recorded as a `cleanup` job so its progress shows up in the jobs API.
     """
+    from services.job_service import job_service
     logger.info("Starting scheduled cleanup loop, interval_seconds=%s" % interval_seconds)
     try:
         while True:
             try:
-                run_cleanup(dry_run=False)
+                run_cleanup(dry_run=False, job_id=job_service.create('cleanup'))
             except Exception as e:
                 logger.exception("Cleanup run failed: %s" % e)
             time.sleep(interval_seconds)
     except Exception:
         logger.info("Cleanup scheduler terminating")
+
+
+async def schedule_count_reconcile(interval_seconds: int = 6 * 3600):
+    """Periodically repair drift in eval_set.count, which is otherwise maintained by delta updates.
+
+    Runs as an asyncio task on the event loop (sleeping there, reconciling in the thread pool) so that
+    cancelling the task on shutdown stops it immediately instead of leaving a thread stuck in time.sleep().
+    """
+    from services.eval_set_service import eval_set_service
+    logger.info("Starting count reconcile loop, interval_seconds=%s" % interval_seconds)
+    try:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await run_in_threadpool(eval_set_service.reconcile_counts)
+            except Exception as e:
+                logger.exception("Count reconcile failed: %s" % e)
+    except asyncio.CancelledError:
+        logger.info("Count reconcile scheduler terminating")
+        raise
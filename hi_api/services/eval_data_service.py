@@ -1,79 +1,143 @@
-from typing import List, Optional
+import re
+import hashlib
+import unicodedata
+from typing import Any, List, Optional
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.orm import aliased
 from db.models import EvalData as EvalDataORM
-from models.eval_data import EvalDataCreate, EvalData
-from db.sqlalchemy import SessionLocal
+from models.eval_data import EvalDataCreate, EvalData, EvalDataBulkItem, EvalDataBulkPatchItem, EvalDataBulkRowResult
+from db.sqlalchemy import SessionLocal, session_scope, read_session_scope, write_step
 from services.eval_set_service import eval_set_service
 
 from utils.log import get_logger
 
 logger = get_logger("eval_data_service")
 
+# 快速路径直接选取的列（与 EvalData 模型字段对应）
+_DATA_COLUMNS = ('id', 'eval_set_id', 'corpus_id', 'content', 'expected', 'intent', 'deleted')
+# 回填 row_hash 时每批处理的行数
+_BACKFILL_CHUNK = 1000
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_value(value: Any) -> str:
+    """去重比较用的规范化：NFKC（全角/半角统一）、首尾去空白、连续空白合并为一个空格；None 视为空串"""
+    if value is None:
+        return ''
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', str(value))).strip()
+
+
+def content_hash(content: Any) -> str:
+    """eval_data.row_hash：规范化 content 的 SHA-256（十六进制）"""
+    return hashlib.sha256(normalize_value(content).encode('utf-8')).hexdigest()
+
 
 class EvalDataService:
     def create_eval_data(self, payload: EvalDataCreate) -> EvalData:
         logger.info(f"create_eval_data called for set={payload.eval_set_id}")
-        with SessionLocal() as session:
-            # compute next corpus_id within the eval_set (start from 1)
-            try:
-                max_corpus = session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == payload.eval_set_id).order_by(EvalDataORM.corpus_id.desc()).with_entities(EvalDataORM.corpus_id).first()
-                next_corpus_id = 1
-                if max_corpus and max_corpus[0] is not None:
-                    next_corpus_id = int(max_corpus[0]) + 1
-            except Exception:
-                next_corpus_id = 1
-
+        with session_scope() as session:
+            next_corpus_id = eval_set_service.allocate_corpus_ids(session, payload.eval_set_id, 1)
             obj = EvalDataORM(eval_set_id=payload.eval_set_id, corpus_id=next_corpus_id, content=payload.content, expected=payload.expected, intent=payload.intent)
             session.add(obj)
+            # 所属评测集的 count 在同一事务内增量更新
+            eval_set_service.adjust_count(session, payload.eval_set_id, 1)
             session.commit()
             session.refresh(obj)
-            # 刷新所属评测集的 count
-            try:
-                eval_set_service.refresh_count(payload.eval_set_id)
-            except Exception as e:
-                logger.warning(f"refresh_count failed for set={payload.eval_set_id}: {e}")
             logger.info(f"eval_data created id={obj.id} for set={payload.eval_set_id}")
             return EvalData.model_validate(obj, from_attributes=True)
 
     def list_by_eval_set(self, eval_set_id: int) -> List[EvalData]:
+        """评测集全部未删除语料（批量执行的加载入口）。
+
+        只 SELECT 列元组并用 model_construct 组装，跳过 ORM 实体与逐行校验：数据来自数据库，已满足模型约束。
+        """
         logger.info(f"list_by_eval_set called for set={eval_set_id}")
-        with SessionLocal() as session:
-            rows = session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False).all()
-            logger.info(f"list_by_eval_set: found {len(rows)} rows for set={eval_set_id}")
-            return [EvalData.model_validate(r, from_attributes=True) for r in rows]
+        with session_scope() as session:
+            rows = session.execute(
+                select(*[getattr(EvalDataORM, f) for f in _DATA_COLUMNS])
+                .where(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False)
+                .order_by(EvalDataORM.corpus_id, EvalDataORM.id)
+            ).all()
+        items = [EvalData.model_construct(**dict(zip(_DATA_COLUMNS, row)), display_index=None) for row in rows]
+        logger.info(f"list_by_eval_set: found {len(items)} rows for set={eval_set_id}")
+        return items
 
     def list_by_eval_set_paginated(self, eval_set_id: int, page: int = 1, page_size: int = 10, q: str | None = None):
-        """Return (items, total) for the given eval_set_id. If q provided, perform server-side search across content/expected/intent."""
+        """Return (items, total) for the given eval_set_id. If q provided, perform server-side search across content/expected/intent.
+
+        corpus_id 在删除后不再重排（可能存在空洞），返回项中的 display_index 为读取时计算的连续展示序号。
+        """
         logger.info(f"list_by_eval_set_paginated called for set={eval_set_id} page={page} page_size={page_size} q={q}")
-        with SessionLocal() as session:
-            base_q = session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False)
-            if q:
-                like = f"%{q}%"
-                base_q = base_q.filter(
-                    (EvalDataORM.content.like(like)) | (EvalDataORM.expected.like(like)) | (EvalDataORM.intent.like(like))
-                )
-            total = base_q.count()
-            items = base_q.order_by(EvalDataORM.id).offset((page - 1) * page_size).limit(page_size).all()
+        offset = (page - 1) * page_size
+        with read_session_scope() as session:
+            if not q:
+                # 无搜索条件时按 corpus_id 顺序分页，展示序号即 offset + 行号，无需额外查询
+                base_q = session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False)
+                total = base_q.count()
+                rows = base_q.order_by(EvalDataORM.corpus_id, EvalDataORM.id).offset(offset).limit(page_size).all()
+                items = [EvalData.model_validate(r, from_attributes=True) for r in rows]
+                for i, item in enumerate(items):
+                    item.display_index = offset + i + 1
+            else:
+                # 搜索结果与不带搜索的分页同样按 corpus_id 排序，展示序号相对整个评测集计算
+                base_q = self._search(session.query(EvalDataORM).filter(
+                    EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False), q)
+                total = base_q.count()
+                rows = base_q.order_by(EvalDataORM.corpus_id, EvalDataORM.id).offset(offset).limit(page_size).all()
+                items = self._with_display_index(session, rows, contiguous=False)
             logger.info(f"list_by_eval_set_paginated: returning {len(items)}/{total} rows for set={eval_set_id} q={q}")
-            return [EvalData.model_validate(r, from_attributes=True) for r in items], total
+            return items, total
 
     def list_all_search_paginated(self, q: str | None = None, page: int = 1, page_size: int = 10):
-        """Search across all eval sets (non-deleted rows) with pagination."""
+        """Search across all eval sets (non-deleted rows) with pagination.
+
+        按 (eval_set_id, corpus_id, id) 排序，展示序号按各自评测集分区编号，只为本页的行计算。
+        """
         logger.info(f"list_all_search_paginated called page={page} page_size={page_size} q={q}")
-        with SessionLocal() as session:
-            base_q = session.query(EvalDataORM).filter(EvalDataORM.deleted == False)
-            if q:
-                like = f"%{q}%"
-                base_q = base_q.filter(
-                    (EvalDataORM.content.like(like)) | (EvalDataORM.expected.like(like)) | (EvalDataORM.intent.like(like))
-                )
+        with read_session_scope() as session:
+            base_q = self._search(session.query(EvalDataORM).filter(EvalDataORM.deleted == False), q)
             total = base_q.count()
-            items = base_q.order_by(EvalDataORM.id).offset((page - 1) * page_size).limit(page_size).all()
+            rows = base_q.order_by(EvalDataORM.eval_set_id, EvalDataORM.corpus_id, EvalDataORM.id) \
+                .offset((page - 1) * page_size).limit(page_size).all()
+            items = self._with_display_index(session, rows, contiguous=not q)
             logger.info(f"list_all_search_paginated: returning {len(items)}/{total} rows q={q}")
-            return [EvalData.model_validate(r, from_attributes=True) for r in items], total
+            return items, total
+
+    @staticmethod
+    def _search(base_q, q: str | None):
+        if not q:
+            return base_q
+        like = f"%{q}%"
+        return base_q.filter(
+            (EvalDataORM.content.like(like)) | (EvalDataORM.expected.like(like)) | (EvalDataORM.intent.like(like))
+        )
+
+    def _with_display_index(self, session, rows, contiguous: bool) -> List[EvalData]:
+        """为本页的行计算展示序号：所属评测集中按 (corpus_id, id) 排在它之前的未删除语料数 + 1。
+
+        只对本页的行各做一次索引范围计数（idx_eval_data_set_corpus），不对整个评测集或全表开窗编号。
+        contiguous 为真（不带搜索条件）时，页内同一评测集的行在排序上相邻，每个评测集只计数第一行。
+        """
+        counted = [r.id for i, r in enumerate(rows)
+                   if not contiguous or i == 0 or rows[i - 1].eval_set_id != r.eval_set_id]
+        before = aliased(EvalDataORM)
+        rank = select(func.count()).select_from(before).where(
+            before.eval_set_id == EvalDataORM.eval_set_id,
+            before.deleted == False,
+            or_(before.corpus_id < EvalDataORM.corpus_id,
+                and_(before.corpus_id == EvalDataORM.corpus_id, before.id < EvalDataORM.id)),
+        ).correlate(EvalDataORM).scalar_subquery()
+        ranks = dict(session.query(EvalDataORM.id, rank).filter(EvalDataORM.id.in_(counted)).all()) if counted else {}
+        items = []
+        for i, r in enumerate(rows):
+            item = EvalData.model_validate(r, from_attributes=True)
+            item.display_index = ranks[r.id] + 1 if r.id in ranks else items[i - 1].display_index + 1
+            items.append(item)
+        return items
 
     def get_eval_data(self, id: int) -> Optional[EvalData]:
         logger.info(f"get_eval_data called id={id}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             r = session.get(EvalDataORM, id)
             if not r or r.deleted:
                 logger.warning(f"get_eval_data: id={id} not found or deleted")
@@ -82,75 +146,231 @@ class EvalDataService:
             return EvalData.model_validate(r, from_attributes=True)
 
     def delete_eval_data(self, id: int) -> bool:
-        """对单条 eval_data 执行软删除，并刷新父评测集计数"""
+        """对单条 eval_data 执行软删除，并在同一事务内将父评测集计数减一
+
+        corpus_id 保持不变（eval_results.eval_data_id 仍指向它），删除后留下的序号空洞
+        由读取时计算的 display_index 消化，因此删除为 O(1)，不再重排后续行。
+        """
         logger.info(f"delete_eval_data called id={id}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             r = session.get(EvalDataORM, id)
             if not r or r.deleted:
                 logger.warning(f"delete_eval_data: id={id} not found or already deleted")
                 return False
-            # perform a transaction that:
-            # 1) mark the target row as deleted and set its corpus_id to -1
-            # 2) decrement corpus_id by 1 for all rows in the same eval_set with corpus_id > deleted_corpus
-            # 3) update eval_results.eval_data_id (which stores corpus_id) for same eval_set accordingly
-            deleted_corpus = r.corpus_id
             eval_set_id = r.eval_set_id
             try:
-                # mark deleted and set corpus_id to -1
-                r.deleted = True
-                r.corpus_id = -1
-                session.add(r)
-
-                if deleted_corpus is not None:
-                    # shift subsequent eval_data corpus_id values down by 1
-                    session.query(EvalDataORM).filter(
-                        EvalDataORM.eval_set_id == eval_set_id,
-                        EvalDataORM.deleted == False,
-                        EvalDataORM.corpus_id > deleted_corpus
-                    ).update({EvalDataORM.corpus_id: EvalDataORM.corpus_id - 1}, synchronize_session=False)
-
-                    # update eval_results entries that reference corpus_id (stored in eval_data_id)
-                    # do a raw SQL update via session.execute for broader compatibility
-                    try:
-                        session.execute(
-                            "UPDATE eval_results SET eval_data_id = eval_data_id - 1 WHERE eval_set_id = :esid AND eval_data_id > :dc",
-                            {"esid": eval_set_id, "dc": deleted_corpus}
-                        )
-                    except Exception:
-                        logger.warning(f"failed to update eval_results eval_data_id for set={eval_set_id}")
-
-                session.commit()
+                with write_step(session):
+                    r.deleted = True
+                    r.row_hash = None
+                    session.add(r)
+                    eval_set_service.adjust_count(session, eval_set_id, -1)
+                    session.commit()
             except Exception as e:
-                session.rollback()
                 logger.exception(f"delete_eval_data transaction failed for id={id}: {e}")
                 return False
 
+            logger.info(f"delete_eval_data: id={id} marked deleted for set={eval_set_id}")
+            return True
+
+    def update_eval_data(self, id: int, content: Optional[str] = None, expected: Optional[str] = None, intent: Optional[str] = None) -> Optional[EvalData]:
+        logger.info(f"update_eval_data called id={id}")
+        with session_scope() as session:
+            r = session.get(EvalDataORM, id)
+            if not r or r.deleted:
+                logger.warning(f"update_eval_data: id={id} not found or deleted")
+                return None
+            if content is not None:
+                r.content = content
+                # 内容变化后哈希失效，下次去重导入前回填
+                r.row_hash = None
+            if expected is not None:
+                r.expected = expected
+            if intent is not None:
+                r.intent = intent
+            session.add(r)
+            session.commit()
+            session.refresh(r)
+            logger.info(f"update_eval_data: id={id} updated")
+            return EvalData.model_validate(r, from_attributes=True)
+
+    def _validate_fields(self, content: Optional[str], expected: Optional[str], intent: Optional[str], require_content: bool = True) -> Optional[str]:
+        """按 eval_data 列定义校验字段，返回错误信息或 None"""
+        if require_content and (content is None or not str(content).strip()):
+            return "content 不能为空"
+        for field, value in (("content", content), ("expected", expected), ("intent", intent)):
+            limit = EvalDataORM.__table__.c[field].type.length
+            if value is not None and limit and len(value) > limit:
+                return f"{field} 超过最大长度 {limit}"
+        return None
+
+    def bulk_create(self, eval_set_id: int, items: List[EvalDataBulkItem]) -> List[EvalDataBulkRowResult]:
+        """在一个事务内批量创建评测数据：一次 corpus_id 分配、一次批量插入、一次计数更新。
+
+        校验失败的行不会写入，其余行照常提交；返回与输入顺序一致的逐行结果。
+        """
+        logger.info(f"bulk_create called for set={eval_set_id} items={len(items)}")
+        results = [EvalDataBulkRowResult(index=i, ok=False) for i in range(len(items))]
+        with session_scope() as session:
+            rows = []
+            valid = []
+            for i, it in enumerate(items):
+                err = self._validate_fields(it.content, it.expected, it.intent)
+                if err:
+                    results[i].error = err
+                    continue
+                valid.append(i)
+                rows.append({
+                    'eval_set_id': eval_set_id,
+                    'content': it.content,
+                    'expected': it.expected,
+                    'intent': it.intent,
+                    'deleted': False,
+                })
+            if not rows:
+                return results
             try:
-                eval_set_service.refresh_count(eval_set_id)
+                with write_step(session):
+                    next_corpus_id = eval_set_service.allocate_corpus_ids(session, eval_set_id, len(rows))
+                    for i, row in zip(valid, rows):
+                        row['corpus_id'] = results[i].corpus_id = next_corpus_id
+                        next_corpus_id += 1
+                    session.execute(insert(EvalDataORM.__table__), rows)
+                    eval_set_service.adjust_count(session, eval_set_id, len(rows))
+                    # corpus_id 区间由本次分配，回查一次得到各行主键
+                    ids = dict(session.query(EvalDataORM.corpus_id, EvalDataORM.id).filter(
+                        EvalDataORM.eval_set_id == eval_set_id,
+                        EvalDataORM.corpus_id >= rows[0]['corpus_id'],
+                        EvalDataORM.corpus_id <= rows[-1]['corpus_id'],
+                    ).all())
+                    session.commit()
             except Exception as e:
-                logger.warning(f"refresh_count failed after delete for set={eval_set_id}: {e}")
+                logger.exception(f"bulk_create transaction failed for set={eval_set_id}: {e}")
+                for r in results:
+                    if r.error is None:
+                        r.corpus_id = None
+                        r.error = f"写入失败: {e}"
+                return results
+        for r in results:
+            if r.error is None:
+                r.id = ids.get(r.corpus_id)
+                r.ok = True
+        logger.info(f"bulk_create: inserted {len(rows)}/{len(items)} rows for set={eval_set_id}")
+        return results
 
-            logger.info(f"delete_eval_data: id={id} marked deleted and corpus_id reassigned; shifted corpus ids for set={eval_set_id}")
-            return True
+    def bulk_update(self, eval_set_id: int, items: List[EvalDataBulkPatchItem]) -> List[EvalDataBulkRowResult]:
+        """在一个事务内批量更新评测数据（仅更新传入的字段），返回逐行结果"""
+        logger.info(f"bulk_update called for set={eval_set_id} items={len(items)}")
+        results = [EvalDataBulkRowResult(index=i, id=it.id, ok=False) for i, it in enumerate(items)]
+        with session_scope() as session:
+            rows = {r.id: r for r in session.query(EvalDataORM).filter(
+                EvalDataORM.id.in_({it.id for it in items}),
+                EvalDataORM.eval_set_id == eval_set_id,
+                EvalDataORM.deleted == False,
+            ).all()}
+            updated = 0
+            try:
+                with write_step(session):
+                    for i, it in enumerate(items):
+                        r = rows.get(it.id)
+                        if r is None:
+                            results[i].error = "Eval data not found for this eval set"
+                            continue
+                        err = self._validate_fields(it.content, it.expected, it.intent, require_content=it.content is not None)
+                        if err:
+                            results[i].error = err
+                            continue
+                        if it.content is not None:
+                            r.content = it.content
+                            r.row_hash = None
+                        if it.expected is not None:
+                            r.expected = it.expected
+                        if it.intent is not None:
+                            r.intent = it.intent
+                        results[i].corpus_id = r.corpus_id
+                        updated += 1
+                    session.commit()
+            except Exception as e:
+                logger.exception(f"bulk_update transaction failed for set={eval_set_id}: {e}")
+                for r in results:
+                    if r.error is None:
+                        r.error = f"写入失败: {e}"
+                return results
+        for r in results:
+            if r.error is None:
+                r.ok = True
+        logger.info(f"bulk_update: updated {updated}/{len(items)} rows for set={eval_set_id}")
+        return results
 
-        def update_eval_data(self, id: int, content: Optional[str] = None, expected: Optional[str] = None, intent: Optional[str] = None) -> Optional[EvalData]:
-            logger.info(f"update_eval_data called id={id}")
-            with SessionLocal() as session:
-                r = session.get(EvalDataORM, id)
-                if not r or r.deleted:
-                    logger.warning(f"update_eval_data: id={id} not found or deleted")
-                    return None
-                if content is not None:
-                    r.content = content
-                if expected is not None:
-                    r.expected = expected
-                if intent is not None:
-                    r.intent = intent
-                session.add(r)
+    def bulk_delete(self, eval_set_id: int, ids: List[int]) -> List[EvalDataBulkRowResult]:
+        """在一个事务内批量软删除评测数据，并一次性调整评测集计数，返回逐行结果"""
+        logger.info(f"bulk_delete called for set={eval_set_id} ids={len(ids)}")
+        results = [EvalDataBulkRowResult(index=i, id=did, ok=False) for i, did in enumerate(ids)]
+        with session_scope() as session:
+            found = dict(session.query(EvalDataORM.id, EvalDataORM.corpus_id).filter(
+                EvalDataORM.id.in_(set(ids)),
+                EvalDataORM.eval_set_id == eval_set_id,
+                EvalDataORM.deleted == False,
+            ).all())
+            try:
+                with write_step(session):
+                    if found:
+                        session.query(EvalDataORM).filter(EvalDataORM.id.in_(found.keys())).update(
+                            {EvalDataORM.deleted: True, EvalDataORM.row_hash: None}, synchronize_session=False
+                        )
+                        eval_set_service.adjust_count(session, eval_set_id, -len(found))
+                    session.commit()
+            except Exception as e:
+                logger.exception(f"bulk_delete transaction failed for set={eval_set_id}: {e}")
+                for r in results:
+                    r.error = f"删除失败: {e}"
+                return results
+        seen = set()
+        for r in results:
+            if r.id in seen:
+                r.error = "重复的 id"
+            elif r.id in found:
+                seen.add(r.id)
+                r.corpus_id = found[r.id]
+                r.ok = True
+            else:
+                r.error = "Eval data not found for this eval set"
+        logger.info(f"bulk_delete: deleted {len(found)}/{len(ids)} rows for set={eval_set_id}")
+        return results
+
+    def backfill_row_hashes(self, eval_set_id: int) -> int:
+        """为评测集中 row_hash 为空的未删除语料计算哈希（去重导入前调用）。
+
+        同一内容已有哈希的行（或本次回填中较早的行）保持为空，唯一键只落在每种内容最早的一行上。
+        返回回填的行数。
+        """
+        filled = 0
+        last_id = 0
+        with SessionLocal() as session:
+            while True:
+                rows = session.execute(
+                    select(EvalDataORM.id, EvalDataORM.content)
+                    .where(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False,
+                           EvalDataORM.row_hash.is_(None), EvalDataORM.id > last_id)
+                    .order_by(EvalDataORM.id).limit(_BACKFILL_CHUNK)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                hashes = {rid: content_hash(content) for rid, content in rows}
+                taken = {r[0] for r in session.execute(select(EvalDataORM.row_hash).where(
+                    EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.row_hash.in_(set(hashes.values())))).all()}
+                params = []
+                for rid, h in hashes.items():
+                    if h not in taken:
+                        taken.add(h)
+                        params.append({'id': rid, 'row_hash': h})
+                if params:
+                    session.execute(update(EvalDataORM), params)
                 session.commit()
-                session.refresh(r)
-                logger.info(f"update_eval_data: id={id} updated")
-                return EvalData.model_validate(r, from_attributes=True)
+                filled += len(params)
+        if filled:
+            logger.info(f"backfill_row_hashes: set={eval_set_id} filled={filled}")
+        return filled
 
 
 eval_data_service = EvalDataService()
@@ -1,47 +1,73 @@
-from typing import List, Optional
-from db.models import EvalResult as EvalResultORM
+from typing import Any, Dict, List, Optional, Sequence
+from db.models import EvalResult as EvalResultORM, EvalData as EvalDataORM
 from models.eval_result import EvalResultCreate, EvalResult
-from db.sqlalchemy import SessionLocal
+from db.sqlalchemy import session_scope, read_session_scope
+from services.result_summary_service import result_summary_service, intent_matches
 
 from utils.log import get_logger
 
 logger = get_logger("eval_result_service")
 
+# 可通过 fields= 投影的列（与 EvalResult 模型字段一致）
+RESULT_FIELDS = tuple(EvalResult.model_fields)
+
 
 class EvalResultService:
-    def create_result(self, payload: EvalResultCreate) -> EvalResult:
+    def create_result(self, payload: EvalResultCreate, expected_intent: Optional[str] = None) -> EvalResult:
+        """写入一条评测结果，并在同一事务内更新结果汇总。
+
+        expected_intent 为对应语料的预期意图；调用方已持有时直接传入，否则按 (eval_set_id, corpus_id) 查询一次。
+        """
         logger.info(f"create_result called for set={getattr(payload, 'eval_set_id', None)} data={getattr(payload, 'eval_data_id', None)}")
-        with SessionLocal() as session:
-            try:
-                # attempt to log engine url if available for debugging
-                engine = getattr(session.bind, 'url', None)
-                logger.debug(f"DB engine url: {engine}")
-            except Exception:
-                logger.debug("DB engine url: unavailable")
+        with session_scope() as session:
             obj = EvalResultORM(eval_set_id=payload.eval_set_id,
                                 eval_data_id=payload.eval_data_id,
                                 actual_result=payload.actual_result,
                                 actual_intent=payload.actual_intent,
                                 score=payload.score,
                                 agent_version=payload.agent_version,
-                                kdb=payload.kdb)
+                                kdb=payload.kdb,
+                                run_id=payload.run_id)
             # 若提供 exec_time，则覆盖默认值
             if getattr(payload, 'exec_time', None):
                 obj.exec_time = payload.exec_time
             session.add(obj)
+            if expected_intent is None:
+                expected_intent = self._expected_intent(session, payload.eval_set_id, payload.eval_data_id)
+            result_summary_service.apply(session, obj.eval_set_id, obj.agent_version, obj.run_id, obj.score, obj.kdb,
+                                         intent_matches(obj.actual_intent, expected_intent))
             session.commit()
             session.refresh(obj)
             logger.info(f"create_result: id={obj.id} set={obj.eval_set_id} data={obj.eval_data_id} score={obj.score}")
-            try:
-                cnt = session.query(EvalResultORM).count()
-                logger.debug(f"eval_results table row count after insert: {cnt}")
-            except Exception as e:
-                logger.debug(f"failed to count eval_results rows: {e}")
             return EvalResult.model_validate(obj, from_attributes=True)
 
+    def _expected_intent(self, session, eval_set_id: int, corpus_id: int) -> Optional[str]:
+        row = session.query(EvalDataORM.intent).filter(EvalDataORM.eval_set_id == eval_set_id,
+                                                       EvalDataORM.corpus_id == corpus_id).first()
+        return row[0] if row else None
+
+    def list_projected(self, fields: Sequence[str] = RESULT_FIELDS, eval_set_id: Optional[int] = None,
+                       eval_data_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """只 SELECT 指定列并直接返回 dict 行，跳过 ORM 实体与逐行模型校验（列表页可不取长文本 actual_result）。
+
+        行中的 datetime 保持原样，由 utils.fastjson 编码。
+        """
+        logger.info(f"list_projected called for set={eval_set_id} data={eval_data_id} fields={','.join(fields)}")
+        cols = [getattr(EvalResultORM, f) for f in fields]
+        with read_session_scope() as session:
+            q = session.query(*cols).filter(EvalResultORM.deleted == False)
+            if eval_set_id is not None:
+                q = q.filter(EvalResultORM.eval_set_id == eval_set_id)
+            if eval_data_id is not None:
+                q = q.filter(EvalResultORM.eval_data_id == eval_data_id)
+            rows = q.order_by(EvalResultORM.id).all()
+        out = [dict(zip(fields, row)) for row in rows]
+        logger.info(f"list_projected: found {len(out)} results")
+        return out
+
     def list_by_eval_set(self, eval_set_id: int) -> List[EvalResult]:
         logger.info(f"list_by_eval_set called for set={eval_set_id}")
-        with SessionLocal() as session:
+        with read_session_scope() as session:
             rows = session.query(EvalResultORM).filter(EvalResultORM.eval_set_id == eval_set_id,
                                                        EvalResultORM.deleted == False).all()
             logger.info(f"list_by_eval_set: found {len(rows)} results for set={eval_set_id}")
@@ -49,7 +75,7 @@ class EvalResultService:
 
     def list_by_eval_data(self, eval_data_id: int) -> List[EvalResult]:
         logger.info(f"list_by_eval_data called for data={eval_data_id}")
-        with SessionLocal() as session:
+        with read_session_scope() as session:
             rows = session.query(EvalResultORM).filter(EvalResultORM.eval_data_id == eval_data_id,
                                                        EvalResultORM.deleted == False).all()
             logger.info(f"list_by_eval_data: found {len(rows)} results for data={eval_data_id}")
@@ -57,7 +83,7 @@ class EvalResultService:
 
     def list_by_eval_data_with_set(self, eval_set_id: int, corpus_id: int) -> List[EvalResult]:
         logger.info(f"list_by_eval_data_with_set called for set={eval_set_id} corpus_id={corpus_id}")
-        with SessionLocal() as session:
+        with read_session_scope() as session:
             rows = session.query(EvalResultORM).filter(EvalResultORM.eval_set_id == eval_set_id,
                                                        EvalResultORM.eval_data_id == corpus_id,
                                                        EvalResultORM.deleted == False).all()
@@ -66,7 +92,7 @@ class EvalResultService:
 
     def get_result(self, id: int) -> Optional[EvalResult]:
         logger.info(f"get_result called id={id}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             r = session.get(EvalResultORM, id)
             if not r or r.deleted:
                 logger.warning(f"get_result: id={id} not found or deleted")
@@ -76,13 +102,16 @@ class EvalResultService:
 
     def delete_result(self, id: int) -> bool:
         logger.info(f"delete_result called id={id}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             r = session.get(EvalResultORM, id)
             if not r or r.deleted:
                 logger.warning(f"delete_result: id={id} not found or already deleted")
                 return False
             r.deleted = True
             session.add(r)
+            result_summary_service.apply(session, r.eval_set_id, r.agent_version, r.run_id, r.score, r.kdb,
+                                         intent_matches(r.actual_intent, self._expected_intent(session, r.eval_set_id, r.eval_data_id)),
+                                         sign=-1)
             session.commit()
             logger.info(f"delete_result: id={id} marked deleted")
             return True
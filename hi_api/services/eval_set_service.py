@@ -1,22 +1,63 @@
 from typing import List, Optional
+from sqlalchemy import case, func, event, select
 from sqlalchemy.orm import Session
 from db.models import EvalSet as EvalSetORM
 from models.eval_set import EvalSetCreate, EvalSet
-from db.sqlalchemy import SessionLocal
+from db.sqlalchemy import SessionLocal, session_scope
 from db.models import EvalData as EvalDataORM
+from db.database import InMemoryDB
+from config.settings import settings
 
 from utils.log import get_logger
 
 logger = get_logger("eval_set_service")
 
+# 评测集元数据的进程内缓存：('id', id) -> EvalSet 或 _MISSING（不存在/已删除），'list' -> List[EvalSet]
+eval_set_cache = InMemoryDB(maxsize=settings.eval_set_cache_max_entries, ttl_seconds=settings.eval_set_cache_ttl_seconds)
+_MISSING = object()
+_LIST_KEY = 'list'
+# session.info 中记录本事务内发生变化的评测集，提交或回滚后再失效一次缓存
+_PENDING_INVALIDATE = 'eval_set_cache_invalidate'
+
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _invalidate_after_commit(session):
+    for eval_set_id in session.info.pop(_PENDING_INVALIDATE, ()):
+        eval_set_service.invalidate(eval_set_id)
+
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def _invalidate_after_rollback(session):
+    # 事务中可能有并发读取回填了未提交的值，回滚后同样失效
+    for eval_set_id in session.info.pop(_PENDING_INVALIDATE, ()):
+        eval_set_service.invalidate(eval_set_id)
+
+
+def _cacheable(session: Session) -> bool:
+    """Session 中有未提交的写入（请求作用域内服务层 commit() 只 flush）时读到的是未提交的值，不回填缓存"""
+    return not (session.info.get('defer_commit') and session.info.get('wrote'))
+
 
 class EvalSetService:
     def __init__(self):
         pass
 
+    def invalidate(self, eval_set_id: Optional[int] = None) -> None:
+        """评测集写入后失效缓存；eval_set_id 为空时清空全部"""
+        if eval_set_id is None:
+            eval_set_cache.clear()
+            return
+        eval_set_cache.delete(('id', eval_set_id))
+        eval_set_cache.delete(_LIST_KEY)
+
+    def _invalidate_on_commit(self, session: Session, eval_set_id: int) -> None:
+        # 立即失效，并在事务真正提交后再失效一次，避免提交前被并发读取回填旧值
+        self.invalidate(eval_set_id)
+        session.info.setdefault(_PENDING_INVALIDATE, set()).add(eval_set_id)
+
     def create_eval_set(self, payload: EvalSetCreate) -> EvalSet:
         logger.info(f"create_eval_set called: name={getattr(payload, 'name', None)}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             # 创建评测集（初始 count 为 0），并分配 display_index
             # compute next display_index
             try:
@@ -28,62 +69,116 @@ class EvalSetService:
             session.add(obj)
             session.commit()
             session.refresh(obj)
-
-            # 从 eval_data 表计算实际数量（以防数据已存在）
-            actual_count = session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == obj.id, EvalDataORM.deleted == False).count()
-            if actual_count != obj.count:
-                obj.count = actual_count
-                session.add(obj)
-                session.commit()
-                session.refresh(obj)
-
+            self._invalidate_on_commit(session, obj.id)
             logger.info(f"eval_set created id={obj.id} name={obj.name} count={obj.count}")
             return EvalSet.model_validate(obj, from_attributes=True)
 
+    def adjust_count(self, session: Session, eval_set_id: int, delta: int) -> None:
+        """在调用方的事务中对 count 做原子增量更新（UPDATE ... SET count = count + delta）。
+
+        与数据变更同一事务提交，避免每次写入后再对 eval_data 做 COUNT(*)。
+        """
+        if not delta:
+            return
+        session.query(EvalSetORM).filter(EvalSetORM.id == eval_set_id).update(
+            {EvalSetORM.count: EvalSetORM.count + delta}, synchronize_session=False
+        )
+        self._invalidate_on_commit(session, eval_set_id)
+        logger.debug(f"adjust_count: eval_set id={eval_set_id} delta={delta}")
+
+    def allocate_corpus_ids(self, session: Session, eval_set_id: int, n: int) -> int:
+        """在调用方的事务中为评测集分配 n 个连续的 corpus_id，返回第一个。
+
+        从 eval_set.max_corpus_id 往后分配并推进它；清理服务物理删除语料后，已分配过的序号也不会复用。
+        该列上线前写入的语料没有记录，分配时与现存语料的 MAX(corpus_id) 取较大者。
+        """
+        current = select(func.coalesce(func.max(EvalDataORM.corpus_id), 0)).where(
+            EvalDataORM.eval_set_id == eval_set_id).scalar_subquery()
+        session.query(EvalSetORM).filter(EvalSetORM.id == eval_set_id).update(
+            {EvalSetORM.max_corpus_id: case((EvalSetORM.max_corpus_id >= current, EvalSetORM.max_corpus_id), else_=current) + n},
+            synchronize_session=False,
+        )
+        last = session.query(EvalSetORM.max_corpus_id).filter(EvalSetORM.id == eval_set_id).scalar()
+        if last is None:
+            # 评测集不存在（调用方通常已校验），按现存语料分配
+            last = int(session.execute(select(current)).scalar()) + n
+        return int(last) - n + 1
+
+    @staticmethod
+    def _actual_count():
+        """与 eval_sets 行关联的相关子查询：该评测集未删除语料的实际数量"""
+        return (
+            select(func.count(EvalDataORM.id))
+            .where(EvalDataORM.eval_set_id == EvalSetORM.id, EvalDataORM.deleted == False)
+            .correlate(EvalSetORM)
+            .scalar_subquery()
+        )
+
+    def _recount(self, session: Session, *criteria) -> int:
+        """用一条 UPDATE eval_sets SET count = (SELECT COUNT(*) ...) 修正计数，返回被修正的行数。
+
+        计数与写回在同一条语句中完成，不会用先读出的旧值覆盖期间并发的 adjust_count 增量。
+        """
+        actual = self._actual_count()
+        return session.query(EvalSetORM).filter(*criteria, EvalSetORM.count != actual).update(
+            {EvalSetORM.count: actual}, synchronize_session=False
+        )
+
     def refresh_count(self, eval_set_id: int) -> int:
-        """重新计算并持久化指定评测集的 eval_data 数量"""
+        """重新计算并持久化指定评测集的 eval_data 数量（用于修复单个评测集的计数偏差）"""
         logger.info(f"refresh_count called for eval_set_id={eval_set_id}")
-        with SessionLocal() as session:
-            obj = session.get(EvalSetORM, eval_set_id)
-            if not obj:
+        with session_scope() as session:
+            if not session.get(EvalSetORM, eval_set_id):
                 logger.warning(f"refresh_count: eval_set id={eval_set_id} not found")
                 return 0
-            cnt = session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False).count()
-            obj.count = cnt
-            session.add(obj)
+            self._recount(session, EvalSetORM.id == eval_set_id)
+            cnt = int(session.query(EvalSetORM.count).filter(EvalSetORM.id == eval_set_id).scalar())
             session.commit()
+            self._invalidate_on_commit(session, eval_set_id)
             logger.info(f"refresh_count: eval_set id={eval_set_id} count updated to {cnt}")
             return cnt
 
+    def reconcile_counts(self) -> int:
+        """用一条相关子查询 UPDATE 校对所有未删除评测集的 count，修复增量更新产生的偏差。
+
+        返回被修正的评测集数量。
+        """
+        logger.info("reconcile_counts called")
+        with session_scope() as session:
+            fixed = self._recount(session, EvalSetORM.deleted == False)
+            session.commit()
+            if fixed:
+                logger.warning(f"reconcile_counts: count drift fixed for {fixed} eval sets")
+                self.invalidate()
+            logger.info(f"reconcile_counts: fixed {fixed} eval sets")
+            return fixed
+
     def delete_eval_set(self, eval_set_id: int) -> bool:
-        """对指定评测集执行软删除，同时软删除其所有评测数据，并将 count 置为 0"""
+        """对指定评测集执行软删除，同时软删除其所有评测数据，并将 count 置为 0
+
+        display_index 仅作为稳定的排序键保留，不再前移后续评测集；
+        列表接口在读取时重新计算连续的展示序号。
+        """
         logger.info(f"delete_eval_set called for id={eval_set_id}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             obj = session.get(EvalSetORM, eval_set_id)
             if not obj:
                 logger.warning(f"delete_eval_set: eval_set id={eval_set_id} not found")
                 return False
-            # 标记评测集为删除，并将 display_index 置为 -1，随后将后续的 display_index 依次前移
-            deleted_index = obj.display_index
             obj.deleted = True
             obj.count = 0
-            obj.display_index = -1
             session.add(obj)
             # 标记相关 eval_data 为删除
-            session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id).update({EvalDataORM.deleted: True})
-
-            # 如果原先有合法的 display_index，则把后续的 index 前移
-            if deleted_index and deleted_index > 0:
-                session.query(EvalSetORM).filter(EvalSetORM.display_index > deleted_index).update({EvalSetORM.display_index: EvalSetORM.display_index - 1}, synchronize_session=False)
-
+            session.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id).update({EvalDataORM.deleted: True, EvalDataORM.row_hash: None})
             session.commit()
-            logger.info(f"delete_eval_set: eval_set id={eval_set_id} marked deleted and display_index shifted")
+            self._invalidate_on_commit(session, eval_set_id)
+            logger.info(f"delete_eval_set: eval_set id={eval_set_id} marked deleted")
             return True
 
     def update_eval_set(self, eval_set_id: int, name: Optional[str] = None) -> Optional[EvalSet]:
         """更新评测集名称"""
         logger.info(f"update_eval_set called id={eval_set_id} name={name}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             obj = session.get(EvalSetORM, eval_set_id)
             if not obj or obj.deleted:
                 logger.warning(f"update_eval_set: eval_set id={eval_set_id} not found or deleted")
@@ -93,30 +188,54 @@ class EvalSetService:
             session.add(obj)
             session.commit()
             session.refresh(obj)
+            self._invalidate_on_commit(session, eval_set_id)
             logger.info(f"update_eval_set: eval_set id={eval_set_id} updated name={obj.name}")
             return EvalSet.model_validate(obj, from_attributes=True)
 
     def list_eval_sets(self) -> List[EvalSet]:
         logger.info("list_eval_sets called")
-        with SessionLocal() as session:
-            rows = session.query(EvalSetORM).filter(EvalSetORM.deleted == False).order_by(EvalSetORM.display_index).all()
+        cached = eval_set_cache.get(_LIST_KEY)
+        if cached is not None:
+            return list(cached)
+        with session_scope() as session:
+            rows = session.query(EvalSetORM).filter(EvalSetORM.deleted == False).order_by(EvalSetORM.display_index, EvalSetORM.id).all()
             logger.info(f"list_eval_sets: found {len(rows)} sets")
-            return [EvalSet.model_validate(r, from_attributes=True) for r in rows]
+            items = [EvalSet.model_validate(r, from_attributes=True) for r in rows]
+            # 存储的 display_index 可能因删除留下空洞，这里按排序结果重新编号用于展示
+            for i, item in enumerate(items):
+                item.display_index = i + 1
+            if _cacheable(session):
+                eval_set_cache.set(_LIST_KEY, items)
+            return list(items)
 
     def get_eval_set(self, id: int) -> Optional[EvalSet]:
+        """读穿缓存：命中时不访问数据库（不存在/已删除的结果同样缓存）。返回对象为共享缓存，调用方不应修改"""
+        cached = eval_set_cache.get(('id', id))
+        if cached is not None:
+            logger.debug(f"get_eval_set: id={id} cache hit")
+            return None if cached is _MISSING else cached
         logger.info(f"get_eval_set called id={id}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             r = session.get(EvalSetORM, id)
             if not r or r.deleted:
                 logger.warning(f"get_eval_set: id={id} not found or deleted")
+                if _cacheable(session):
+                    eval_set_cache.set(('id', id), _MISSING)
                 return None
             logger.info(f"get_eval_set: id={id} found name={r.name}")
-            return EvalSet.model_validate(r, from_attributes=True)
+            item = EvalSet.model_validate(r, from_attributes=True)
+            if _cacheable(session):
+                eval_set_cache.set(('id', id), item)
+            return item
+
+    def exists(self, id: int) -> bool:
+        """评测集存在且未删除；走缓存，命中时无数据库往返"""
+        return self.get_eval_set(id) is not None
 
     def get_by_name(self, name: str) -> Optional[EvalSet]:
         """根据名称查找评测集（返回 Pydantic 模型）"""
         logger.info(f"get_by_name called name={name}")
-        with SessionLocal() as session:
+        with session_scope() as session:
             r = session.query(EvalSetORM).filter(EvalSetORM.name == name, EvalSetORM.deleted == False).first()
             if not r:
                 logger.warning(f"get_by_name: name={name} not found")
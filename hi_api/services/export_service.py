@@ -0,0 +1,294 @@
+"""评测数据与评测结果的流式导出（CSV / XLSX / Parquet / Arrow IPC）。
+
+行从服务端游标（stream_results）按块读取，CSV 边读边编码输出，XLSX 使用 openpyxl 只写模式（工作表先落到临时文件），
+Parquet / Arrow 每块写一个 RecordBatch，内存占用与导出行数无关。大导出可作为后台任务写到 EXPORT_DIR，完成后通过下载接口获取；
+Parquet / Arrow 也可通过 `python cli.py export` 直接导出到本地文件。
+结果导出默认包含已归档到 Parquet 的历史结果（见 archive_service），排在库中结果之前。
+"""
+
+import io
+import os
+import csv
+import time
+import tempfile
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy import and_, func, select
+
+from db.models import EvalData as EvalDataORM, EvalResult as EvalResultORM
+from db.sqlalchemy import ReadSessionLocal
+from services.job_service import job_service
+from utils.log import get_logger
+
+logger = get_logger("export_service")
+
+EXPORT_FORMATS = ('csv', 'xlsx', 'parquet', 'arrow')
+EXPORT_KINDS = ('data', 'results')
+MEDIA_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+# Parquet 列块与 Arrow IPC 缓冲区的压缩算法
+EXPORT_COMPRESSION = 'zstd'
+
+# 每次从游标取出并编码的行数
+EXPORT_CHUNK = 2000
+# 后台导出文件的目录，由 cleanup_service 按 UPLOAD_FILE_MAX_AGE_HOURS 回收
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'hi_api_exports'))
+# 后台导出进度写入 jobs 表的最小间隔（秒）
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+DATA_COLUMNS = ('corpus_id', 'content', 'expected', 'intent')
+RESULT_COLUMNS = ('id', 'corpus_id', 'content', 'expected', 'expected_intent', 'actual_result', 'actual_intent',
+                  'score', 'kdb', 'agent_version', 'run_id', 'exec_time')
+
+# 意图与版本取值很少，按字典编码（pandas 读为 category，DuckDB 按枚举处理），文件更小、分组更快
+_DICT = pa.dictionary(pa.int32(), pa.string())
+ARROW_SCHEMAS = {
+    'data': pa.schema([
+        ('corpus_id', pa.int64()),
+        ('content', pa.string()),
+        ('expected', pa.string()),
+        ('intent', _DICT),
+    ]),
+    'results': pa.schema([
+        ('id', pa.int64()),
+        ('corpus_id', pa.int64()),
+        ('content', pa.string()),
+        ('expected', pa.string()),
+        ('expected_intent', _DICT),
+        ('actual_result', pa.string()),
+        ('actual_intent', _DICT),
+        ('score', pa.int64()),
+        ('kdb', pa.int8()),
+        ('agent_version', _DICT),
+        ('run_id', pa.string()),
+        ('exec_time', pa.timestamp('us')),
+    ]),
+}
+
+
+class _DictionaryEncoder:
+    """跨批次累积的字典：新取值追加在末尾，之前的批次编码不变（Arrow IPC 文件据此写字典增量，而不是替换）"""
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def encode(self, column) -> pa.DictionaryArray:
+        index, values = self.index, self.values
+        codes = []
+        for v in column:
+            if v is None:
+                codes.append(None)
+                continue
+            code = index.get(v)
+            if code is None:
+                code = index[v] = len(values)
+                values.append(v)
+            codes.append(code)
+        return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32()), pa.array(values, type=pa.string()))
+
+
+class ExportService:
+
+    def _statement(self, kind: str, eval_set_id: int, agent_version: Optional[str], run_id: Optional[str]):
+        if kind == 'data':
+            d = EvalDataORM
+            return select(d.corpus_id, d.content, d.expected, d.intent).where(
+                d.eval_set_id == eval_set_id, d.deleted == False).order_by(d.corpus_id, d.id)
+        r, d = EvalResultORM, EvalDataORM
+        stmt = select(
+            r.id, r.eval_data_id, d.content, d.expected, d.intent, r.actual_result, r.actual_intent,
+            r.score, r.kdb, r.agent_version, r.run_id, r.exec_time,
+        ).select_from(r).outerjoin(
+            d, and_(d.eval_set_id == r.eval_set_id, d.corpus_id == r.eval_data_id, d.deleted == False)
+        ).where(r.eval_set_id == eval_set_id, r.deleted == False)
+        if agent_version is not None:
+            stmt = stmt.where(r.agent_version == agent_version)
+        if run_id is not None:
+            stmt = stmt.where(r.run_id == run_id)
+        return stmt.order_by(r.id)
+
+    def columns(self, kind: str) -> Tuple[str, ...]:
+        return DATA_COLUMNS if kind == 'data' else RESULT_COLUMNS
+
+    def count(self, kind: str, eval_set_id: int, agent_version: Optional[str] = None, run_id: Optional[str] = None,
+              include_archived: bool = True) -> int:
+        stmt = self._statement(kind, eval_set_id, agent_version, run_id).order_by(None)
+        with ReadSessionLocal() as session:
+            n = int(session.execute(select(func.count()).select_from(stmt.subquery())).scalar() or 0)
+            if kind == 'results' and include_archived:
+                # 只读 id 列逐批计数，与导出时的排除规则相同
+                n += sum(b.num_rows for b in self._archived_batches(session, eval_set_id, agent_version, run_id, []))
+            return n
+
+    def _archived_batches(self, session, eval_set_id: int, agent_version: Optional[str], run_id: Optional[str],
+                          columns: List[str]):
+        """评测集的归档结果，按块流式读取；库中仍存在的 id（含已软删除）以库为准，每块按 id 区间回查一次排除"""
+        from services.archive_service import result_archive_service
+        r = EvalResultORM
+
+        def live_ids(lo: int, hi: int):
+            return session.execute(select(r.id).where(r.eval_set_id == eval_set_id, r.id.between(lo, hi))).scalars()
+
+        return result_archive_service.iter_batches(eval_set_id, agent_version, run_id, columns=columns,
+                                                   live_ids=live_ids, batch_size=EXPORT_CHUNK)
+
+    def _iter_archived(self, session, eval_set_id: int, agent_version: Optional[str],
+                       run_id: Optional[str]) -> Iterator[List[tuple]]:
+        """归档结果按块产出，列与 RESULT_COLUMNS 一致；content/expected 按 corpus_id 回查当前语料（与库中结果的关联方式相同）"""
+        d = EvalDataORM
+        for batch in self._archived_batches(session, eval_set_id, agent_version, run_id, [
+                'eval_data_id', 'expected_intent', 'actual_result', 'actual_intent', 'score', 'kdb', 'agent_version',
+                'run_id', 'exec_time']):
+            part = batch.to_pydict()
+            corpus = {c: (content, expected) for c, content, expected in session.execute(
+                select(d.corpus_id, d.content, d.expected).where(
+                    d.eval_set_id == eval_set_id, d.deleted == False, d.corpus_id.in_(set(part['eval_data_id'])))).all()}
+            yield [(rid, cid, *corpus.get(cid, (None, None)), ei, ar, ai, sc, kdb, av, run, et)
+                   for rid, cid, ei, ar, ai, sc, kdb, av, run, et in zip(
+                       part['id'], part['eval_data_id'], part['expected_intent'], part['actual_result'],
+                       part['actual_intent'], part['score'], part['kdb'], part['agent_version'], part['run_id'],
+                       part['exec_time'])]
+
+    def iter_rows(self, kind: str, eval_set_id: int, agent_version: Optional[str] = None,
+                  run_id: Optional[str] = None, include_archived: bool = True) -> Iterator[List[tuple]]:
+        """按块产出数据行（每块最多 EXPORT_CHUNK 行）。使用独立的只读 Session：流式响应在请求结束后才被消费。
+
+        kind=results 且 include_archived 时先产出归档结果，再产出库中结果。
+        """
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f"unsupported export kind: {kind}")
+        stmt = self._statement(kind, eval_set_id, agent_version, run_id)
+        with ReadSessionLocal() as session:
+            if kind == 'results' and include_archived:
+                yield from self._iter_archived(session, eval_set_id, agent_version, run_id)
+            result = session.connection().execution_options(stream_results=True).execute(stmt)
+            for part in result.partitions(EXPORT_CHUNK):
+                yield part
+
+    def iter_csv(self, kind: str, eval_set_id: int, agent_version: Optional[str] = None,
+                 run_id: Optional[str] = None, include_archived: bool = True) -> Iterator[bytes]:
+        """CSV 字节流：UTF-8 带 BOM（Excel 直接打开不乱码），每块行编码一次"""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(self.columns(kind))
+        yield buf.getvalue().encode('utf-8-sig')
+        for part in self.iter_rows(kind, eval_set_id, agent_version, run_id, include_archived):
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(part)
+            yield buf.getvalue().encode('utf-8')
+
+    def write(self, path: str, fmt: str, kind: str, eval_set_id: int, agent_version: Optional[str] = None,
+              run_id: Optional[str] = None, on_progress=None, include_archived: bool = True) -> int:
+        """把导出写入文件，返回行数；on_progress(rows) 每块回调一次"""
+        rows = 0
+        if fmt == 'csv':
+            with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.columns(kind))
+                for part in self.iter_rows(kind, eval_set_id, agent_version, run_id, include_archived):
+                    writer.writerows(part)
+                    rows += len(part)
+                    if on_progress:
+                        on_progress(rows)
+            return rows
+        if fmt in ('parquet', 'arrow'):
+            return self._write_arrow(path, fmt, kind, eval_set_id, agent_version, run_id, on_progress, include_archived)
+        import openpyxl
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(kind)
+        ws.append(list(self.columns(kind)))
+        for part in self.iter_rows(kind, eval_set_id, agent_version, run_id, include_archived):
+            for row in part:
+                ws.append([_xlsx_value(v, ILLEGAL_CHARACTERS_RE) for v in row])
+            rows += len(part)
+            if on_progress:
+                on_progress(rows)
+        wb.save(path)
+        return rows
+
+    def _write_arrow(self, path: str, fmt: str, kind: str, eval_set_id: int, agent_version: Optional[str],
+                     run_id: Optional[str], on_progress=None, include_archived: bool = True) -> int:
+        """每个游标块写一个 RecordBatch（Parquet 中即一个行组）"""
+        schema = ARROW_SCHEMAS[kind]
+        encoders = {f.name: _DictionaryEncoder() for f in schema if pa.types.is_dictionary(f.type)}
+        if fmt == 'parquet':
+            writer = pq.ParquetWriter(path, schema, compression=EXPORT_COMPRESSION)
+        else:
+            writer = ipc.new_file(path, schema, options=ipc.IpcWriteOptions(
+                compression=EXPORT_COMPRESSION, emit_dictionary_deltas=True))
+        rows = 0
+        with writer:
+            for part in self.iter_rows(kind, eval_set_id, agent_version, run_id, include_archived):
+                arrays = []
+                for field, col in zip(schema, zip(*part)):
+                    enc = encoders.get(field.name)
+                    arrays.append(enc.encode(col) if enc else pa.array(col, type=field.type))
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                rows += len(part)
+                if on_progress:
+                    on_progress(rows)
+            if not rows:
+                # 空结果也写出带 schema 的文件
+                writer.write_table(schema.empty_table())
+        return rows
+
+    def run_export_job(self, job_id: str, fmt: str, kind: str, eval_set_id: int,
+                       agent_version: Optional[str] = None, run_id: Optional[str] = None,
+                       include_archived: bool = True) -> None:
+        """后台导出：写到 export_path(job_id, fmt)，完成后由 GET /api/v1/export/files/{job_id} 下载"""
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = export_path(job_id, fmt)
+        start = time.perf_counter()
+        try:
+            total = self.count(kind, eval_set_id, agent_version, run_id, include_archived)
+            job_service.update(job_id, status='running', total=total, started=True)
+            last = [0.0]
+
+            def progress(n: int) -> None:
+                now = time.monotonic()
+                if now - last[0] >= PROGRESS_INTERVAL_SECONDS:
+                    job_service.update(job_id, processed=min(n, total))
+                    last[0] = now
+
+            rows = self.write(path + '.tmp', fmt, kind, eval_set_id, agent_version, run_id, progress, include_archived)
+            os.replace(path + '.tmp', path)
+            size = os.path.getsize(path)
+            logger.info(f"export job={job_id} kind={kind} set={eval_set_id} fmt={fmt} rows={rows} bytes={size} "
+                        f"took_ms={int((time.perf_counter() - start) * 1000)}")
+            job_service.update(job_id, status='success', processed=rows, total=rows, finished=True, result={
+                'rows': rows, 'bytes': size, 'format': fmt, 'kind': kind,
+                'download_url': f"/api/v1/export/files/{job_id}",
+            })
+        except Exception as e:
+            logger.exception(f"export job {job_id} failed: {e}")
+            try:
+                os.remove(path + '.tmp')
+            except OSError:
+                pass
+            job_service.update(job_id, status='failed', error=str(e), finished=True)
+
+
+def export_path(job_id: str, fmt: str) -> str:
+    return os.path.join(EXPORT_DIR, f"export_{job_id}.{fmt}")
+
+
+def _xlsx_value(v, illegal_re):
+    # openpyxl 拒绝控制字符与带时区的 datetime
+    if isinstance(v, str):
+        return illegal_re.sub('', v)
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        return v.replace(tzinfo=None)
+    return v
+
+
+export_service = ExportService()
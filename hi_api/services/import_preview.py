@@ -0,0 +1,172 @@
+"""导入预览：上传后、真正导入前，返回识别出的格式与列映射、前 N 行以及抽样校验结果。
+
+复用导入时的只读读取器（import_readers），不写库。校验规则与 eval_data_service._validate_fields 一致
+（长度上限取自 eval_data 列定义），另外按 row_hash 的规范化规则统计文件内重复的 content。
+文件开头顺序扫描至多 PREVIEW_SCAN_ROWS 行或 PREVIEW_TIME_BUDGET 秒；文本格式还会在文件中均匀分布的
+PREVIEW_SAMPLE_WINDOWS 个位置各抽一段，大文件中后部的问题也能在一秒内发现。未扫描完整个文件时，
+按扫描比例外推 estimated_errors。
+"""
+
+import os
+import time
+from typing import Dict, List
+
+from db.models import EvalData as EvalDataORM
+from services.eval_data_service import content_hash
+from services.import_readers import COLUMNS, ImportFormatError, open_source, detect_format
+from services.upload_job_worker import _is_empty
+
+# 默认与最大预览行数
+PREVIEW_ROWS = 20
+PREVIEW_MAX_ROWS = 200
+# 顺序扫描的行数与时间上限（秒），抽样窗口数
+PREVIEW_SCAN_ROWS = int(os.getenv('PREVIEW_SCAN_ROWS', '5000'))
+PREVIEW_TIME_BUDGET = float(os.getenv('PREVIEW_TIME_BUDGET', '0.5'))
+PREVIEW_SAMPLE_WINDOWS = int(os.getenv('PREVIEW_SAMPLE_WINDOWS', '16'))
+# 每条规则最多给出的示例行号
+PREVIEW_EXAMPLES = 5
+
+# empty_content 与 duplicate_content 只是提示（导入时空行跳过、重复行按导入模式处理），其余规则会导致行写入失败或被截断
+WARN_RULES = ('empty_content', 'duplicate_content')
+RULES = ('empty_content', 'content_too_long', 'expected_too_long', 'intent_too_long', 'duplicate_content', 'invalid_row')
+LIMITS = {field: EvalDataORM.__table__.c[field].type.length for field in COLUMNS}
+
+
+class _Validator:
+    """逐行应用校验规则，累计各规则的错误数与示例行号"""
+
+    def __init__(self):
+        self.errors = {rule: 0 for rule in RULES}
+        self.examples: Dict[str, List] = {rule: [] for rule in RULES}
+        self.hashes = set()
+        self.scanned = 0
+
+    def check(self, row, rowno, dedup: bool = True) -> List[str]:
+        """rowno 为文件中的行号（抽样行未知时为 None）；row 为 None 表示该行无法解析"""
+        self.scanned += 1
+        if row is None:
+            failed = ['invalid_row']
+        else:
+            failed = []
+            content = row[0]
+            if _is_empty(content):
+                failed.append('empty_content')
+            elif dedup:
+                h = content_hash(content)
+                if h in self.hashes:
+                    failed.append('duplicate_content')
+                self.hashes.add(h)
+            for field, value in zip(COLUMNS, row):
+                limit = LIMITS[field]
+                if value is not None and limit and len(str(value)) > limit:
+                    failed.append(f"{field}_too_long")
+        for rule in failed:
+            self.errors[rule] += 1
+            if rowno is not None and len(self.examples[rule]) < PREVIEW_EXAMPLES:
+                self.examples[rule].append(rowno)
+        return failed
+
+
+def _cell(v):
+    return v if v is None or isinstance(v, (str, int, float, bool)) else str(v)
+
+
+def preview_file(path: str, rows: int = PREVIEW_ROWS) -> dict:
+    """预览上传文件；格式无法识别或内容无法解析时抛出 ImportFormatError"""
+    start = time.perf_counter()
+    rows = max(1, min(rows, PREVIEW_MAX_ROWS))
+    fmt = detect_format(path)
+    source = open_source(path, fmt)
+    validator = _Validator()
+    preview = []
+    warnings = []
+    complete = False
+    parse_error = None
+    # 扫描预算从打开文件之后算起：xlsx 打开时要先解析整个共享字符串表，这部分时间与扫描行数无关
+    scan_start = time.perf_counter()
+    try:
+        estimated = source.estimate_total()
+        # 有表头的格式第 1 行是表头，数据行号从 2 开始（与在 Excel 中看到的行号一致）
+        it = source.rows()
+        rowno = 1
+        while True:
+            try:
+                row = next(it)
+            except StopIteration:
+                complete = True
+                break
+            except ImportFormatError as e:
+                # 导入遇到这一行会整体失败；读取器已无法继续，剩余部分交给抽样
+                parse_error = str(e)
+                validator.check(None, None)
+                break
+            rowno += 1
+            n = rowno if source.header is not None else rowno - 1
+            failed = validator.check(row, n)
+            if len(preview) < rows:
+                preview.append({'row': n,
+                                'content': _cell(row[0]), 'expected': _cell(row[1]), 'intent': _cell(row[2]),
+                                'errors': failed})
+            if validator.scanned >= PREVIEW_SCAN_ROWS or time.perf_counter() - scan_start > PREVIEW_TIME_BUDGET:
+                break
+        sequential = validator.scanned
+        sampled = False
+        if not complete:
+            windows = source.sample(PREVIEW_SAMPLE_WINDOWS)
+            if windows is not None:
+                for row in windows:
+                    # 抽样窗口之间、以及与开头扫过的部分可能重叠，不参与重复统计
+                    validator.check(row, None, dedup=False)
+                    sampled = True
+                    if time.perf_counter() - scan_start > PREVIEW_TIME_BUDGET * 2:
+                        break
+        header = [_cell(h) for h in source.header] if source.header is not None else None
+        index = source.index
+    finally:
+        source.close()
+
+    if complete:
+        estimated = sequential
+    mapping = {}
+    for field, i in zip(COLUMNS, index):
+        if header is None:
+            mapping[field] = field  # JSONL 按字段名取值
+        else:
+            mapping[field] = header[i] if 0 <= i < len(header) else None
+    if header is not None:
+        names = [str(h).strip().lower() if h is not None else '' for h in header]
+        if 'content' not in names:
+            warnings.append("表头中没有 content 列，按位置取前三列（content, expected, intent）")
+        missing = [f for f in COLUMNS if mapping[f] is None]
+        if missing:
+            warnings.append(f"表头中缺少列：{', '.join(missing)}，导入时为空")
+    if not validator.scanned:
+        warnings.append("文件中没有数据行")
+    if not complete:
+        warnings.append(f"文件未完整扫描：已校验 {validator.scanned} 行（约 {estimated} 行），错误数按比例估算")
+
+    errors = {k: v for k, v in validator.errors.items() if v}
+    if complete or not validator.scanned:
+        estimated_errors = dict(errors)
+    else:
+        scale = max(estimated, validator.scanned) / validator.scanned
+        estimated_errors = {k: int(round(v * scale)) for k, v in errors.items()}
+    return {
+        'format': fmt,
+        'size': os.path.getsize(path),
+        'estimated_rows': estimated,
+        'columns': {'header': header, 'mapping': mapping},
+        'rows': preview,
+        'validation': {
+            'scanned_rows': validator.scanned,
+            'sampled': sampled,
+            'complete': complete,
+            'errors': errors,
+            'estimated_errors': estimated_errors,
+            'examples': {k: v for k, v in validator.examples.items() if v},
+            'parse_error': parse_error,
+        },
+        'warnings': warnings,
+        'ok': not any(k not in WARN_RULES for k in errors),
+        'took_ms': int((time.perf_counter() - start) * 1000),
+    }
@@ -0,0 +1,424 @@
+"""导入文件读取器：按文件内容/扩展名识别格式，流式产出 (content, expected, intent) 行。
+
+支持 xlsx（openpyxl 只读模式）、CSV/TSV、JSONL、旧版 .xls（BIFF，需可选依赖 xlrd）以及
+Excel 另存为网页得到的 .xls（HTML 表格，hi_ui/public/import_template.xls 即为此格式）。
+分批、corpus_id 分配与进度上报由 upload_job_worker 统一处理，读取器只负责解析。
+"""
+
+import io
+import os
+import csv
+import json
+import zlib
+import zipfile
+from xml.etree.ElementTree import ParseError
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.log import get_logger
+
+logger = get_logger("import_readers")
+
+IMPORT_FORMATS = ('xlsx', 'xls', 'html', 'csv', 'tsv', 'jsonl')
+COLUMNS = ('content', 'expected', 'intent')
+# 文本格式估算总行数时采样的字节数
+SAMPLE_BYTES = 64 * 1024
+# 工作表缺少维度信息时，按每行约多少字节（压缩后的 xlsx）估算总行数
+XLSX_BYTES_PER_ROW = 40
+
+Row = Tuple[object, object, object]
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _workbook_errors() -> tuple:
+    """工作簿损坏（截断、非 zip、XML 不合法、缺少成员/工作表）时解析库抛出的异常，统一转换为 ImportFormatError"""
+    errors = [zipfile.BadZipFile, zlib.error, EOFError, ParseError, KeyError]
+    try:
+        from openpyxl.utils.exceptions import InvalidFileException
+        errors.append(InvalidFileException)
+    except ImportError:
+        pass
+    try:
+        from lxml.etree import XMLSyntaxError
+        errors.append(XMLSyntaxError)
+    except ImportError:
+        pass
+    try:
+        from xlrd import XLRDError
+        errors.append(XLRDError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def detect_format(path: str) -> str:
+    """先看文件头魔数，再看扩展名，最后按首行内容猜测"""
+    with open(path, 'rb') as f:
+        head = f.read(512)
+    if head.startswith(b'PK\x03\x04'):
+        return 'xlsx'
+    if head.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text.startswith(b'<'):
+        return 'html'
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.tsv', '.tab'):
+        return 'tsv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if ext == '.csv':
+        return 'csv'
+    if text.startswith(b'{'):
+        return 'jsonl'
+    first_line = text.split(b'\n', 1)[0]
+    return 'tsv' if b'\t' in first_line and b',' not in first_line else 'csv'
+
+
+def _column_index(header: Optional[tuple]) -> Tuple[int, int, int]:
+    """表头含 content/expected/intent 列名时按列名取列，否则按位置取前三列"""
+    if header:
+        names = [str(h).strip().lower() if h is not None else '' for h in header]
+        if 'content' in names:
+            return tuple(names.index(c) if c in names else -1 for c in COLUMNS)
+    return 0, 1, 2
+
+
+def _pick(row, index: Tuple[int, int, int]) -> Row:
+    n = len(row)
+    return tuple(row[i] if 0 <= i < n else None for i in index)
+
+
+def _text_encoding(path: str) -> str:
+    """UTF-8（含 BOM）优先；采样无法按 UTF-8 解码时按 GB18030 读取（Excel 导出的中文 CSV 常见）"""
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_BYTES)
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # 采样末尾截断的多字节字符不算解码失败
+        if not (len(sample) == SAMPLE_BYTES and e.start >= len(sample) - 3 and e.reason == 'unexpected end of data'):
+            return 'gb18030'
+    return 'utf-8-sig'
+
+
+def _estimate_lines(path: str) -> int:
+    """按文件大小 / 采样平均行长估算行数，不扫描整个文件"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_BYTES)
+    lines = sample.count(b'\n')
+    if not lines:
+        return 1 if size else 0
+    return max(1, int(size / (len(sample) / lines)))
+
+
+class ImportSource:
+    """一个待导入文件：rows() 流式产出数据行（不含表头），estimate_total() 给出无需扫描的行数估算。
+
+    rows() 读到表头后设置 header（原始表头，无表头的格式为 None）与 index（content/expected/intent 的列位置）。
+    """
+
+    format = ''
+    header: Optional[tuple] = None
+    index: Tuple[int, int, int] = (0, 1, 2)
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def rows(self) -> Iterator[Row]:
+        raise NotImplementedError
+
+    def estimate_total(self) -> int:
+        return _estimate_lines(self.path)
+
+    def sample(self, windows: int) -> Optional[Iterator[Optional[Row]]]:
+        """从文件中均匀分布的 windows 个位置抽样解析数据行，不读取整个文件；需先调用过 rows() 以识别表头。
+
+        只有按行分隔的文本格式支持，其余格式返回 None。无法解析的行产出 None。
+        """
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+def _windows(path: str, encoding: str, windows: int) -> Iterator[str]:
+    """按文件大小均匀取 windows 段（每段 SAMPLE_BYTES），丢弃首尾不完整的行。
+
+    换行符 0x0A 不会出现在 UTF-8 / GB18030 多字节字符内部，按字节切行不会切坏字符。
+    """
+    size = os.path.getsize(path)
+    if size <= SAMPLE_BYTES:
+        return
+    with open(path, 'rb') as f:
+        for i in range(windows):
+            f.seek(size * (i + 1) // (windows + 1))
+            chunk = f.read(SAMPLE_BYTES)
+            start, end = chunk.find(b'\n'), chunk.rfind(b'\n')
+            if start < 0 or end <= start:
+                continue
+            yield chunk[start + 1:end + 1].decode(encoding, errors='replace')
+
+
+class XlsxSource(ImportSource):
+    format = 'xlsx'
+
+    def __init__(self, path: str, sheet: Optional[str] = None):
+        super().__init__(path)
+        import openpyxl
+        self.wb = openpyxl.load_workbook(path, read_only=True)
+        self.ws = self.wb[sheet] if sheet else self.wb.active
+
+    def rows(self) -> Iterator[Row]:
+        # 只读模式按需解压、解析工作表 XML，损坏的部分在迭代到时才会报错
+        try:
+            rows_iter = self.ws.iter_rows(values_only=True)
+            self.header = next(rows_iter, None)
+            self.index = index = _column_index(self.header)
+            for row in rows_iter:
+                yield _pick(row, index)
+        except _workbook_errors() as e:
+            raise ImportFormatError(f"corrupt xlsx file: {e}") from e
+
+    def estimate_total(self) -> int:
+        # openpyxl 只读模式的 max_row 来自 <dimension>，无需扫描
+        try:
+            max_row = self.ws.max_row
+        except Exception:
+            max_row = None
+        if max_row:
+            return max(0, int(max_row) - 1)
+        return max(1, os.path.getsize(self.path) // XLSX_BYTES_PER_ROW // len(self.wb.worksheets))
+
+    def close(self) -> None:
+        self.wb.close()
+
+
+class CsvSource(ImportSource):
+    format = 'csv'
+
+    def __init__(self, path: str, delimiter: str = ','):
+        super().__init__(path)
+        self.delimiter = delimiter
+        self.format = 'tsv' if delimiter == '\t' else 'csv'
+        self.encoding = _text_encoding(path)
+
+    def rows(self) -> Iterator[Row]:
+        with open(self.path, 'r', encoding=self.encoding, newline='') as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader, None)
+            self.header = tuple(header) if header is not None else None
+            self.index = index = _column_index(self.header)
+            for row in reader:
+                # CSV 没有“空单元格”与空字符串之分，空串按缺失处理
+                yield tuple(v if v != '' else None for v in _pick(row, index))
+
+    def estimate_total(self) -> int:
+        return max(0, _estimate_lines(self.path) - 1)
+
+    def sample(self, windows: int) -> Iterator[Optional[Row]]:
+        for text in _windows(self.path, self.encoding, windows):
+            for row in csv.reader(io.StringIO(text), delimiter=self.delimiter):
+                # 窗口起点落在引号内的多行字段中间时列数与表头对不上，丢弃而不是误报
+                if self.header is not None and len(row) != len(self.header):
+                    continue
+                yield tuple(v if v != '' else None for v in _pick(row, self.index))
+
+
+class JsonlSource(ImportSource):
+    """每行一个 JSON 对象，字段 content/expected/intent；无表头"""
+
+    format = 'jsonl'
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.encoding = _text_encoding(path)
+
+    @staticmethod
+    def _parse(line: str, lineno) -> Row:
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"line {lineno}: invalid JSON: {e}")
+        if not isinstance(obj, dict):
+            raise ImportFormatError(f"line {lineno}: expected a JSON object")
+        return obj.get('content'), obj.get('expected'), obj.get('intent')
+
+    def rows(self) -> Iterator[Row]:
+        with open(self.path, 'r', encoding=self.encoding) as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if line:
+                    yield self._parse(line, lineno)
+
+    def sample(self, windows: int) -> Iterator[Optional[Row]]:
+        for text in _windows(self.path, self.encoding, windows):
+            for line in text.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield self._parse(line, '?')
+                except ImportFormatError:
+                    yield None
+
+
+class XlsSource(ImportSource):
+    """BIFF 格式的旧版 .xls，需要 xlrd"""
+
+    format = 'xls'
+
+    def __init__(self, path: str, sheet: Optional[str] = None):
+        super().__init__(path)
+        try:
+            import xlrd
+        except ImportError:
+            raise ImportFormatError("reading legacy .xls files requires the optional dependency xlrd")
+        self.book = xlrd.open_workbook(path, on_demand=True)
+        self.sheet = self.book.sheet_by_name(sheet) if sheet else self.book.sheet_by_index(0)
+
+    def rows(self) -> Iterator[Row]:
+        if self.sheet.nrows == 0:
+            return
+        self.header = tuple(self.sheet.row_values(0))
+        self.index = index = _column_index(self.header)
+        for r in range(1, self.sheet.nrows):
+            yield _pick(self.sheet.row_values(r), index)
+
+    def estimate_total(self) -> int:
+        return max(0, self.sheet.nrows - 1)
+
+    def close(self) -> None:
+        self.book.release_resources()
+
+
+class _TableParser(HTMLParser):
+    """收集第一个 <table> 中各 <tr> 的单元格文本"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[List[str]] = []
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._tables = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self._tables += 1
+        elif self._tables == 1 and tag == 'tr':
+            self._row = []
+        elif self._row is not None and tag in ('td', 'th'):
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th') and self._cell is not None:
+            self._row.append(''.join(self._cell).strip())
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+class HtmlTableSource(ImportSource):
+    """Excel“另存为网页”得到的 .xls（HTML 表格）；空单元格按缺失处理"""
+
+    format = 'html'
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        parser = _TableParser()
+        with open(path, 'r', encoding=_text_encoding(path)) as f:
+            while True:
+                chunk = f.read(SAMPLE_BYTES)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        parser.close()
+        self._rows = parser.rows
+
+    def rows(self) -> Iterator[Row]:
+        if not self._rows:
+            return
+        self.header = tuple(self._rows[0])
+        self.index = index = _column_index(self.header)
+        for row in self._rows[1:]:
+            yield tuple(v if v != '' else None for v in _pick(row, index))
+
+    def estimate_total(self) -> int:
+        return max(0, len(self._rows) - 1)
+
+
+_SOURCES: Dict[str, Callable[[str], ImportSource]] = {
+    'xlsx': XlsxSource,
+    'xls': XlsSource,
+    'html': HtmlTableSource,
+    'csv': CsvSource,
+    'tsv': lambda path: CsvSource(path, delimiter='\t'),
+    'jsonl': JsonlSource,
+}
+
+
+def open_source(path: str, fmt: Optional[str] = None, sheet: Optional[str] = None) -> ImportSource:
+    """打开待导入文件；sheet 指定工作表名（仅 xlsx / BIFF xls），默认活动表/第一个表"""
+    fmt = fmt or detect_format(path)
+    if fmt not in _SOURCES:
+        raise ImportFormatError(f"unsupported import format: {fmt}")
+    logger.info(f"open_source: {path} format={fmt} sheet={sheet}")
+    if sheet is not None and fmt not in ('xlsx', 'xls'):
+        raise ImportFormatError(f"format {fmt} has no sheets")
+    try:
+        if sheet is not None:
+            return _SOURCES[fmt](path, sheet=sheet)
+        return _SOURCES[fmt](path)
+    except _workbook_errors() as e:
+        if fmt not in ('xlsx', 'xls'):
+            raise
+        raise ImportFormatError(f"cannot open {fmt} file: {e}") from e
+
+
+def list_sheets(path: str, fmt: Optional[str] = None) -> List[Tuple[str, int]]:
+    """工作簿中含数据行的工作表（按工作簿顺序）及各自的估算行数，只打开一次工作簿；
+    没有工作表概念的格式返回空列表"""
+    fmt = fmt or detect_format(path)
+    try:
+        return _list_sheets(path, fmt)
+    except _workbook_errors() as e:
+        raise ImportFormatError(f"cannot open {fmt} file: {e}") from e
+
+
+def _list_sheets(path: str, fmt: str) -> List[Tuple[str, int]]:
+    out = []
+    if fmt == 'xlsx':
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            for ws in wb.worksheets:
+                if len(list(ws.iter_rows(max_row=2, values_only=True))) < 2:
+                    continue
+                max_row = ws.max_row
+                out.append((ws.title, max(0, int(max_row) - 1) if max_row
+                            else max(1, os.path.getsize(path) // XLSX_BYTES_PER_ROW // len(wb.worksheets))))
+        finally:
+            wb.close()
+    elif fmt == 'xls':
+        try:
+            import xlrd
+        except ImportError:
+            raise ImportFormatError("reading legacy .xls files requires the optional dependency xlrd")
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            for name in book.sheet_names():
+                nrows = book.sheet_by_name(name).nrows
+                if nrows > 1:
+                    out.append((name, nrows - 1))
+        finally:
+            book.release_resources()
+    return out
@@ -0,0 +1,81 @@
+import json
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional
+from db.models import Job as JobORM
+from db.sqlalchemy import SessionLocal, session_scope
+
+from utils.log import get_logger
+from utils.metrics import record_job_finished
+
+logger = get_logger("job_service")
+
+# jobs.kind 取值
+JOB_KINDS = ('upload', 'upload_batch', 'execute', 'archive', 'cleanup', 'export')
+
+
+class JobService:
+    """jobs 表的创建与进度更新，供后台任务（导入、归档、清理等）共用"""
+
+    def create(self, kind: str, eval_set_id: Optional[int] = None, file_path: Optional[str] = None,
+               file_hash: Optional[str] = None, options: Optional[dict] = None,
+               parent_job_id: Optional[str] = None) -> str:
+        """创建 pending 任务并返回 job_id；options 为任务参数，以 JSON 存储；parent_job_id 为所属父任务"""
+        job_id = uuid.uuid4().hex
+        # 请求内创建时并入请求事务（与同一请求中新建的评测集一起提交，后台任务开始前已提交）
+        with session_scope() as session:
+            session.add(JobORM(job_id=job_id, kind=kind, eval_set_id=eval_set_id, status='pending',
+                               processed=0, total=0, file_path=file_path, file_hash=file_hash,
+                               options=json.dumps(options, ensure_ascii=False) if options else None,
+                               parent_job_id=parent_job_id))
+            session.commit()
+        logger.info(f"create: job={job_id} kind={kind} set={eval_set_id}")
+        return job_id
+
+    def update(self, job_id: Optional[str], status: Optional[str] = None, processed: Optional[int] = None,
+               total: Optional[int] = None, error: Optional[str] = None, result: Any = None,
+               started: bool = False, finished: bool = False) -> None:
+        """更新任务字段；job_id 为空时忽略（任务可不经 jobs 表直接调用），result 以 JSON 存储"""
+        if not job_id:
+            return
+        with SessionLocal() as session:
+            job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
+            if not job:
+                return
+            if status is not None:
+                job.status = status
+            if processed is not None:
+                job.processed = processed
+            if total is not None:
+                job.total = total
+            if error is not None:
+                job.error = error
+            if result is not None:
+                job.result = json.dumps(result, ensure_ascii=False, default=str)
+            if started:
+                job.started_at = datetime.utcnow()
+            if finished:
+                job.finished_at = datetime.utcnow()
+                seconds = (job.finished_at - job.started_at.replace(tzinfo=None)).total_seconds() if job.started_at else None
+                kind, final_status, done = job.kind or 'unknown', job.status, job.processed or 0
+            session.commit()
+        if finished:
+            record_job_finished(kind, final_status, done, seconds)
+
+    def children(self, parent_job_id: str) -> List[dict]:
+        """父任务下各子任务的状态与进度（按创建顺序）"""
+        with SessionLocal() as session:
+            rows = session.query(JobORM).filter(JobORM.parent_job_id == parent_job_id).order_by(JobORM.id).all()
+            return [{
+                'job_id': j.job_id,
+                'eval_set_id': j.eval_set_id,
+                'status': j.status,
+                'processed': j.processed or 0,
+                'total': j.total or 0,
+                'error': j.error,
+                'options': json.loads(j.options) if j.options else None,
+                'result': json.loads(j.result) if j.result else None,
+            } for j in rows]
+
+
+job_service = JobService()
@@ -0,0 +1,165 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, case
+from sqlalchemy.exc import IntegrityError
+from db.models import (EvalResultSummary as EvalResultSummaryORM, EvalResultScoreHist as EvalResultScoreHistORM,
+                       EvalResult as EvalResultORM, EvalData as EvalDataORM)
+from models.eval_result import EvalResultSummary
+from db.sqlalchemy import session_scope, read_session_scope
+
+from utils.log import get_logger
+
+logger = get_logger("result_summary_service")
+
+
+def intent_matches(actual: Optional[str], expected: Optional[str]) -> bool:
+    """实际意图与预期意图（去除首尾空白后）一致；未配置预期意图时视为不匹配"""
+    expected = (expected or '').strip()
+    return bool(expected) and (actual or '').strip() == expected
+
+
+class ResultSummaryService:
+    """维护 eval_result_summary：每写入/删除一条结果，在同一事务内增量更新对应 (eval_set_id, agent_version, run_id) 行。
+
+    计数列与分数直方图（eval_result_score_hist，每个分数一行）都用 UPDATE ... SET col = col + n 原子增减，
+    不先 SELECT ... FOR UPDATE 读出整行再写回，热点汇总行上的锁只在这一条 UPDATE 到提交之间持有。
+    """
+
+    def _increment(self, session, model, key: Dict[str, Any], deltas: Dict[str, int]) -> None:
+        """对 key 对应的行原子累加 deltas；行不存在时以 deltas 为初值插入"""
+        q = session.query(model).filter_by(**key)
+        values = {getattr(model, c): getattr(model, c) + d for c, d in deltas.items()}
+        if q.update(values, synchronize_session=False):
+            return
+        row = model(**key, **deltas)
+        if session.bind.dialect.name == 'sqlite':
+            # sqlite 写入本身串行，无需 savepoint 处理并发插入
+            session.add(row)
+            session.flush()
+            return
+        try:
+            # 并发的第一次写入可能撞上唯一键，使用 savepoint 隔离后改为累加
+            with session.begin_nested():
+                session.add(row)
+        except IntegrityError:
+            logger.debug(f"{model.__tablename__} row {key} created concurrently")
+            q.update(values, synchronize_session=False)
+
+    def apply(self, session, eval_set_id: int, agent_version: Optional[str], run_id: Optional[str],
+              score: Optional[int], kdb: int, intent_match: bool, sign: int = 1) -> None:
+        """在调用方事务内将一条结果计入（sign=1）或移出（sign=-1）汇总，由调用方提交"""
+        key = {'eval_set_id': eval_set_id, 'agent_version': agent_version or '', 'run_id': run_id or ''}
+        scored = score is not None
+        self._increment(session, EvalResultSummaryORM, key, {
+            'count': sign,
+            'scored_count': sign if scored else 0,
+            'score_sum': sign * int(score) if scored else 0,
+            'kdb_hits': sign if kdb else 0,
+            'intent_matches': sign if intent_match else 0,
+        })
+        if scored:
+            self._increment(session, EvalResultScoreHistORM, dict(key, score=int(score)), {'count': sign})
+
+    def list_by_eval_set(self, eval_set_id: int) -> List[EvalResultSummary]:
+        logger.info(f"list_by_eval_set called for set={eval_set_id}")
+        with read_session_scope() as session:
+            rows = session.query(EvalResultSummaryORM).filter(
+                EvalResultSummaryORM.eval_set_id == eval_set_id,
+                EvalResultSummaryORM.count > 0,
+            ).order_by(EvalResultSummaryORM.updated_at.desc(), EvalResultSummaryORM.id.desc()).all()
+            hists = {}
+            for h in session.query(EvalResultScoreHistORM).filter(EvalResultScoreHistORM.eval_set_id == eval_set_id,
+                                                                  EvalResultScoreHistORM.count > 0):
+                hists.setdefault((h.agent_version, h.run_id), {})[h.score] = h.count
+            logger.info(f"list_by_eval_set: found {len(rows)} summary rows for set={eval_set_id}")
+            return [self._to_model(r, hists.get((r.agent_version, r.run_id), {})) for r in rows]
+
+    def rebuild(self, eval_set_id: int) -> int:
+        """根据 eval_results 全量重建某评测集的汇总（用于历史数据或修复偏差），返回汇总行数"""
+        logger.info(f"rebuild called for set={eval_set_id}")
+        version = func.coalesce(EvalResultORM.agent_version, '')
+        run = func.coalesce(EvalResultORM.run_id, '')
+        matched = case(
+            ((func.trim(func.coalesce(EvalDataORM.intent, '')) != '')
+             & (func.trim(func.coalesce(EvalResultORM.actual_intent, '')) == func.trim(EvalDataORM.intent)), 1),
+            else_=0,
+        )
+        with session_scope() as session:
+            join_on = (EvalDataORM.eval_set_id == EvalResultORM.eval_set_id) & (EvalDataORM.corpus_id == EvalResultORM.eval_data_id)
+            live = (EvalResultORM.eval_set_id == eval_set_id) & (EvalResultORM.deleted == False)
+            totals = session.query(
+                version, run,
+                func.count(EvalResultORM.id),
+                func.count(EvalResultORM.score),
+                func.coalesce(func.sum(EvalResultORM.score), 0),
+                func.coalesce(func.sum(EvalResultORM.kdb), 0),
+                func.coalesce(func.sum(matched), 0),
+            ).select_from(EvalResultORM).outerjoin(EvalDataORM, join_on).filter(live).group_by(version, run).all()
+            hists = {}
+            for v, r, score, cnt in session.query(version, run, EvalResultORM.score, func.count(EvalResultORM.id)).filter(
+                live, EvalResultORM.score.isnot(None)
+            ).group_by(version, run, EvalResultORM.score).all():
+                hists.setdefault((v, r), {})[int(score)] = int(cnt)
+            totals = self._add_archived(session, eval_set_id, totals, hists)
+
+            session.query(EvalResultSummaryORM).filter(EvalResultSummaryORM.eval_set_id == eval_set_id).delete(synchronize_session=False)
+            session.query(EvalResultScoreHistORM).filter(EvalResultScoreHistORM.eval_set_id == eval_set_id).delete(synchronize_session=False)
+            for v, r, cnt, scored, ssum, kdb_hits, matches in totals:
+                session.add(EvalResultSummaryORM(
+                    eval_set_id=eval_set_id, agent_version=v, run_id=r,
+                    count=int(cnt), scored_count=int(scored), score_sum=int(ssum),
+                    kdb_hits=int(kdb_hits), intent_matches=int(matches),
+                ))
+                session.add_all(EvalResultScoreHistORM(eval_set_id=eval_set_id, agent_version=v, run_id=r, score=score, count=n)
+                                for score, n in hists.get((v, r), {}).items())
+            session.commit()
+            logger.info(f"rebuild: wrote {len(totals)} summary rows for set={eval_set_id}")
+            return len(totals)
+
+    def _add_archived(self, session, eval_set_id: int, totals, hists):
+        """归档到 Parquet 的结果同样计入汇总（仍在库中的 id 不重复计算）"""
+        from services.archive_service import result_archive_service
+        if not result_archive_service.has_archive(eval_set_id):
+            return totals
+        live_ids = np.array([r[0] for r in session.query(EvalResultORM.id).filter(
+            EvalResultORM.eval_set_id == eval_set_id).all()], dtype=np.int64)
+        table = result_archive_service.read(eval_set_id, columns=['agent_version', 'run_id', 'score', 'kdb',
+                                                                  'actual_intent', 'expected_intent'],
+                                            exclude_ids=live_ids)
+        if table is None or table.num_rows == 0:
+            return totals
+        merged = {(v, r): list(rest) for v, r, *rest in totals}
+        for row in table.to_pylist():
+            key = (row['agent_version'] or '', row['run_id'] or '')
+            acc = merged.setdefault(key, [0, 0, 0, 0, 0])
+            acc[0] += 1
+            if row['score'] is not None:
+                acc[1] += 1
+                acc[2] += int(row['score'])
+                h = hists.setdefault(key, {})
+                h[int(row['score'])] = h.get(int(row['score']), 0) + 1
+            acc[3] += 1 if row['kdb'] else 0
+            acc[4] += 1 if intent_matches(row['actual_intent'], row['expected_intent']) else 0
+        logger.info(f"rebuild: included {table.num_rows} archived rows for set={eval_set_id}")
+        return [(v, r, *acc) for (v, r), acc in merged.items()]
+
+    def _to_model(self, r: EvalResultSummaryORM, score_hist: Dict[int, int]) -> EvalResultSummary:
+        count = r.count or 0
+        return EvalResultSummary(
+            eval_set_id=r.eval_set_id,
+            agent_version=r.agent_version,
+            run_id=r.run_id,
+            count=count,
+            scored_count=r.scored_count,
+            score_sum=r.score_sum,
+            mean_score=(r.score_sum / r.scored_count) if r.scored_count else None,
+            score_hist=score_hist,
+            kdb_hits=r.kdb_hits,
+            kdb_rate=(r.kdb_hits / count) if count else 0.0,
+            intent_matches=r.intent_matches,
+            intent_match_rate=(r.intent_matches / count) if count else 0.0,
+            updated_at=r.updated_at,
+        )
+
+
+result_summary_service = ResultSummaryService()
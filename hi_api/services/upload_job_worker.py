@@ -1,19 +1,137 @@
-from db.sqlalchemy import SessionLocal, engine
+import os
+import time
+import queue
+import hashlib
+import tempfile
+import threading
+import json
+from typing import Dict, Iterator, List, Sequence
+from db.sqlalchemy import SessionLocal, engine, write_step
 from db.models import Job as JobORM, EvalData as EvalDataORM
 from services.eval_set_service import eval_set_service
-import openpyxl
-from sqlalchemy import insert
-from models.eval_data import EvalDataCreate
+from services.job_service import job_service
+from services.import_readers import open_source
+from services.eval_data_service import eval_data_service, content_hash, normalize_value
+from services.native_loader import native_loader_for
+from sqlalchemy import insert, select, update
 from utils.log import get_logger
-from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+import uuid
 
 logger = get_logger("upload_job_worker")
 
 BATCH_SIZE = 500
+# row_hash 唯一键冲突（并发导入写入了相同内容）时重新查重再写的次数
+CONFLICT_RETRIES = 2
+# 导入模式：append 追加全部行；skip 跳过内容已存在的行；upsert 内容已存在时更新 expected/intent
+IMPORT_MODES = ('append', 'skip', 'upsert')
+# 解析线程与写库线程之间最多缓冲的批次数（限制内存占用）
+UPLOAD_QUEUE_BATCHES = int(os.getenv('UPLOAD_QUEUE_BATCHES', '4'))
+# 导入进度写入 jobs 表的最小间隔（秒）
+PROGRESS_INTERVAL_SECONDS = 0.5
+# 调试开关：每批插入后对评测集做一次全量 COUNT 核对（O(n²)，生产环境不要开启）
+UPLOAD_VERIFY_COUNTS = os.getenv('UPLOAD_VERIFY_COUNTS', '0') in ('1', 'true', 'True')
+# 上传文件的临时目录；导入成功后删除文件，失败时保留供排查，由 cleanup_service 定期回收
+UPLOAD_TMP_DIR = os.getenv('UPLOAD_TMP_DIR', os.path.join(tempfile.gettempdir(), 'hi_api_uploads'))
+# 单个上传文件的大小上限与落盘时每次读写的块大小（字节）
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+def save_upload(src, filename: str, max_bytes: int = UPLOAD_MAX_BYTES):
+    """把上传流按固定块写入 UPLOAD_TMP_DIR，边写边计算 SHA-256 并检查大小上限，内存中最多只有一个块。
+
+    返回 (path, size, sha256_hex)；超过上限时删除已写入的部分并抛出 UploadTooLargeError。
+    """
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_TMP_DIR, f"upload_{uuid.uuid4().hex}_{os.path.basename(filename or 'file')}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"file exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    logger.info(f"save_upload: wrote {size} bytes to {path} sha256={digest.hexdigest()}")
+    return path, size, digest.hexdigest()
+
+
+def _is_empty(content) -> bool:
+    # treat numeric 0 as valid content; skip only None or whitespace-only strings
+    return content is None or (isinstance(content, str) and content.strip() == '')
+
+
+def _produce_batches(rows: Iterator[tuple], eval_set_id: int, out: queue.Queue,
+                     stop: threading.Event, stats: dict) -> None:
+    """生产者：解析行并按 BATCH_SIZE 打包放入有界队列；结束时放入 None，出错时放入异常。
+
+    corpus_id 由写库线程在确定插入时分配（去重模式下被跳过的行不占用序号）。
+    """
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        batch = []
+        for content, expected, intent in rows:
+            if _is_empty(content):
+                stats['empty'] += 1
+                continue
+            batch.append({
+                'eval_set_id': eval_set_id,
+                'content': str(content),
+                'expected': str(expected) if expected is not None else None,
+                'intent': str(intent) if intent is not None else None,
+                'deleted': False
+            })
+            if len(batch) >= BATCH_SIZE:
+                if not put(batch):
+                    return
+                batch = []
+        if batch and not put(batch):
+            return
+        put(None)
+    except BaseException as e:
+        put(e)
+
+
+def _verify_count(eval_set_id: int, label: str) -> None:
+    """调试用：统计评测集当前行数（每次都是全表 COUNT，仅在 UPLOAD_VERIFY_COUNTS 开启时调用）"""
+    try:
+        with SessionLocal() as scheck:
+            cnt = scheck.query(EvalDataORM).filter(EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False).count()
+            logger.info(f"{label}: eval_data rows for set {eval_set_id} = {cnt}")
+    except Exception as e:
+        logger.warning(f"{label} count check failed: {e}")
 
 
 def process_upload_job(job_id: str):
+    """单遍流式导入：生产者线程解析文件并打包，当前线程从有界队列取批次插入，解析与写库重叠进行。
+
+    文件格式（xlsx/xls/CSV/TSV/JSONL）由 import_readers 识别；total 先按读取器的估算上报，导入结束时更新为实际导入行数。
+    """
     logger.info(f"process_upload_job started for job={job_id}")
     with SessionLocal() as session:
         job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
@@ -25,170 +143,210 @@ def process_upload_job(job_id: str):
         except Exception:
             logger.info("DB engine url: <unavailable>")
         logger.info(f"upload job details: eval_set_id={job.eval_set_id}, file_path={job.file_path}")
-        # mark running
-        job.status = 'running'
-        job.started_at = datetime.utcnow()
-        session.add(job)
-        session.commit()
+        eval_set_id = job.eval_set_id
         file_path = job.file_path
+        options = json.loads(job.options) if job.options else {}
+        mode = options.get('mode', 'append')
+        # 批量导入按工作表拆出的子任务：只读取指定工作表，文件由父任务统一删除
+        sheet = options.get('sheet')
+    job_service.update(job_id, status='running', started=True)
 
+    stop = threading.Event()
+    producer = None
+    source = None
     try:
-        wb = openpyxl.load_workbook(file_path, read_only=True)
-        ws = wb.active
-        rows_iter = ws.iter_rows(values_only=True)
-        # skip header
-        try:
-            header = next(rows_iter)
-        except StopIteration:
-            header = None
-        batch = []
-        total = 0
+        source = open_source(file_path, sheet=sheet)
+        total_estimate = source.estimate_total()
+        job_service.update(job_id, total=total_estimate)
+        if mode != 'append':
+            # 去重依赖已有语料的 row_hash，先补齐导入/编辑后尚未计算哈希的行
+            eval_data_service.backfill_row_hashes(eval_set_id)
+        batches: queue.Queue = queue.Queue(maxsize=UPLOAD_QUEUE_BATCHES)
+        stats = {'empty': 0}
+        producer = threading.Thread(target=_produce_batches, name=f"upload-parse-{job_id[:8]}",
+                                    args=(source.rows(), eval_set_id, batches, stop, stats), daemon=True)
+        producer.start()
+
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        # 可选的原生批量装载（UPLOAD_NATIVE_LOADER=1），失败时回退到分批插入
+        loader = native_loader_for(eval_set_id, lambda rows: _insert_in_batches(rows, eval_set_id, mode, counts))
         processed = 0
-        skipped = 0
-        # compute starting corpus_id for this eval_set (max existing corpus_id)
-        try:
-            with SessionLocal() as s2:
-                max_row = s2.query(EvalDataORM).filter(EvalDataORM.eval_set_id == job.eval_set_id).order_by(EvalDataORM.corpus_id.desc()).with_entities(EvalDataORM.corpus_id).first()
-                start_corpus = int(max_row[0]) if (max_row and max_row[0] is not None) else 0
-        except Exception:
-            start_corpus = 0
-        # Two-pass approach: first count non-empty rows to get an accurate total, then re-iterate to insert.
-        # First pass: count non-empty rows (skip header)
-        total_expected = 0
-        try:
-            count_iter = ws.iter_rows(values_only=True)
-            _ = next(count_iter, None)
-            for crow in count_iter:
-                ccontent = crow[0] if len(crow) > 0 else None
-                if ccontent is None or (isinstance(ccontent, str) and ccontent.strip() == ''):
-                    continue
-                total_expected += 1
-        except Exception as e:
-            logger.warning(f"failed to compute total_expected by scanning rows: {e}")
-
-        # persist total_expected to job record so frontend sees a stable total
-        try:
-            with SessionLocal() as s_tot:
-                j = s_tot.query(JobORM).filter(JobORM.job_id == job_id).first()
-                if j:
-                    j.total = total_expected
-                    s_tot.add(j)
-                    s_tot.commit()
-        except Exception as e:
-            logger.warning(f"failed to persist total_expected for job {job_id}: {e}")
-
-        # Recreate iterator for insertion pass and skip header
-        rows_iter = ws.iter_rows(values_only=True)
-        try:
-            _ = next(rows_iter)
-        except StopIteration:
-            rows_iter = iter(())
-
-        # Use total_expected as the stable total for progress updates
-        total = total_expected
-        for row in rows_iter:
-            content = row[0] if len(row) > 0 else None
-            # treat numeric 0 as valid content; skip only None or whitespace-only strings
-            if content is None or (isinstance(content, str) and content.strip() == ''):
-                skipped += 1
-                logger.debug(f"skipping empty row (content={repr(content)}), skipped_count={skipped}")
-                continue
-            # we already counted non-empty rows in total_expected
-            expected = row[1] if len(row) > 1 else None
-            intent = row[2] if len(row) > 2 else None
-            # assign corpus_id sequentially
-            start_corpus += 1
-            batch.append({
-                'eval_set_id': job.eval_set_id,
-                'corpus_id': start_corpus,
-                'content': str(content),
-                'expected': str(expected) if expected is not None else None,
-                'intent': str(intent) if intent is not None else None,
-                'deleted': False
-            })
-            if len(batch) >= BATCH_SIZE:
-                logger.info(f"inserting batch of size={len(batch)} for job={job_id}")
-                _bulk_insert_batch(batch)
-                processed += len(batch)
-                batch = []
-                _update_job_progress(job_id, processed, total_expected)
-                # quick verification: count rows in DB for this eval_set_id
-                try:
-                    with SessionLocal() as scheck:
-                        cnt = scheck.query(EvalDataORM).filter(EvalDataORM.eval_set_id == job.eval_set_id, EvalDataORM.deleted == False).count()
-                        logger.info(f"post-insert check: eval_data rows for set {job.eval_set_id} = {cnt}")
-                except Exception as e:
-                    logger.warning(f"post-insert count check failed: {e}")
-        # final batch
-        if batch:
-            logger.info(f"inserting final batch of size={len(batch)} for job={job_id}")
-            _bulk_insert_batch(batch)
+        last_progress = 0.0
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            logger.info(f"writing batch of size={len(batch)} for job={job_id} mode={mode}")
+            _write_batch(batch, eval_set_id, mode, counts, loader)
             processed += len(batch)
-            _update_job_progress(job_id, processed, total_expected)
-            try:
-                with SessionLocal() as scheck:
-                    cnt = scheck.query(EvalDataORM).filter(EvalDataORM.eval_set_id == job.eval_set_id, EvalDataORM.deleted == False).count()
-                    logger.info(f"post-final-insert check: eval_data rows for set {job.eval_set_id} = {cnt}")
-            except Exception as e:
-                logger.warning(f"post-final-insert count check failed: {e}")
-
-        logger.info(f"upload summary for job={job_id}: processed={processed}, total={total}, skipped={skipped}")
+            # 估算偏小时随进度上调，避免进度超过 100%
+            total_estimate = max(total_estimate, processed)
+            # 进度最多每 PROGRESS_INTERVAL_SECONDS 写一次，快速格式下避免每批都提交一次 jobs 更新
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                job_service.update(job_id, processed=processed, total=total_estimate)
+                last_progress = now
+            if UPLOAD_VERIFY_COUNTS:
+                _verify_count(eval_set_id, "post-insert check")
+        producer.join()
+        if loader is not None:
+            loader.flush()
+            counts['inserted'] += loader.loaded
+        if UPLOAD_VERIFY_COUNTS:
+            _verify_count(eval_set_id, "post-final-insert check")
 
-        # final refresh count
-        try:
-            eval_set_service.refresh_count(job.eval_set_id)
-        except Exception as e:
-            logger.warning(f"refresh_count failed after job {job_id}: {e}")
-
-        with SessionLocal() as session:
-            job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
-            job.status = 'success'
-            job.processed = processed
-            job.total = total
-            job.finished_at = datetime.utcnow()
-            session.add(job)
-            session.commit()
+        result = dict(counts, mode=mode, empty=stats['empty'], format=source.format,
+                      loader=loader.mode if loader is not None else 'batched')
+        logger.info(f"upload summary for job={job_id}: processed={processed}, estimated={total_estimate}, {result}")
+        job_service.update(job_id, status='success', processed=processed, total=processed, result=result, finished=True)
         logger.info(f"process_upload_job finished for job={job_id}, processed={processed}")
+        try:
+            source.close()
+            if sheet is None:
+                os.remove(file_path)
+        except OSError as e:
+            logger.warning(f"failed to remove upload file {file_path}: {e}")
     except Exception as e:
+        stop.set()
+        if producer is not None:
+            producer.join(timeout=5)
+        if source is not None:
+            source.close()
         logger.exception(f"process_upload_job failed for job={job_id}: {e}")
-        with SessionLocal() as session:
-            job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
-            if job:
-                job.status = 'failed'
-                job.error = str(e)
-                job.finished_at = datetime.utcnow()
-                session.add(job)
+        job_service.update(job_id, status='failed', error=str(e), finished=True)
+
+
+def _write_batch(batch: List[dict], eval_set_id: int, mode: str, counts: Dict[str, int], loader=None) -> None:
+    """按导入模式写入一批行，累加 counts 中的 inserted/updated/skipped。
+
+    待插入行的 corpus_id 每批向 eval_set.max_corpus_id 申请一次（单独提交），同一评测集上并发的导入与新增不会拿到重复的序号。
+
+    给出 loader（NativeLoader）时，待插入行交给 loader 攒批装载，inserted 在装载或回退写入后才计数；尚未装载的行同样参与查重。
+
+    - append：全部插入；每种内容只有最早的一行带 row_hash（唯一键），其余为空。
+    - skip：规范化内容已存在（库中或本次导入中更早的行）时跳过。
+    - upsert：内容已存在时，expected/intent（规范化后比较）不同则更新，相同则跳过。
+
+    查重与写入之间并发的导入可能写入相同内容，插入时 row_hash 唯一键冲突：整批回滚后重新查重再写，
+    冲突的行按模式变为不带 row_hash 的插入（append）、跳过（skip）或更新（upsert）。
+    """
+    for attempt in range(CONFLICT_RETRIES + 1):
+        planned = {'updated': 0, 'skipped': 0}
+        inserts, updates = _plan_batch(batch, eval_set_id, mode, planned, loader)
+        if inserts:
+            with SessionLocal() as session:
+                next_corpus = eval_set_service.allocate_corpus_ids(session, eval_set_id, len(inserts))
                 session.commit()
+            for row in inserts:
+                row['corpus_id'] = next_corpus
+                next_corpus += 1
+        if loader is not None:
+            # 只写更新（按主键，不会触发 row_hash 冲突）；插入交给 loader
+            if updates:
+                _bulk_insert_batch([], eval_set_id, updates)
+            loader.add(inserts)
+        elif inserts or updates:
+            try:
+                _bulk_insert_batch(inserts, eval_set_id, updates)
+            except IntegrityError as e:
+                if attempt == CONFLICT_RETRIES:
+                    raise
+                logger.warning(f"row_hash conflict while writing batch for set={eval_set_id} ({e.orig}); re-checking duplicates")
+                continue
+            counts['inserted'] += len(inserts)
+        counts['updated'] += planned['updated']
+        counts['skipped'] += planned['skipped']
+        return
 
 
-def _bulk_insert_batch(batch):
-    # Use SQLAlchemy core bulk insert for speed
+def _plan_batch(batch: List[dict], eval_set_id: int, mode: str, planned: Dict[str, int], loader=None):
+    """按库中已有语料与本次导入中更早的行查重，返回 (待插入行, 按主键更新的参数)，updated/skipped 计入 planned"""
+    hashes = [content_hash(r['content']) for r in batch]
     with SessionLocal() as session:
+        existing = {h: [rid, exp, intent] for h, rid, exp, intent in session.execute(
+            select(EvalDataORM.row_hash, EvalDataORM.id, EvalDataORM.expected, EvalDataORM.intent).where(
+                EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.row_hash.in_(set(hashes)))).all()}
+    inserts: List[dict] = []
+    pending: Dict[str, dict] = loader.pending if loader is not None else {}
+    updates: Dict[int, dict] = {}
+    for row, h in zip(batch, hashes):
+        if mode == 'append':
+            row['row_hash'] = None if (h in existing or h in pending) else h
+            if row['row_hash']:
+                pending[h] = row
+            inserts.append(row)
+            continue
+        values = (normalize_value(row['expected']), normalize_value(row['intent']))
+        if h in pending:
+            target = pending[h]
+            if mode == 'upsert' and values != (normalize_value(target['expected']), normalize_value(target['intent'])):
+                target['expected'], target['intent'] = row['expected'], row['intent']
+                planned['updated'] += 1
+            else:
+                planned['skipped'] += 1
+        elif h in existing:
+            rid, exp, intent = existing[h]
+            if mode == 'upsert' and values != (normalize_value(exp), normalize_value(intent)):
+                updates[rid] = {'id': rid, 'expected': row['expected'], 'intent': row['intent']}
+                existing[h][1:] = [row['expected'], row['intent']]
+                planned['updated'] += 1
+            else:
+                planned['skipped'] += 1
+        else:
+            row['row_hash'] = h
+            pending[h] = row
+            inserts.append(row)
+    return inserts, list(updates.values())
+
+
+def _insert_in_batches(rows: List[dict], eval_set_id: int, mode: str = 'append', counts: Dict[str, int] = None) -> None:
+    """loader 的回退写入：按 BATCH_SIZE 插入已查重、已分配 corpus_id 的行，实际插入行数计入 counts['inserted']。
+
+    row_hash 冲突（攒批期间并发的导入写入了相同内容）的批次交给 _write_batch 重新查重后写入。
+    """
+    counts = counts if counts is not None else {'inserted': 0, 'updated': 0, 'skipped': 0}
+    for i in range(0, len(rows), BATCH_SIZE):
+        chunk = rows[i:i + BATCH_SIZE]
         try:
-            # use the ORM table metadata explicitly to ensure insert targets the correct table
-            session.execute(insert(EvalDataORM.__table__), batch)
-            session.commit()
+            _bulk_insert_batch(chunk, eval_set_id)
+        except IntegrityError as e:
+            logger.warning(f"row_hash conflict in fallback insert for set={eval_set_id} ({e.orig}); re-checking duplicates")
+            _write_batch(chunk, eval_set_id, mode, counts)
+            continue
+        counts['inserted'] += len(chunk)
+
+
+def _bulk_insert_batch(batch, eval_set_id: int, updates: Sequence[dict] = ()) -> None:
+    """在一个事务内插入一批行、按主键更新并调整 count；失败时回滚并抛出异常，调用方据此如实计数或让任务失败。
+
+    row_hash 唯一键冲突（IntegrityError）直接抛出，逐行重试只会再次冲突，由调用方重新查重；
+    其他数据库错误先逐行重试一次。
+    """
+    # Use SQLAlchemy core bulk insert for speed; the eval_set count is bumped in the same transaction
+    with SessionLocal() as session:
+        try:
+            with write_step(session):
+                # use the ORM table metadata explicitly to ensure insert targets the correct table
+                if batch:
+                    session.execute(insert(EvalDataORM.__table__), batch)
+                if updates:
+                    # 按主键批量更新（upsert 模式）
+                    session.execute(update(EvalDataORM), list(updates))
+                eval_set_service.adjust_count(session, eval_set_id, len(batch))
+                session.commit()
+        except IntegrityError:
+            raise
         except SQLAlchemyError as e:
-            session.rollback()
             # Bulk insert failed — log and attempt a safer per-row fallback to avoid losing data
             logger.exception(f"bulk insert failed: {e}; batch_size={len(batch)}. Attempting per-row fallback.")
-            try:
+            with write_step(session):
                 for row in batch:
                     obj = EvalDataORM(**row)
                     session.add(obj)
+                for params in updates:
+                    session.merge(EvalDataORM(**params))
+                eval_set_service.adjust_count(session, eval_set_id, len(batch))
                 session.commit()
-                logger.info(f"per-row fallback succeeded, inserted {len(batch)} rows")
-            except Exception as e2:
-                session.rollback()
-                logger.exception(f"per-row fallback insert failed: {e2}; batch_size={len(batch)}")
-
-
-def _update_job_progress(job_id: str, processed: int, total: int):
-    with SessionLocal() as session:
-        job = session.query(JobORM).filter(JobORM.job_id == job_id).first()
-        if not job:
-            return
-        job.processed = processed
-        job.total = total
-        session.add(job)
-        session.commit()
+            logger.info(f"per-row fallback succeeded, inserted {len(batch)} rows")
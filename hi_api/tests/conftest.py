@@ -0,0 +1,40 @@
+"""测试使用临时目录中的 SQLite 文件库与归档/导出目录：环境变量须在首次导入 db.sqlalchemy 与各服务之前设置"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix='hi_api_test_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ['RESULT_ARCHIVE_DIR'] = os.path.join(_DB_DIR, 'archive')
+os.environ['EXPORT_DIR'] = os.path.join(_DB_DIR, 'exports')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.sqlalchemy import SessionLocal, init_schema  # noqa: E402
+
+init_schema()
+
+
+@pytest.fixture
+def eval_set_id() -> int:
+    """每个用例一个新评测集，用例之间互不影响"""
+    from models.eval_set import EvalSetCreate
+    from services.eval_set_service import eval_set_service
+    return eval_set_service.create_eval_set(EvalSetCreate(name=f"test-{uuid.uuid4().hex[:8]}")).id
+
+
+@pytest.fixture
+def set_rows():
+    """返回函数：读取评测集当前未删除的语料 (corpus_id, content, expected, intent)，按 corpus_id 排序"""
+    from db.models import EvalData as EvalDataORM
+
+    def read(eval_set_id: int):
+        with SessionLocal() as session:
+            return [tuple(r) for r in session.query(
+                EvalDataORM.corpus_id, EvalDataORM.content, EvalDataORM.expected, EvalDataORM.intent).filter(
+                EvalDataORM.eval_set_id == eval_set_id, EvalDataORM.deleted == False).order_by(  # noqa: E712
+                EvalDataORM.corpus_id).all()]
+    return read
@@ -0,0 +1,69 @@
+"""语料分页的展示序号：按 (corpus_id, id) 在所属评测集内连续编号，删除留下的 corpus_id 空洞不影响序号"""
+
+import pytest
+from sqlalchemy import func
+
+from db.sqlalchemy import SessionLocal
+from db.models import EvalData as EvalDataORM
+from models.eval_data import EvalDataBulkItem
+from models.eval_set import EvalSetCreate
+from services.eval_data_service import eval_data_service
+from services.eval_set_service import eval_set_service
+
+
+def _expected_ranks() -> dict:
+    """用窗口函数对全表编号，作为对照"""
+    with SessionLocal() as session:
+        return dict(session.query(
+            EvalDataORM.id,
+            func.row_number().over(partition_by=EvalDataORM.eval_set_id,
+                                   order_by=(EvalDataORM.corpus_id, EvalDataORM.id)),
+        ).filter(EvalDataORM.deleted == False).all())  # noqa: E712
+
+
+@pytest.fixture(scope='module')
+def two_sets():
+    ids = [eval_set_service.create_eval_set(EvalSetCreate(name=name)).id for name in ('listing-a', 'listing-b')]
+    created = {sid: [] for sid in ids}
+    # 两个评测集交替写入，主键顺序与 (eval_set_id, corpus_id) 顺序不同
+    for sid, start, n in ((ids[0], 0, 6), (ids[1], 0, 12), (ids[0], 6, 6)):
+        name = 'listing-a' if sid == ids[0] else 'listing-b'
+        created[sid] += eval_data_service.bulk_create(sid, [
+            EvalDataBulkItem(content=f"{name} {'match' if i % 3 == 0 else 'other'} {i}") for i in range(start, start + n)])
+    # 删除几行，留下 corpus_id 空洞
+    for sid in ids:
+        eval_data_service.bulk_delete(sid, [r.id for r in created[sid][1:8:3]])
+    return ids
+
+
+def _pages(fetch, page_size: int = 5):
+    items, page = [], 1
+    while True:
+        chunk, total = fetch(page, page_size)
+        items.extend(chunk)
+        if page * page_size >= total:
+            return items, total
+        page += 1
+
+
+@pytest.mark.parametrize('q', [None, 'match'])
+def test_set_listing_numbers_rows_within_the_set(two_sets, q):
+    sid = two_sets[0]
+    items, total = _pages(lambda p, n: eval_data_service.list_by_eval_set_paginated(sid, page=p, page_size=n, q=q))
+    expected = _expected_ranks()
+    assert total == len(items) == (9 if q is None else 4)
+    assert [i.corpus_id for i in items] == sorted(i.corpus_id for i in items)
+    assert all(i.display_index == expected[i.id] for i in items)
+
+
+@pytest.mark.parametrize('q', [None, 'match'])
+def test_global_listing_numbers_rows_per_set(two_sets, q):
+    items, total = _pages(lambda p, n: eval_data_service.list_all_search_paginated(q=q, page=p, page_size=n))
+    expected = _expected_ranks()
+    assert total == len(items)
+    keys = [(i.eval_set_id, i.corpus_id, i.id) for i in items]
+    # 分页顺序与编号使用同一排序键
+    assert keys == sorted(keys)
+    assert all(i.display_index == expected[i.id] for i in items)
+    mine = [i for i in items if i.eval_set_id in two_sets]
+    assert len(mine) == (18 if q is None else 8)
@@ -0,0 +1,53 @@
+"""评测集 count 对账：一条相关子查询 UPDATE 按实际语料数量修正偏差，只修正有偏差的评测集"""
+
+from sqlalchemy import event
+
+from db.sqlalchemy import SessionLocal, engine
+from db.models import EvalSet as EvalSetORM
+from models.eval_data import EvalDataBulkItem
+from models.eval_set import EvalSetCreate
+from services.eval_data_service import eval_data_service
+from services.eval_set_service import eval_set_service
+
+
+def _set_count(eval_set_id: int, count: int) -> None:
+    with SessionLocal() as session:
+        session.query(EvalSetORM).filter(EvalSetORM.id == eval_set_id).update({EvalSetORM.count: count})
+        session.commit()
+
+
+def _statements(fn):
+    """执行 fn，返回 (结果, 期间发往数据库的 SQL)"""
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return result, seen
+
+
+def test_reconcile_fixes_only_drifted_sets(eval_set_id):
+    eval_data_service.bulk_create(eval_set_id, [EvalDataBulkItem(content=f"q{i}") for i in range(3)])
+    other = eval_set_service.create_eval_set(EvalSetCreate(name='reconcile-other')).id
+    eval_set_service.reconcile_counts()
+    _set_count(eval_set_id, 7)
+    assert eval_set_service.get_eval_set(eval_set_id).count == 7
+
+    fixed, statements = _statements(eval_set_service.reconcile_counts)
+    assert fixed == 1
+    # 读取实际数量与写回在同一条 UPDATE 中，没有先读后写的 SELECT
+    assert [s.split()[0] for s in statements if 'eval_data' in s] == ['UPDATE']
+    assert eval_set_service.get_eval_set(eval_set_id).count == 3
+    assert eval_set_service.get_eval_set(other).count == 0
+    assert eval_set_service.reconcile_counts() == 0
+
+
+def test_refresh_count_recounts_one_set(eval_set_id):
+    eval_data_service.bulk_create(eval_set_id, [EvalDataBulkItem(content=f"q{i}") for i in range(2)])
+    _set_count(eval_set_id, -5)
+    assert eval_set_service.refresh_count(eval_set_id) == 2
+    assert eval_set_service.get_eval_set(eval_set_id).count == 2
@@ -0,0 +1,78 @@
+"""结果导出合并归档结果：逐批流式读取归档，库中仍存在的 id 与重复归档的 id 只导出一次"""
+
+import glob
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.sqlalchemy import SessionLocal
+from db.models import EvalResult as EvalResultORM
+from models.eval_data import EvalDataBulkItem
+from services.archive_service import result_archive_service
+from services.eval_data_service import eval_data_service
+from services.export_service import RESULT_COLUMNS, export_service
+import services.export_service
+
+
+def _add_results(eval_set_id: int, n: int, days_ago: int) -> list:
+    with SessionLocal() as session:
+        rows = [EvalResultORM(eval_set_id=eval_set_id, eval_data_id=i % 3 + 1, actual_result=f"answer {i}", score=i,
+                              agent_version='v1', exec_time=datetime.utcnow() - timedelta(days=days_ago))
+                for i in range(n)]
+        session.add_all(rows)
+        session.commit()
+        return [r.id for r in rows]
+
+
+@pytest.fixture
+def archived_set(eval_set_id, monkeypatch):
+    eval_data_service.bulk_create(eval_set_id, [EvalDataBulkItem(content=f"q{i}", expected=f"e{i}") for i in range(3)])
+    old = _add_results(eval_set_id, 25, days_ago=30)
+    # 近期结果先于归档写入：SQLite 表清空后会复用 id
+    recent = _add_results(eval_set_id, 4, days_ago=0)
+    result_archive_service.archive(retention_days=7, eval_set_id=eval_set_id)
+    # 小批量，确保归档部分跨多个批次；整体读入的 read() 不应被导出使用
+    monkeypatch.setattr(services.export_service, 'EXPORT_CHUNK', 7)
+
+    def whole_table(*args, **kwargs):
+        raise AssertionError('export must stream the archive')
+    monkeypatch.setattr(result_archive_service, 'read', whole_table)
+    return eval_set_id, old, recent
+
+
+def _export(eval_set_id: int, **kwargs):
+    rows = [row for part in export_service.iter_rows('results', eval_set_id, **kwargs) for row in part]
+    assert export_service.count('results', eval_set_id, **kwargs) == len(rows)
+    return rows
+
+
+def test_export_streams_archived_then_live(archived_set):
+    eval_set_id, old, recent = archived_set
+    rows = _export(eval_set_id)
+    assert [r[0] for r in rows] == old + recent
+    first = dict(zip(RESULT_COLUMNS, rows[0]))
+    assert (first['corpus_id'], first['content'], first['expected'], first['actual_result']) == (1, 'q0', 'e0', 'answer 0')
+    assert [r[0] for r in _export(eval_set_id, include_archived=False)] == recent
+
+
+def test_duplicate_archive_files_and_live_rows_are_exported_once(archived_set):
+    eval_set_id, old, recent = archived_set
+    # 中断后重跑归档：同一批 id 出现在两个文件中
+    [path] = glob.glob(os.path.join(result_archive_service.set_dir(eval_set_id), '*.parquet'))
+    shutil.copy(path, path[:-len('.parquet')] + '_retry.parquet')
+    # 写完文件、删库前中断：行仍在库中，以库为准
+    with SessionLocal() as session:
+        session.add(EvalResultORM(id=old[3], eval_set_id=eval_set_id, eval_data_id=1, actual_result='live copy',
+                                  agent_version='v1', exec_time=datetime.utcnow()))
+        session.commit()
+    rows = _export(eval_set_id)
+    ids = [r[0] for r in rows]
+    assert sorted(ids) == sorted(old + recent)
+    assert dict((r[0], r[5]) for r in rows)[old[3]] == 'live copy'
+
+
+def test_filters_apply_to_archived_rows(archived_set):
+    eval_set_id, _, _ = archived_set
+    assert _export(eval_set_id, agent_version='v2') == []
@@ -0,0 +1,44 @@
+"""HTTP 指标的路由标签：实际路径按位置还原为路由模板，参数值与静态段相同或彼此相同时也不错标"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import metrics
+from utils.metrics import _route_template
+
+
+def _scope(path: str, path_format: str = None, **params) -> dict:
+    scope = {'type': 'http', 'path': path, 'path_params': params}
+    if path_format is not None:
+        scope['route'] = SimpleNamespace(path_format=path_format)
+    return scope
+
+
+@pytest.mark.parametrize('scope, expected', [
+    # 路由器内的相对模板，前缀取实际路径的前几段
+    (_scope('/api/v1/evalsets/5', '/{id}', id='5'), '/api/v1/evalsets/{id}'),
+    # 两个参数值相同
+    (_scope('/api/v1/evalsets/1/data/1', '/evalsets/{id}/data/{dataid}', id='1', dataid='1'),
+     '/api/v1/evalsets/{id}/data/{dataid}'),
+    # 参数值恰好等于静态段
+    (_scope('/api/v1/jobs/jobs', '/api/v1/jobs/{job_id}', job_id='jobs'), '/api/v1/jobs/{job_id}'),
+    # 没有路径参数时就是原始路径
+    (_scope('/api/v1/health', '/api/v1/health'), '/api/v1/health'),
+    # 未匹配任何路由
+    (_scope('/api/v1/evalsets/5/unknown'), 'unmatched'),
+])
+def test_route_template(scope, expected):
+    assert _route_template(scope) == expected
+
+
+def test_middleware_labels_requests_by_route():
+    from main import app
+    client = TestClient(app)
+    before = dict(metrics.HTTP_REQUESTS._values)
+    for path in ('/api/v1/evalsets/1/data/1', '/api/v1/evalsets/2/data/2', '/api/v1/jobs/jobs', '/no/such/path'):
+        client.get(path)
+    routes = {key[1] for key, value in metrics.HTTP_REQUESTS._values.items() if value != before.get(key)}
+    assert routes == {'/api/v1/evalsets/{id}/data/{dataid}', '/api/v1/jobs/{job_id}', 'unmatched'}
+    assert 'route="/api/v1/evalsets/{id}/data/{dataid}"' in client.get('/metrics').text
@@ -0,0 +1,103 @@
+"""原生批量加载：SQLite 下走 executemany；装载失败时整批回退到分批插入，并如实报告 native / mixed / batched"""
+
+import csv
+import json
+import os
+import tempfile
+
+import pytest
+
+import services.native_loader as native_loader
+import services.upload_job_worker as upload_job_worker
+from db.sqlalchemy import SessionLocal
+from db.models import EvalSet as EvalSetORM, Job as JobORM
+from services.eval_set_service import eval_set_service
+from services.job_service import job_service
+from services.native_loader import NativeLoader
+from services.upload_job_worker import _insert_in_batches, process_upload_job
+
+
+def _rows(eval_set_id: int, contents):
+    with SessionLocal() as session:
+        first = eval_set_service.allocate_corpus_ids(session, eval_set_id, len(contents))
+        session.commit()
+    return [{'eval_set_id': eval_set_id, 'corpus_id': first + i, 'content': c, 'expected': None, 'intent': None,
+             'deleted': False, 'row_hash': None} for i, c in enumerate(contents)]
+
+
+def _count(eval_set_id: int) -> int:
+    with SessionLocal() as session:
+        return session.query(EvalSetORM.count).filter(EvalSetORM.id == eval_set_id).scalar()
+
+
+def _failing_after(monkeypatch, successes: int):
+    """前 successes 次 SQLite 装载正常执行，之后抛出异常"""
+    calls = []
+    load = NativeLoader._load_sqlite
+
+    def flaky(self, rows):
+        calls.append(len(rows))
+        if len(calls) > successes:
+            raise RuntimeError('native load failed')
+        load(self, rows)
+    monkeypatch.setattr(NativeLoader, '_load_sqlite', flaky)
+    return calls
+
+
+def test_native_load(eval_set_id, set_rows):
+    def fallback(rows):
+        raise AssertionError('fallback should not run')
+
+    loader = NativeLoader(eval_set_id, fallback)
+    loader.add(_rows(eval_set_id, ['a', 'b', 'c']))
+    loader.flush()
+    assert loader.mode == 'native' and loader.loaded == 3
+    assert [r[1] for r in set_rows(eval_set_id)] == ['a', 'b', 'c']
+    assert _count(eval_set_id) == 3
+
+
+def test_failure_falls_back_for_the_rest_of_the_import(eval_set_id, set_rows, monkeypatch):
+    calls = _failing_after(monkeypatch, 0)
+    loader = NativeLoader(eval_set_id, lambda rows: _insert_in_batches(rows, eval_set_id))
+    loader.add(_rows(eval_set_id, ['a', 'b']))
+    loader.flush()
+    loader.add(_rows(eval_set_id, ['c']))
+    loader.flush()
+    # 第一次失败后停用原生路径，第二批不再尝试
+    assert calls == [2]
+    assert not loader.enabled and loader.mode == 'batched' and loader.fallback_rows == 3
+    assert [r[1] for r in set_rows(eval_set_id)] == ['a', 'b', 'c']
+    assert _count(eval_set_id) == 3
+
+
+def test_partial_native_load_reports_mixed(eval_set_id, set_rows, monkeypatch):
+    _failing_after(monkeypatch, 1)
+    loader = NativeLoader(eval_set_id, lambda rows: _insert_in_batches(rows, eval_set_id))
+    loader.add(_rows(eval_set_id, ['a', 'b']))
+    loader.flush()
+    loader.add(_rows(eval_set_id, ['c']))
+    loader.flush()
+    assert (loader.loaded, loader.fallback_rows, loader.mode) == (2, 1, 'mixed')
+    assert [r[1] for r in set_rows(eval_set_id)] == ['a', 'b', 'c']
+
+
+@pytest.mark.parametrize('successes, expected', [(10, 'native'), (1, 'mixed'), (0, 'batched')])
+def test_upload_job_reports_loader_mode(eval_set_id, set_rows, monkeypatch, successes, expected):
+    monkeypatch.setattr(native_loader, 'UPLOAD_NATIVE_LOADER', True)
+    # 每批 2 行、每 2 行装载一次：5 行分三次装载
+    monkeypatch.setattr(upload_job_worker, 'BATCH_SIZE', 2)
+    monkeypatch.setattr(native_loader, 'NATIVE_LOADER_ROWS', 2)
+    _failing_after(monkeypatch, successes)
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['content', 'expected', 'intent'])
+        writer.writerows([(f"row {i}", 'e', 'i') for i in range(5)])
+    job_id = job_service.create('upload', eval_set_id=eval_set_id, file_path=path)
+    process_upload_job(job_id)
+    with SessionLocal() as session:
+        job = session.query(JobORM).filter(JobORM.job_id == job_id).one()
+    assert job.status == 'success', job.error
+    assert json.loads(job.result)['loader'] == expected
+    assert [r[0] for r in set_rows(eval_set_id)] == [1, 2, 3, 4, 5]
+    assert _count(eval_set_id) == 5
@@ -0,0 +1,42 @@
+"""评测结果汇总：写入/删除结果时原子累加汇总行与分数直方图，结果与全量重建一致"""
+
+from sqlalchemy import event
+
+from db.sqlalchemy import engine
+from models import EvalResultCreate
+from models.eval_data import EvalDataBulkItem
+from services.eval_data_service import eval_data_service
+from services.eval_result_service import eval_result_service
+from services.result_summary_service import result_summary_service
+
+
+def _summaries(eval_set_id: int) -> list:
+    return sorted((s.agent_version, s.run_id, s.count, s.scored_count, s.score_sum, s.score_hist, s.kdb_hits,
+                   s.intent_matches) for s in result_summary_service.list_by_eval_set(eval_set_id))
+
+
+def test_incremental_summary_matches_rebuild(eval_set_id):
+    eval_data_service.bulk_create(eval_set_id, [EvalDataBulkItem(content='q1', intent='greet'), EvalDataBulkItem(content='q2')])
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        created = [eval_result_service.create_result(EvalResultCreate(
+            eval_set_id=eval_set_id, eval_data_id=i % 2 + 1, score=score, kdb=i % 2, actual_intent='greet',
+            agent_version='v1', run_id=run)) for i, (score, run) in enumerate([(3, 'r1'), (5, 'r1'), (3, 'r1'), (None, 'r1'), (4, None)])]
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    # 汇总行与直方图都用 UPDATE 原子累加，不先加锁读出整行
+    assert not [s for s in statements if 'FOR UPDATE' in s.upper()]
+    assert any('count=(eval_result_summary.count' in s.replace(' ', '') for s in statements)
+    assert eval_result_service.delete_result(created[1].id)
+
+    incremental = _summaries(eval_set_id)
+    assert incremental == [
+        ('v1', '', 1, 1, 4, {4: 1}, 0, 1),
+        ('v1', 'r1', 3, 2, 6, {3: 2}, 1, 2),
+    ]
+    result_summary_service.rebuild(eval_set_id)
+    assert _summaries(eval_set_id) == incremental
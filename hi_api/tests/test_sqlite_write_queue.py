@@ -0,0 +1,199 @@
+"""SQLite 单写者队列：按到达顺序发放写权限，同一线程共享，服务请求的事件循环与超时不排队"""
+
+import asyncio
+import threading
+import time
+
+import db.sqlite
+from db.sqlalchemy import SessionLocal
+from db.models import EvalSet as EvalSetORM
+from db.sqlite import SQLiteWriteQueue, write_queue
+
+
+class _Session:
+    """写队列只用到 Session.info 与对象身份"""
+
+    def __init__(self):
+        self.info = {}
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.005)
+
+
+def _writer(queue: SQLiteWriteQueue, name: str, order: list, hold: threading.Event) -> threading.Thread:
+    def run():
+        session = _Session()
+        queue.acquire(session)
+        order.append(name)
+        hold.wait(5)
+        queue.release(session)
+    return threading.Thread(target=run, daemon=True)
+
+
+def test_permits_are_granted_in_arrival_order():
+    queue = SQLiteWriteQueue()
+    first = _Session()
+    queue.acquire(first)
+    order = []
+    release = threading.Event()
+    threads = []
+    for i, name in enumerate(('b', 'c', 'd')):
+        t = _writer(queue, name, order, release)
+        t.start()
+        threads.append(t)
+        _wait_until(lambda: queue.stats()['waiting'] == i + 1)
+    assert order == []
+    queue.release(first)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert order == ['b', 'c', 'd']
+    stats = queue.stats()
+    assert stats['acquired'] == 4 and stats['waiting'] == 0 and stats['wait_seconds'] > 0
+
+
+def test_sessions_on_the_holding_thread_share_the_permit():
+    queue = SQLiteWriteQueue()
+    outer, inner = _Session(), _Session()
+    queue.acquire(outer)
+    # 同一线程的第二个 Session 不在队列上等自己
+    queue.acquire(inner)
+    queue.acquire(inner)
+    assert queue.stats()['acquired'] == 2
+
+    order = []
+    release = threading.Event()
+    other = _writer(queue, 'other', order, release)
+    other.start()
+    _wait_until(lambda: queue.stats()['waiting'] == 1)
+    queue.release(outer)
+    time.sleep(0.05)
+    # 还有持有者时其他线程继续等待
+    assert order == []
+    queue.release(inner)
+    release.set()
+    other.join(5)
+    assert order == ['other']
+
+
+def test_release_without_permit_is_a_no_op():
+    queue = SQLiteWriteQueue()
+    holder = _Session()
+    queue.acquire(holder)
+    queue.release(_Session())
+    assert queue.stats()['waiting'] == 0
+    order = []
+    release = threading.Event()
+    t = _writer(queue, 'next', order, release)
+    t.start()
+    _wait_until(lambda: queue.stats()['waiting'] == 1)
+    queue.release(holder)
+    release.set()
+    t.join(5)
+    assert order == ['next']
+
+
+def _hold_in_thread(queue: SQLiteWriteQueue):
+    """另一个线程领取写权限并持有，返回 (线程, 交还事件)"""
+    held = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        session = _Session()
+        queue.acquire(session)
+        held.set()
+        done.wait(5)
+        queue.release(session)
+
+    t = threading.Thread(target=hold, daemon=True)
+    t.start()
+    held.wait(5)
+    return t, done
+
+
+def test_registered_server_loop_does_not_queue():
+    queue = SQLiteWriteQueue()
+    t, done = _hold_in_thread(queue)
+
+    async def acquire_in_loop():
+        queue.register_loop(asyncio.get_running_loop())
+        session = _Session()
+        queue.acquire(session)
+        return session
+
+    try:
+        session = asyncio.run(asyncio.wait_for(acquire_in_loop(), 1))
+        assert '_sqlite_write_held' not in session.info
+        assert queue.stats()['waiting'] == 0
+    finally:
+        done.set()
+        t.join(5)
+
+
+def test_thread_with_its_own_loop_queues():
+    # 后台任务在工作线程中自建事件循环执行评测（_background_run_eval_set），其写入仍要排队
+    queue = SQLiteWriteQueue()
+    t, done = _hold_in_thread(queue)
+    order = []
+
+    def background():
+        async def write():
+            session = _Session()
+            queue.acquire(session)
+            order.append('background')
+            queue.release(session)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(write())
+        finally:
+            loop.close()
+
+    worker = threading.Thread(target=background, daemon=True)
+    worker.start()
+    _wait_until(lambda: queue.stats()['waiting'] == 1)
+    assert order == []
+    done.set()
+    t.join(5)
+    worker.join(5)
+    assert order == ['background']
+
+
+def test_get_db_registers_the_serving_loop():
+    from db.sqlalchemy import get_db
+
+    async def request():
+        agen = get_db()
+        await agen.__anext__()
+        registered = write_queue._on_server_loop()
+        await agen.aclose()
+        return registered
+
+    assert asyncio.run(request())
+
+
+def test_wait_falls_back_to_busy_timeout(monkeypatch):
+    monkeypatch.setattr(db.sqlite, 'SQLITE_BUSY_TIMEOUT_MS', 50)
+    queue = SQLiteWriteQueue()
+    t, done = _hold_in_thread(queue)
+    try:
+        start = time.monotonic()
+        queue.acquire(_Session())
+        assert 0.04 <= time.monotonic() - start < 2
+        assert queue.stats()['waiting'] == 0
+    finally:
+        done.set()
+        t.join(5)
+
+
+def test_session_factory_holds_permit_until_transaction_ends(eval_set_id):
+    with SessionLocal() as session:
+        session.query(EvalSetORM).filter(EvalSetORM.id == eval_set_id).update({EvalSetORM.name: 'renamed'})
+        assert session.info.get('_sqlite_write_held')
+        assert session in write_queue._holders
+        session.commit()
+        assert not session.info.get('_sqlite_write_held')
+        assert session not in write_queue._holders
@@ -0,0 +1,102 @@
+"""请求级工作单元：服务层 commit() 在请求内只 flush，get_db 结束时统一提交或回滚；write_step 只撤销失败的步骤"""
+
+import asyncio
+
+import pytest
+
+from db.sqlalchemy import SessionLocal, get_db, write_step
+from db.models import EvalSet as EvalSetORM
+from models.eval_data import EvalDataBulkItem, EvalDataCreate
+from models.eval_set import EvalSetCreate
+from services.eval_data_service import eval_data_service
+from services.eval_set_service import eval_set_service
+
+
+def _in_request(body, fail: bool = False):
+    """模拟一个使用 get_db 的请求：body(session) 在请求作用域内执行，fail 时以异常结束请求"""
+    async def run():
+        agen = get_db()
+        session = await agen.__anext__()
+        body(session)
+        if fail:
+            with pytest.raises(RuntimeError):
+                await agen.athrow(RuntimeError('request failed'))
+        else:
+            with pytest.raises(StopAsyncIteration):
+                await agen.__anext__()
+    asyncio.run(run())
+
+
+def _count(eval_set_id: int) -> int:
+    with SessionLocal() as session:
+        return session.query(EvalSetORM.count).filter(EvalSetORM.id == eval_set_id).scalar()
+
+
+def test_service_commit_is_deferred_to_request_end(eval_set_id, set_rows):
+    def body(session):
+        eval_data_service.create_eval_data(EvalDataCreate(eval_set_id=eval_set_id, content='a'))
+        eval_data_service.create_eval_data(EvalDataCreate(eval_set_id=eval_set_id, content='b'))
+        # 服务层已 commit()，但请求尚未结束，其他连接看不到
+        assert set_rows(eval_set_id) == []
+
+    _in_request(body)
+    assert [r[1] for r in set_rows(eval_set_id)] == ['a', 'b']
+    assert _count(eval_set_id) == 2
+
+
+def test_request_error_rolls_back_every_write(eval_set_id, set_rows):
+    def body(session):
+        eval_data_service.create_eval_data(EvalDataCreate(eval_set_id=eval_set_id, content='a'))
+
+    _in_request(body, fail=True)
+    assert set_rows(eval_set_id) == []
+    assert _count(eval_set_id) == 0
+
+
+def test_failed_step_keeps_earlier_writes_in_request(eval_set_id, set_rows, monkeypatch):
+    results = []
+
+    def body(session):
+        eval_data_service.create_eval_data(EvalDataCreate(eval_set_id=eval_set_id, content='kept'))
+
+        def boom(*args, **kwargs):
+            raise RuntimeError('count update failed')
+        monkeypatch.setattr(eval_set_service, 'adjust_count', boom)
+        results.extend(eval_data_service.bulk_create(eval_set_id, [EvalDataBulkItem(content='lost')]))
+        monkeypatch.undo()
+        eval_data_service.create_eval_data(EvalDataCreate(eval_set_id=eval_set_id, content='after'))
+
+    _in_request(body)
+    assert not results[0].ok and 'count update failed' in results[0].error
+    # 失败的批量写入只回滚到自己的 SAVEPOINT，之前与之后的写入随请求一起提交
+    assert [r[1] for r in set_rows(eval_set_id)] == ['kept', 'after']
+    assert _count(eval_set_id) == 2
+
+
+def test_write_step_outside_request_rolls_back_whole_session(eval_set_id):
+    with SessionLocal() as session:
+        with pytest.raises(RuntimeError):
+            with write_step(session):
+                eval_set_service.adjust_count(session, eval_set_id, 5)
+                raise RuntimeError('step failed')
+        session.commit()
+    assert _count(eval_set_id) == 0
+
+
+def test_rolled_back_eval_set_is_not_served_from_cache(eval_set_id):
+    created = []
+
+    def body(session):
+        es = eval_set_service.create_eval_set(EvalSetCreate(name='phantom'))
+        created.append(es.id)
+        eval_set_service.update_eval_set(eval_set_id, name='renamed')
+        # 请求内读到自己未提交的写入，但这些值不能进入进程内缓存
+        assert eval_set_service.get_eval_set(es.id).name == 'phantom'
+        assert eval_set_service.get_eval_set(eval_set_id).name == 'renamed'
+        assert 'phantom' in [s.name for s in eval_set_service.list_eval_sets()]
+
+    original = eval_set_service.get_eval_set(eval_set_id).name
+    _in_request(body, fail=True)
+    assert eval_set_service.get_eval_set(created[0]) is None
+    assert eval_set_service.get_eval_set(eval_set_id).name == original
+    assert 'phantom' not in [s.name for s in eval_set_service.list_eval_sets()]
@@ -0,0 +1,72 @@
+"""流式导入流水线：生产者线程解析文件放入有界队列，写库线程取批次写入；任一侧出错时任务失败且生产者线程退出"""
+
+import json
+import os
+import tempfile
+import threading
+
+import pytest
+
+from db.sqlalchemy import SessionLocal
+from db.models import Job as JobORM
+from services.job_service import job_service
+import services.upload_job_worker as upload_job_worker
+from services.upload_job_worker import process_upload_job
+
+ROWS = 50
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # 每批 2 行、队列只容 1 批：生产者很快会阻塞在队列已满上
+    monkeypatch.setattr(upload_job_worker, 'BATCH_SIZE', 2)
+    monkeypatch.setattr(upload_job_worker, 'UPLOAD_QUEUE_BATCHES', 1)
+
+
+def _jsonl(lines) -> str:
+    fd, path = tempfile.mkstemp(suffix='.jsonl')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def _run(eval_set_id: int, path: str) -> JobORM:
+    """在单独线程中执行导入任务，超时即视为死锁；返回任务记录"""
+    job_id = job_service.create('upload', eval_set_id=eval_set_id, file_path=path, options={'mode': 'append'})
+    worker = threading.Thread(target=process_upload_job, args=(job_id,), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+    assert not worker.is_alive(), 'upload job did not finish'
+    with SessionLocal() as session:
+        return session.query(JobORM).filter(JobORM.job_id == job_id).one()
+
+
+def _producers_alive() -> list:
+    return [t for t in threading.enumerate() if t.name.startswith('upload-parse-') and t.is_alive()]
+
+
+def test_rows_are_written_in_file_order(eval_set_id, set_rows):
+    path = _jsonl(json.dumps({'content': f"q{i}", 'expected': f"e{i}"}) for i in range(ROWS))
+    job = _run(eval_set_id, path)
+    assert job.status == 'success', job.error
+    assert json.loads(job.result)['inserted'] == ROWS
+    assert [r[:2] for r in set_rows(eval_set_id)] == [(i + 1, f"q{i}") for i in range(ROWS)]
+
+
+def test_parse_error_mid_stream_fails_the_job(eval_set_id):
+    lines = [json.dumps({'content': f"q{i}"}) for i in range(ROWS)]
+    lines[ROWS // 2] = '{not json'
+    job = _run(eval_set_id, _jsonl(lines))
+    assert job.status == 'failed'
+    assert f"line {ROWS // 2 + 1}" in job.error
+    assert not _producers_alive()
+
+
+def test_write_error_stops_a_blocked_producer(eval_set_id, monkeypatch):
+    def fail(batch, *args, **kwargs):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(upload_job_worker, '_write_batch', fail)
+    job = _run(eval_set_id, _jsonl(json.dumps({'content': f"q{i}"}) for i in range(ROWS)))
+    assert job.status == 'failed' and 'disk full' in job.error
+    # 生产者此时阻塞在已满的队列上，须在 stop 事件后退出
+    assert not _producers_alive()
@@ -15,6 +15,8 @@ except Exception:
     settings = _Fallback()
 
 from utils.log import get_logger
+from utils.metrics import AGENT_DURATION, AGENT_ERRORS, AGENT_STREAMS, timed
+from utils.tracing import in_executor, traced
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -58,6 +60,7 @@ class AIClient:
 
     def _post_stream(self, endpoint: str, payload: Dict[str, Any]) -> Iterable[str]:
         url = self.base_url + endpoint
+        AGENT_STREAMS.inc()
         try:
             logger.debug(f"POST streaming to {url} payload keys={list(payload.keys())}")
             resp = self.session.post(
@@ -76,6 +79,9 @@ class AIClient:
             logger.error(f"_post_stream request failed for {url}: {e}")
             # propagate a clearer exception while preserving type
             raise RuntimeError(f"API请求失败: {e}") from e
+        finally:
+            # 调用方读到所需事件后提前结束迭代时，生成器关闭也会走到这里
+            AGENT_STREAMS.dec()
 
     def _parse_json_stream(self, raw_lines: Iterable[str]) -> Iterable[Dict[str, Any]]:
         for line in raw_lines:
@@ -106,6 +112,8 @@ class AIClient:
         return self._parse_json_stream(self._post_stream("chat-messages", payload))
 
     # ==================== 业务方法 ====================
+    @timed(AGENT_DURATION, AGENT_ERRORS, 'info')
+    @traced('agent.info')
     def get_agent_info(self) -> Dict[str, Any]:
         url = self.base_url + "info"
         try:
@@ -118,6 +126,8 @@ class AIClient:
             logger.error(f"get_agent_info failed: {e}")
             raise RuntimeError(f"API请求失败: {e}") from e
 
+    @timed(AGENT_DURATION, AGENT_ERRORS, 'answer')
+    @traced('agent.answer')
     def get_answer(self, query: str) -> Optional[str]:
         logger.info(f"get_answer called query={query}")
         for evt in self._chat_events(query):
@@ -132,8 +142,10 @@ class AIClient:
     async def aget_answer(self, query: str) -> Optional[str]:
         """异步获取答案"""
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, partial(self.get_answer, query))
+        return await loop.run_in_executor(None, in_executor(partial(self.get_answer, query)))
 
+    @timed(AGENT_DURATION, AGENT_ERRORS, 'intent')
+    @traced('agent.intent')
     def get_intent(self, query: str) -> Optional[str]:
         logger.info(f"get_intent called query={query}")
         for evt in self._chat_events(query):
@@ -150,8 +162,10 @@ class AIClient:
     async def aget_intent(self, query: str) -> Optional[str]:
         """异步获取意图"""
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, partial(self.get_intent, query))
+        return await loop.run_in_executor(None, in_executor(partial(self.get_intent, query)))
 
+    @timed(AGENT_DURATION, AGENT_ERRORS, 'kdb')
+    @traced('agent.kdb')
     def is_Kdb(self, query: str) -> int:
         logger.info(f"is_Kdb called query={query}")
         for evt in self._chat_events(query):
@@ -168,7 +182,7 @@ class AIClient:
     async def ais_Kdb(self, query: str) -> int:
         """异步判断是否命中知识库"""
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, partial(self.is_Kdb, query))
+        return await loop.run_in_executor(None, in_executor(partial(self.is_Kdb, query)))
 
     def chat(
         self,
@@ -0,0 +1,314 @@
+"""进程内指标与 Prometheus 文本格式输出（GET /metrics）。
+
+计数器、仪表与直方图都是带锁的普通 Python 对象，热路径上每次记录只做一次字典查找与加法，不依赖 prometheus_client。
+连接池、缓存命中率与 SQLite 写队列等已有状态不重复计数，由 _runtime_samples() 在抓取时读取。
+指标只反映当前进程；多 worker 部署时由 Prometheus 分别抓取各进程再聚合。
+"""
+
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# 默认直方图桶（秒）：覆盖本地接口的毫秒级到外部 agent 调用的数十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[str, ...]
+
+_REGISTRY: List['_Metric'] = []
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels) -> Labels:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def _samples(self) -> Iterable[Tuple[str, Labels, Labels, float]]:
+        """(样本名, 标签值, 标签名, 值)"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, self.labelnames, value
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """累计桶在输出时计算，observe 只给落入的那个桶加一"""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数..., +Inf 桶计数, 总和]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[i] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        names = self.labelnames + ('le',)
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += n
+                yield self.name + '_bucket', key + (_format_value(bound),), names, cumulative
+            yield self.name + '_sum', key, self.labelnames, state[-1]
+            yield self.name + '_count', key, self.labelnames, cumulative
+
+
+def timed(histogram: Histogram, errors: Counter, *labels) -> Callable:
+    """装饰器：记录同步函数的耗时，抛出异常时给 errors 计数（异常照常抛出）"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                errors.inc(*labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorator
+
+
+# ==================== 指标定义 ====================
+HTTP_REQUESTS = Counter('hi_http_requests_total', 'HTTP requests by route template and status', ('method', 'route', 'status'))
+HTTP_DURATION = Histogram('hi_http_request_duration_seconds', 'HTTP request latency until the response is fully sent',
+                          ('method', 'route'))
+HTTP_IN_FLIGHT = Gauge('hi_http_requests_in_flight', 'HTTP requests currently being served')
+
+AGENT_DURATION = Histogram('hi_agent_call_duration_seconds', 'Agent API call latency', ('op',))
+AGENT_ERRORS = Counter('hi_agent_call_errors_total', 'Agent API calls that raised', ('op',))
+AGENT_STREAMS = Gauge('hi_agent_streams_in_flight', 'Open streaming responses from the agent API')
+SCORER_DURATION = Histogram('hi_scorer_call_duration_seconds', 'Scoring service call latency')
+SCORER_ERRORS = Counter('hi_scorer_call_errors_total', 'Scoring calls that produced no score', ('reason',))
+
+EVAL_WAITING = Gauge('hi_eval_waiting', 'Evaluation tasks queued on a concurrency semaphore', ('pool',))
+EVAL_ACTIVE = Gauge('hi_eval_active', 'Evaluation tasks holding a concurrency semaphore', ('pool',))
+EVAL_ITEMS = Counter('hi_eval_items_total', 'Evaluated items by outcome', ('outcome',))
+EVAL_ITEM_DURATION = Histogram('hi_eval_item_duration_seconds', 'Per-item evaluation latency (agent calls, scoring, persistence)')
+
+JOBS_FINISHED = Counter('hi_jobs_finished_total', 'Background jobs finished by kind and status', ('kind', 'status'))
+JOB_ITEMS = Counter('hi_job_items_total', 'Items processed by finished background jobs', ('kind',))
+JOB_DURATION = Histogram('hi_job_duration_seconds', 'Background job wall time', ('kind',),
+                         buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+
+@asynccontextmanager
+async def limited(semaphore: asyncio.Semaphore, pool: str):
+    """async with semaphore，同时维护等待中与执行中的任务数（信号量队列深度）"""
+    EVAL_WAITING.inc(pool)
+    try:
+        await semaphore.acquire()
+    finally:
+        EVAL_WAITING.dec(pool)
+    EVAL_ACTIVE.inc(pool)
+    try:
+        yield
+    finally:
+        EVAL_ACTIVE.dec(pool)
+        semaphore.release()
+
+
+def record_job_finished(kind: str, status: str, processed: int = 0, seconds: float = None) -> None:
+    JOBS_FINISHED.inc(kind, status)
+    if processed:
+        JOB_ITEMS.inc(kind, amount=processed)
+    if seconds is not None:
+        JOB_DURATION.observe(seconds, kind)
+
+
+def _route_template(scope) -> str:
+    """把实际路径还原为路由模板（/api/v1/evalsets/5 → /api/v1/evalsets/{id}）。
+
+    scope['route'].path_format 在较新的 FastAPI 中是路由器内的相对路径（/{id}），
+    不含 include_router 的前缀：模板末尾的段与实际路径末尾的段一一对应，前缀取实际路径剩余的前几段。
+    按位置替换，不按参数值反查，参数值相同或静态段恰好等于参数值时也不会错标。
+    未匹配（404）的请求归为一类。
+    """
+    if 'route' not in scope:
+        return 'unmatched'
+    path = scope['path']
+    route_format = getattr(scope['route'], 'path_format', None)
+    if not scope.get('path_params') or not route_format:
+        return path
+    segments = path.split('/')
+    tail = route_format.split('/')[1:]
+    if len(tail) >= len(segments):
+        return route_format
+    return '/'.join(segments[:len(segments) - len(tail)] + tail)
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件：按路由模板（而不是原始路径，避免 id 造成标签爆炸）记录请求数与耗时"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            path = _route_template(scope)
+            HTTP_DURATION.observe(time.perf_counter() - start, scope['method'], path)
+            HTTP_REQUESTS.inc(scope['method'], path, status[0])
+
+
+# ==================== 抓取时读取的状态 ====================
+# (指标名, 类型, 说明, 标签名)
+_RUNTIME_METRICS = {
+    'hi_db_pool_checked_out': ('gauge', 'Connections currently checked out', ('engine',)),
+    'hi_db_pool_size': ('gauge', 'Configured pool size', ('engine',)),
+    'hi_db_pool_capacity': ('gauge', 'Pool size plus max overflow (checked_out / capacity = saturation)', ('engine',)),
+    'hi_cache_hits_total': ('counter', 'Cache lookups served from memory', ('cache',)),
+    'hi_cache_misses_total': ('counter', 'Cache lookups that went to the database', ('cache',)),
+    'hi_cache_entries': ('gauge', 'Entries currently cached', ('cache',)),
+    'hi_sqlite_write_acquired_total': ('counter', 'SQLite write permits granted', ()),
+    'hi_sqlite_write_waiting': ('gauge', 'Sessions queued for the SQLite write permit', ()),
+    'hi_sqlite_write_wait_seconds_total': ('counter', 'Total time spent waiting for the SQLite write permit', ()),
+}
+
+
+def _pool_samples(label: str, engine) -> Iterable[Tuple[str, Labels, float]]:
+    pool = engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return
+    size = pool.size() if hasattr(pool, 'size') else 0
+    yield 'hi_db_pool_checked_out', (label,), pool.checkedout()
+    yield 'hi_db_pool_size', (label,), size
+    yield 'hi_db_pool_capacity', (label,), size + max(0, getattr(pool, '_max_overflow', 0))
+
+
+def _runtime_samples() -> Iterable[Tuple[str, Labels, float]]:
+    from db.sqlalchemy import engine, read_engine, IS_SQLITE
+    from services.eval_set_service import eval_set_cache
+
+    yield from _pool_samples('primary', engine)
+    if read_engine is not engine:
+        yield from _pool_samples('replica', read_engine)
+
+    stats = eval_set_cache.stats()
+    yield 'hi_cache_hits_total', ('eval_set',), stats['hits']
+    yield 'hi_cache_misses_total', ('eval_set',), stats['misses']
+    yield 'hi_cache_entries', ('eval_set',), stats['size']
+
+    if IS_SQLITE:
+        from db.sqlite import write_queue
+        stats = write_queue.stats()
+        yield 'hi_sqlite_write_acquired_total', (), stats['acquired']
+        yield 'hi_sqlite_write_waiting', (), stats['waiting']
+        yield 'hi_sqlite_write_wait_seconds_total', (), stats['wait_seconds']
+
+
+# ==================== 文本格式 ====================
+def _format_value(v: float) -> str:
+    if v == float('inf'):
+        return '+Inf'
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v)) if abs(v) < 1e15 else repr(v)
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+def _escape(v: str) -> str:
+    return v.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _line(name: str, values: Labels, names: Labels, value) -> str:
+    if names:
+        labels = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+        return f"{name}{{{labels}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+def _header(out: List[str], name: str, kind: str, documentation: str) -> None:
+    out.append(f"# HELP {name} {documentation}")
+    out.append(f"# TYPE {name} {kind}")
+
+
+def render() -> str:
+    out = []
+    for metric in _REGISTRY:
+        _header(out, metric.name, metric.type, metric.documentation)
+        for name, values, names, value in metric._samples():
+            out.append(_line(name, values, names, value))
+    # 同名样本在输出中必须相邻（主库与副本的连接池样本交错产出）
+    grouped: Dict[str, List[Tuple[Labels, float]]] = {}
+    for name, values, value in _runtime_samples():
+        grouped.setdefault(name, []).append((values, value))
+    for name, samples in grouped.items():
+        kind, documentation, names = _RUNTIME_METRICS[name]
+        _header(out, name, kind, documentation)
+        for values, value in samples:
+            out.append(_line(name, values, names, value))
+    return '\n'.join(out) + '\n'
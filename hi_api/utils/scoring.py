@@ -3,6 +3,7 @@ import json
 import re
 from typing import Optional
 from utils.log import get_logger
+from utils.metrics import SCORER_DURATION, SCORER_ERRORS
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from config.settings import settings
@@ -50,6 +51,7 @@ class AIEval:
         }
         if not url:
             logger.error("AIEval.eval_ai: no scoring url configured")
+            SCORER_ERRORS.inc('no_url')
             return None
         import time
         start_ts = time.perf_counter()
@@ -79,11 +81,15 @@ class AIEval:
                 logger.info(f"AIEval.eval_ai returning thought_len={len(thought) if thought else 0} took_ms={took_ms}")
                 return thought
             logger.info(f"AIEval.eval_ai finished without agent_thought took_ms={took_ms}")
+            SCORER_ERRORS.inc('no_thought')
             return None
         except requests.exceptions.RequestException as e:
             took_ms = int((time.perf_counter() - start_ts) * 1000)
             logger.error(f"AIEval.eval_ai request exception ({type(e).__name__}) took_ms={took_ms}: {e}")
+            SCORER_ERRORS.inc('request')
             return None
+        finally:
+            SCORER_DURATION.observe(time.perf_counter() - start_ts)
 
 
 def parse_score(thought: Optional[str]) -> int:
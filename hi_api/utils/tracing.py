@@ -0,0 +1,253 @@
+"""评测流水线的链路追踪：每条评测一个 trace，覆盖语料加载、各次 agent 调用、评分与结果写入。
+
+span 通过 contextvars 传递：asyncio 任务创建时自动复制上下文；run_in_executor 不复制，提交前用 in_executor() 包装，
+同时记录在线程池中排队的时间（executor.wait）。后台线程中新建的 span 成为各自 trace 的根。
+采样在根 span 处按 TRACE_SAMPLE_RATE 决定一次，子 span 跟随；未采样时每个 span 只有一次 contextvar 设置与还原。
+结束的 span 进入有界队列，由后台线程批量写到 TRACE_FILE（每行一个 JSON）和/或以 OTLP/HTTP JSON 发送到 TRACE_OTLP_ENDPOINT；
+队列满时丢弃并计数，不阻塞业务线程。
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, List, Optional
+
+from utils.log import get_logger
+from utils.metrics import Counter
+
+logger = get_logger("tracing")
+
+# 根 span 的采样率（0~1），为 0 或未配置任何导出目标时不产生 span
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+# 导出目标：本地 JSONL 文件，和/或 OTLP/HTTP 接收地址（如 http://127.0.0.1:4318/v1/traces）
+TRACE_FILE = os.getenv('TRACE_FILE') or None
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT') or None
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'hi_api')
+# 待导出队列上限、每批条数与最长攒批时间（秒）
+TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '10000'))
+TRACE_BATCH_SIZE = 512
+TRACE_FLUSH_SECONDS = 2.0
+
+TRACE_SPANS = Counter('hi_trace_spans_total', 'Finished trace spans by export outcome', ('outcome',))
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def fail(self, e: BaseException) -> None:
+        """记录已被调用方捕获、不会从 span 中抛出的异常"""
+        self.error = f"{type(e).__name__}: {e}"
+
+    def to_dict(self) -> dict:
+        return {'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id, 'name': self.name,
+                'start_ns': self.start_ns, 'end_ns': self.end_ns,
+                'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+                'attributes': self.attributes, 'error': self.error}
+
+
+class _NoopSpan:
+    """未采样的 trace：放进上下文，让子 span 知道无需再次采样"""
+    __slots__ = ()
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def fail(self, e: BaseException) -> None:
+        pass
+
+
+_UNSAMPLED = _NoopSpan()
+_current: contextvars.ContextVar = contextvars.ContextVar('hi_trace_span', default=None)
+
+
+def _random_id(n: int) -> str:
+    return random.getrandbits(n * 8).to_bytes(n, 'big').hex()
+
+
+def enabled() -> bool:
+    return TRACE_SAMPLE_RATE > 0 and (TRACE_FILE is not None or TRACE_OTLP_ENDPOINT is not None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """开启一个 span；无父 span 时作为新 trace 的根并决定是否采样。异常照常抛出，并记录在 span 上"""
+    parent = _current.get()
+    if parent is None:
+        if not enabled() or random.random() >= TRACE_SAMPLE_RATE:
+            token = _current.set(_UNSAMPLED)
+            try:
+                yield _UNSAMPLED
+            finally:
+                _current.reset(token)
+            return
+        current = Span(name, _random_id(16), None, attributes)
+    elif parent is _UNSAMPLED:
+        yield _UNSAMPLED
+        return
+    else:
+        current = Span(name, parent.trace_id, parent.span_id, attributes)
+    token = _current.set(current)
+    start = time.perf_counter_ns()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = current.start_ns + (time.perf_counter_ns() - start)
+        _current.reset(token)
+        _exporter.submit(current)
+
+
+def traced(name: str) -> Callable:
+    """装饰器：把同步函数的一次调用记录为 span"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_executor(fn: Callable) -> Callable:
+    """包装提交给 run_in_executor 的函数：在提交时的上下文中执行，并把在线程池中排队的时间记为 executor.wait"""
+    ctx = contextvars.copy_context()
+    parent = _current.get()
+    if not isinstance(parent, Span):
+        return lambda: ctx.run(fn)
+    submitted = time.time_ns()
+
+    def run():
+        wait = Span('executor.wait', parent.trace_id, parent.span_id, {})
+        wait.start_ns, wait.end_ns = submitted, time.time_ns()
+        _exporter.submit(wait)
+        return ctx.run(fn)
+    return run
+
+
+# ==================== 导出 ====================
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {'boolValue': v}
+    if isinstance(v, int):
+        return {'intValue': str(v)}
+    if isinstance(v, float):
+        return {'doubleValue': v}
+    return {'stringValue': str(v)}
+
+
+def _otlp_payload(spans: List[Span]) -> dict:
+    """OTLP/HTTP JSON 编码（ExportTraceServiceRequest）"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': TRACE_SERVICE_NAME}}]},
+        'scopeSpans': [{
+            'scope': {'name': 'hi_api.tracing'},
+            'spans': [{
+                'traceId': s.trace_id,
+                'spanId': s.span_id,
+                **({'parentSpanId': s.parent_id} if s.parent_id else {}),
+                'name': s.name,
+                'kind': 1,
+                'startTimeUnixNano': str(s.start_ns),
+                'endTimeUnixNano': str(s.end_ns),
+                'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items() if v is not None],
+                'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+class _BatchExporter:
+    """有界队列 + 后台线程批量导出：每 TRACE_FLUSH_SECONDS 或攒满一批时导出一次；首个 span 到达时才启动线程。
+
+    未导出的 span 一直留在队列中，进程退出时由 flush() 导出。
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._session = None
+
+    def submit(self, s: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(s)
+        except queue.Full:
+            TRACE_SPANS.inc('dropped')
+            return
+        if self._queue.qsize() >= TRACE_BATCH_SIZE:
+            self._wake.set()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(TRACE_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """导出队列中当前所有的 span"""
+        while True:
+            batch = []
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        ok = True
+        if TRACE_FILE:
+            try:
+                with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + '\n' for s in batch))
+            except OSError as e:
+                ok = False
+                logger.warning(f"trace export to {TRACE_FILE} failed: {e}")
+        if TRACE_OTLP_ENDPOINT:
+            try:
+                if self._session is None:
+                    import requests
+                    self._session = requests.Session()
+                resp = self._session.post(TRACE_OTLP_ENDPOINT, json=_otlp_payload(batch), timeout=5)
+                resp.raise_for_status()
+            except Exception as e:
+                ok = False
+                logger.warning(f"trace export to {TRACE_OTLP_ENDPOINT} failed ({len(batch)} spans): {e}")
+        TRACE_SPANS.inc('exported' if ok else 'failed', amount=len(batch))
+
+
+_exporter = _BatchExporter()
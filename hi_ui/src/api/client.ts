@@ -40,8 +40,10 @@ export const api = {
   createEvalData: (setId: number, payload: { content: string; expected?: string; intent?: string }) => request(`/api/v1/evalsets/${setId}/data`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ eval_set_id: setId, ...payload }) }),
   deleteEvalData: (setId: number, dataId: number) => request<void>(`/api/v1/evalsets/${setId}/data/${dataId}`, { method: 'DELETE' }),
   patchEvalData: (setId: number, dataId: number, payload: { content?: string; expected?: string; intent?: string }) => request<import('../types').EvalData>(`/api/v1/evalsets/${setId}/data/${dataId}`, { method: 'PATCH', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) }),
-  listResultsBySet: (setId: number) => request<import('../types').EvalResult[]>(`/api/v1/evalresults/byset/${setId}`),
-  listResultsByData: (evalSetId: number, corpusId: number) => request<import('../types').EvalResult[]>(`/api/v1/evalresults/bydata/${evalSetId}/${corpusId}`),
+  // fields: 只取列表需要的列（不含 actual_result 长文本），长文本通过 getResult 按需获取
+  listResultsBySet: (setId: number, fields?: string[]) => request<import('../types').EvalResult[]>(`/api/v1/evalresults/byset/${setId}${fields ? `?fields=${fields.join(',')}` : ''}`),
+  listResultsByData: (evalSetId: number, corpusId: number, fields?: string[]) => request<import('../types').EvalResult[]>(`/api/v1/evalresults/bydata/${corpusId}?eval_set_id=${evalSetId}${fields ? `&fields=${fields.join(',')}` : ''}`),
+  getResult: (id: number) => request<import('../types').EvalResult>(`/api/v1/evalresults/${id}`),
   executeSingle: (eval_data_id: number) => request<import('../types').EvalResult>('/api/v1/evalresults/execute', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ eval_data_id }) }),
   executeBySet: (eval_set_id: number) => request<import('../types').BatchExecResponse>(`/api/v1/evalresults/execute/byset/${eval_set_id}`, { method: 'POST' }),
   executeBySetAsync: (eval_set_id: number) => request<{ job_id: string }>(`/api/v1/evalresults/execute/byset_async/${eval_set_id}`, { method: 'POST' }),
@@ -119,7 +119,7 @@ const EvalDataPage: React.FC = () => {
 
 
   const columns = [
-    { title: 'ID', dataIndex: 'corpus_id', key: 'corpus_id', width: 80 },
+    { title: 'ID', dataIndex: 'display_index', key: 'display_index', width: 80, render: (v: any, r: EvalData) => (v ?? r.corpus_id) },
     { title: '内容', dataIndex: 'content', key: 'content', render: (_: any, record: any) => (
         <div style={{ maxWidth: 420, display: 'block', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis' }} title={record.content}>{record.content}</div>
       ) },
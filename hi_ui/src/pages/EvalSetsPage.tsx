@@ -101,7 +101,7 @@ const EvalSetsPage: React.FC = () => {
             setExecRunning(false);
             // fetch results summary from results endpoint
             try {
-              const results = await api.listResultsBySet(id);
+              const results = await api.listResultsBySet(id, ['id']);
               const succeeded = results.length; // simplistic: number of results saved
               // total is known as total
               setExecResult({ total: total, succeeded: succeeded, failed: Math.max(0, total - succeeded), result_ids: results.map(r => r.id), errors: [], durations_ms: [] });
@@ -309,7 +309,7 @@ const EvalSetsPage: React.FC = () => {
             </div>
           )}
           <div>
-            <Alert className="import-alert" type="info" showIcon style={{ marginBottom: 12 }} message={<strong>参考格式</strong>} description={<div>第一行为表头（会被忽略）；后续每行依次为：<b>content</b>（语料，必填）、<b>expected</b>（预期，选填）、<b>intent</b>（意图，选填）。<div style={{ marginTop:8 }}><a href="/import_template.xls" download>下载 Excel 模板</a></div></div>} />
+            <Alert className="import-alert" type="info" showIcon style={{ marginBottom: 12 }} message={<strong>参考格式</strong>} description={<div>第一行为表头（会被忽略）；后续每行依次为：<b>content</b>（语料，必填）、<b>expected</b>（预期，选填）、<b>intent</b>（意图，选填）。<div style={{ marginTop:8 }}><a href="/import_template.xls" download>下载 Excel 模板</a>　<a href="/import_template.csv" download>下载 CSV 模板</a></div><div style={{ marginTop:4 }}>支持 xlsx / xls / CSV / TSV / JSONL（每行一个含 content、expected、intent 字段的 JSON 对象）。</div></div>} />
             <div style={{ display: 'flex', gap: 12, alignItems: 'center', marginBottom: 12 }}>
               <div style={{ flex: 1 }}>
                 <label style={{ display: 'block', marginBottom: 6 }}>评测集名称</label>
@@ -324,7 +324,7 @@ const EvalSetsPage: React.FC = () => {
                     onRemove={() => { setImportFile(null); setUploadFileList([]); }}
                     fileList={uploadFileList}
                     maxCount={1}
-                    accept=".xlsx,.xls"
+                    accept=".xlsx,.xls,.csv,.tsv,.jsonl"
                     showUploadList={false}
                   >
                     <Button icon={<UploadOutlined />} disabled={importUploading}>选择文件</Button>
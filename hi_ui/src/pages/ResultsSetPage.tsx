@@ -5,17 +5,21 @@ import { EvalResult } from '../types';
 import ErrorBanner from '../components/ErrorBanner';
 import { Table, Button, Space } from 'antd';
 
+// 列表只取轻量列，答案原文在展开行时按需获取
+const LIST_FIELDS = ['eval_data_id', 'actual_intent', 'score', 'kdb', 'agent_version', 'exec_time'];
+
 const ResultsSetPage: React.FC = () => {
   const { id } = useParams();
   const setId = Number(id);
   const [results, setResults] = useState<EvalResult[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [answers, setAnswers] = useState<Record<number, string>>({});
   const load = async () => {
     if (!setId) return;
     setLoading(true);
     try {
-      setResults(await api.listResultsBySet(setId));
+      setResults(await api.listResultsBySet(setId, LIST_FIELDS));
     } catch (e:any) {
       console.error('Failed to load results by set', e);
       setError(String(e?.message || e || '加载结果失败'));
@@ -24,10 +28,18 @@ const ResultsSetPage: React.FC = () => {
     }
   };
   useEffect(()=>{ load(); },[setId]);
+  const loadAnswer = async (r: EvalResult) => {
+    if (answers[r.id] !== undefined) return;
+    try {
+      const full = await api.getResult(r.id);
+      setAnswers(prev => ({ ...prev, [r.id]: full.actual_result || '' }));
+    } catch (e:any) {
+      setError(String(e?.message || e || '加载答案失败'));
+    }
+  };
   const columns = [
     { title: 'ID', dataIndex: 'id', key: 'id', width: 80 },
     { title: 'DataID', dataIndex: 'eval_data_id', key: 'eval_data_id', width: 100 },
-    { title: '答案', dataIndex: 'actual_result', key: 'actual_result' },
     { title: '意图', dataIndex: 'actual_intent', key: 'actual_intent', width: 140 },
     { title: '分数', dataIndex: 'score', key: 'score', width: 100 },
     { title: 'KDB', dataIndex: 'kdb', key: 'kdb', width: 120 },
@@ -42,7 +54,16 @@ const ResultsSetPage: React.FC = () => {
       <Space className="list-margin">
         <Button onClick={load} disabled={loading}>{loading ? '刷新中...' : '刷新'}</Button>
       </Space>
-      <Table rowKey="id" dataSource={results} columns={columns} pagination={false} />
+      <Table
+        rowKey="id"
+        dataSource={results}
+        columns={columns}
+        pagination={false}
+        expandable={{
+          onExpand: (expanded, r) => { if (expanded) loadAnswer(r); },
+          expandedRowRender: (r) => answers[r.id] === undefined ? '加载中...' : <div style={{ whiteSpace: 'pre-wrap' }}>{answers[r.id] || '(空)'}</div>,
+        }}
+      />
     </div>
   );
 };
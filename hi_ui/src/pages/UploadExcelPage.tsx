@@ -66,7 +66,7 @@ const UploadExcelPage: React.FC = () => {
         <input value={name} onChange={e => setName(e.target.value)} placeholder="填写评测集名称" />
       </div>
       {error && <ErrorBanner message={error} onClose={() => setError(null)} />}
-      <Upload beforeUpload={beforeUpload} maxCount={1} accept=".xlsx,.xls">
+      <Upload beforeUpload={beforeUpload} maxCount={1} accept=".xlsx,.xls,.csv,.tsv,.jsonl">
         <Button icon={<UploadOutlined />}>选择文件</Button>
       </Upload>
   <Button onClick={submit} disabled={uploading} className="compact-button">{uploading ? '上传中...' : '上传'}</Button>
@@ -10,6 +10,8 @@ export interface EvalSet {
 export interface EvalData {
   id: number;
   eval_set_id: number;
+  corpus_id?: number | null;
+  display_index?: number | null;
   content: string;
   expected?: string | null;
   intent?: string | null;